@@ -0,0 +1,84 @@
+# bench_wire_encoding.py
+# Comparación de la codificación JSON (legacy) contra la binaria compacta, con y sin zlib,
+# para una respuesta de 'list' (tamaño en bytes y tiempo de codificación/decodificación)
+# No requiere servidor ni AWS: usa datos con la forma de test_outputs/output_cp03_list.json
+
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from components.common import binary_codec, wire
+
+SAMPLE_FILE = os.path.join('test_outputs', 'output_cp03_list.json')
+
+def build_response(count):
+    # Items con los atributos de CorporateData; DynamoDB devuelve los números como Decimal
+    items = []
+    for i in range(count):
+        items.append({
+            "id": f"UADER-FCYT-{i:05d}",
+            "cp": Decimal(3260 + i % 50),
+            "CUIT": f"30-{70000000 + i}-1",
+            "domicilio": f"Ruta 11 km {i % 100}",
+            "localidad": "Oro Verde",
+            "provincia": "Entre Rios",
+            "sede": "FCyT",
+            "telefono": f"03442 43-{i % 10000:04d}",
+            "web": "http://www.fcyt.uader.edu.ar",
+            "seqID": Decimal(i),
+            "idSeq": Decimal("1.5") * i,
+        })
+    return {"status": "OK", "data": items}
+
+def json_encode(obj):
+    return json.dumps(obj, default=wire.json_default).encode('utf-8')
+
+def json_decode(data):
+    return json.loads(data.decode('utf-8'))
+
+def zlib_variant(encode, decode, level):
+    return (lambda obj: zlib.compress(encode(obj), level)), (lambda data: decode(zlib.decompress(data)))
+
+def timed(fn, arg, rounds):
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run(response, rounds, level):
+    variants = [
+        ("json", json_encode, json_decode),
+        ("binary", binary_codec.encode, binary_codec.decode),
+        ("json+zlib", *zlib_variant(json_encode, json_decode, level)),
+        ("binary+zlib", *zlib_variant(binary_codec.encode, binary_codec.decode, level)),
+    ]
+    json_size = None
+    print(f"{'format':<14}{'bytes':>12}{'ratio':>8}{'encode ms':>12}{'decode ms':>12}")
+    for name, encode, decode in variants:
+        data = encode(response)
+        json_size = json_size or len(data)
+        encode_time = timed(encode, response, rounds)
+        decode_time = timed(decode, data, rounds)
+        print(f"{name:<14}{len(data):>12}{len(data) / json_size:>8.2f}{encode_time * 1000:>12.3f}{decode_time * 1000:>12.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of JSON vs binary wire encoding.")
+    parser.add_argument("-n", dest="items", type=int, default=1000, help="Number of items in the synthetic list response (default: 1000).")
+    parser.add_argument("-r", dest="rounds", type=int, default=20, help="Rounds per measurement, best is reported (default: 20).")
+    parser.add_argument("-l", dest="level", type=int, default=6, help="zlib level (default: 6).")
+    parser.add_argument("-s", dest="sample", action="store_true", help=f"Use {SAMPLE_FILE} instead of synthetic data.")
+    args = parser.parse_args()
+
+    if args.sample:
+        with open(SAMPLE_FILE, 'r', encoding='utf-8') as f:
+            response = json.load(f)
+    else:
+        response = build_response(args.items)
+    run(response, args.rounds, args.level)
@@ -1,6 +1,9 @@
 # Client modules
 from .singletonclient import SingletonClient
 from .observerclient import ObserverClient
+from .corporateclient import CorporateClient, AsyncCorporateClient, Subscription
+from .sinks import PrettySink, JSONLSink, SQLiteSink
 
-__all__ = ['SingletonClient', 'ObserverClient']
+__all__ = ['SingletonClient', 'ObserverClient', 'CorporateClient', 'AsyncCorporateClient', 'Subscription',
+           'PrettySink', 'JSONLSink', 'SQLiteSink']
 
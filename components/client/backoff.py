@@ -0,0 +1,25 @@
+# backoff.py
+# Espera entre reintentos de conexión: crece exponencialmente desde 'base' hasta 'cap' y se
+# elige al azar entre 0 y ese tope ("full jitter"), para que muchos clientes que perdieron el
+# servidor al mismo tiempo no se reconecten todos en el mismo instante
+import random
+
+class Backoff:
+    MAX_EXPONENT = 64  # Tope del exponente por si el tope de espera nunca se alcanza (base 0, multiplier <= 1)
+
+    def __init__(self, base=0.05, cap=30.0, multiplier=2.0, jitter=True):
+        self.base = base
+        self.cap = cap
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.attempts = 0  # Exponente de la espera: crece con cada reintento hasta llegar al tope
+
+    def next_delay(self):
+        ceiling = min(self.cap, self.base * self.multiplier ** self.attempts)
+        if ceiling < self.cap and self.attempts < self.MAX_EXPONENT:
+            self.attempts += 1  # Sin tope, multiplier ** attempts termina en OverflowError
+        return random.uniform(0, ceiling) if self.jitter else ceiling
+
+    def reset(self):
+        # Conexión confirmada (o aviso de apagado): el próximo reintento vuelve a ser inmediato
+        self.attempts = 0
@@ -0,0 +1,480 @@
+# corporateclient.py
+# API importable para usar el servidor desde otros programas (sin pasar por archivos JSON)
+# - CorporateClient: sincrónico y thread-safe, con un pool de conexiones persistentes
+# - AsyncCorporateClient: la misma API para asyncio
+# Las solicitudes viajan en frames con FLAG_KEEPALIVE: si el servidor mantiene la conexión
+# abierta (devuelve el flag) se reutiliza; si no (servidor sin modo persistente) se descarta.
+# Cada método devuelve la respuesta del servidor tal cual ({"status": ..., "data": ...}).
+import asyncio
+import itertools
+import queue
+import socket
+import sys
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+# Permitir importar el paquete compartido components.common al ejecutar desde este directorio
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from components.common import wire
+from components.client.nearcache import NearCache
+from components.client.latency import LatencyTracker, HedgeBudget
+
+# Escrituras que el servidor deduplica por REQUEST_ID (se pueden reintentar sin riesgo)
+IDEMPOTENT_ACTIONS = ("set", "patch", "update", "mset")
+# Lecturas que se pueden duplicar hacia otra instancia sin efectos (pedidos de cobertura)
+HEDGEABLE_ACTIONS = ("get", "list", "mget")
+
+class PoolTimeoutError(TimeoutError):
+    pass
+
+class _Connection:
+    def __init__(self, sock):
+        self.sock = sock
+        self.pending = b""  # Bytes recibidos después del último frame
+        self.reused = False
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+class ConnectionPool:
+    # Pool thread-safe: hasta 'max_size' conexiones; las libres se reutilizan en orden LIFO
+    # Con 'port' None, 'host' es la ruta de un socket Unix del servidor (mismo host)
+    def __init__(self, host, port, max_size=8, connect_timeout=5.0):
+        self.host = host
+        self.port = port
+        self.max_size = max_size
+        self.connect_timeout = connect_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    @property
+    def endpoint(self):
+        return f"unix:{self.host}" if self.port is None else f"{self.host}:{self.port}"
+
+    def _connect(self, timeout):
+        if self.port is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+            try:
+                sock.connect(self.host)
+            except OSError:
+                sock.close()
+                raise
+            return sock
+        sock = socket.create_connection((self.host, self.port), timeout=timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def acquire(self, timeout=None):
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolTimeoutError("No free connection in the pool")
+        try:
+            conn = self._idle.get_nowait()
+            conn.reused = True
+            with self._lock:
+                self.reused += 1
+            return conn
+        except queue.Empty:
+            pass
+        connect_timeout = self.connect_timeout if timeout is None else min(timeout, self.connect_timeout)
+        try:
+            conn = _Connection(self._connect(connect_timeout))
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def release(self, conn, reuse):
+        if reuse:
+            self._idle.put(conn)
+        else:
+            conn.close()
+        self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def stats(self):
+        with self._lock:
+            return {"max_size": self.max_size, "idle": self._idle.qsize(),
+                    "created": self.created, "reused": self.reused}
+
+class _ClientBase:
+    def __init__(self, client_uuid=None, encoding=wire.ENCODING_JSON, compression=None, trace_ids=False):
+        # Por defecto el mismo UUID que los clientes de línea de comandos (el de la CPU)
+        self.client_uuid = client_uuid or str(uuid.getnode())
+        self.encoding = encoding
+        self.compression = compression
+        self.trace_ids = trace_ids  # TRACE_ID nuevo en cada solicitud (si no se pasa uno)
+
+    def _build_request(self, action, fields):
+        request = dict(fields)
+        request["UUID"] = self.client_uuid
+        request["ACTION"] = action
+        if self.compression:
+            request["COMPRESSION"] = self.compression
+        # Las escrituras llevan REQUEST_ID: el reintento sobre una conexión nueva es seguro
+        if action in IDEMPOTENT_ACTIONS:
+            request.setdefault("REQUEST_ID", str(uuid.uuid4()))
+        # El servidor lo incluye en sus logs y en el desglose por fases de la solicitud
+        if self.trace_ids:
+            request.setdefault("TRACE_ID", uuid.uuid4().hex)
+        return request
+
+    @staticmethod
+    def _set_fields(item_id, attributes):
+        fields = dict(attributes or {})
+        fields["ID"] = item_id
+        return fields
+
+    @staticmethod
+    def _patch_fields(item_id, attributes, remove):
+        fields = dict(attributes or {})
+        fields["ID"] = item_id
+        if remove:
+            fields["REMOVE"] = list(remove)
+        return fields
+
+class CorporateClient(_ClientBase):
+    def __init__(self, host="localhost", port=8080, client_uuid=None, timeout=10.0, pool_size=8,
+                 encoding=wire.ENCODING_JSON, compression=None, near_cache=False, near_cache_size=10000,
+                 endpoints=None, adaptive_timeouts=False, hedge=False, hedge_budget=0.1, unix_socket=None,
+                 trace_ids=False, min_adaptive_timeout=None):
+        super().__init__(client_uuid, encoding, compression, trace_ids)
+        self.host = host
+        self.port = port
+        self.timeout = timeout  # Segundos por llamada si no se indica otro valor (tope del adaptativo)
+        # Una o varias instancias del servidor: las solicitudes se reparten en round-robin
+        # ((host, port), o (ruta, None) para un socket Unix; 'unix_socket' reemplaza a host/port)
+        self.endpoints = list(endpoints) if endpoints else [(unix_socket, None) if unix_socket else (host, port)]
+        self.pools = [ConnectionPool(h, p, max_size=pool_size, connect_timeout=timeout) for h, p in self.endpoints]
+        self.pool = self.pools[0]
+        self._next_pool = itertools.count()
+        # Latencias por ACTION: timeouts adaptativos y demora de los pedidos de cobertura
+        self.latency = LatencyTracker()
+        self.adaptive_timeouts = adaptive_timeouts
+        self.min_adaptive_timeout = min_adaptive_timeout  # Piso del adaptativo (None = fracción de 'timeout')
+        # Lecturas lentas: duplicarlas hacia otra instancia pasado el p95, dentro del presupuesto
+        self.hedge = hedge and len(self.pools) > 1
+        self.hedge_budget = HedgeBudget(ratio=hedge_budget)
+        self._hedge_executor = ThreadPoolExecutor(max_workers=pool_size * 2) if self.hedge else None
+        # Caché local de 'get', mantenida coherente con las notificaciones del servidor (opcional)
+        self.near_cache = NearCache(self, max_items=near_cache_size, endpoints=len(self.pools)) if near_cache else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self.near_cache is not None:
+            self.near_cache.close()
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False)
+        for pool in self.pools:
+            pool.close()
+
+    def request(self, action, timeout=None, **fields):
+        if timeout is None:
+            timeout = (self.latency.timeout_for(action, self.timeout, minimum=self.min_adaptive_timeout)
+                       if self.adaptive_timeouts else self.timeout)
+        request = self._build_request(action, fields)
+        data = wire.encode_frame(request, self.encoding, flags=wire.FLAG_KEEPALIVE)
+        index = next(self._next_pool)
+        pool = self.pools[index % len(self.pools)]
+        if self.hedge and action in HEDGEABLE_ACTIONS:
+            response = self._hedged_request(action, data, timeout, pool, self.pools[(index + 1) % len(self.pools)])
+        else:
+            response = self._timed_request(action, data, timeout, pool)
+        if self.near_cache is not None and action in IDEMPOTENT_ACTIONS:
+            # Leer lo propio escrito sin esperar la notificación
+            self.near_cache.invalidate_written(fields)
+        return response
+
+    def _timed_request(self, action, data, timeout, pool):
+        start = time.monotonic()
+        response = self._send(data, timeout, pool)
+        self.latency.record(action, time.monotonic() - start)
+        return response
+
+    def _hedged_request(self, action, data, timeout, primary, secondary):
+        self.hedge_budget.deposit()
+        first = self._hedge_executor.submit(self._timed_request, action, data, timeout, primary)
+        delay = self.latency.percentile(action, 95)
+        if delay is None or delay >= timeout:
+            return first.result()  # Sin historial todavía: no hay con qué decidir la demora
+        done, _ = wait([first], timeout=delay)
+        if done or not self.hedge_budget.try_spend():
+            return first.result()
+        # La primera respuesta correcta gana; la otra termina en segundo plano y libera su conexión
+        second = self._hedge_executor.submit(self._timed_request, action, data, timeout - delay, secondary)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self.hedge_budget.record_win()
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def _send(self, data, timeout, pool):
+        while True:
+            conn = pool.acquire(timeout)
+            reuse = False
+            try:
+                conn.sock.settimeout(timeout)
+                conn.sock.sendall(data)
+                response, flags, conn.pending = wire.recv_frame(conn.sock, conn.pending)
+                if response is None:
+                    raise ConnectionError("Server closed the connection")
+                reuse = bool(flags & wire.FLAG_KEEPALIVE)
+                return response
+            except (ConnectionError, wire.FrameError):
+                # Una conexión del pool pudo haber sido cerrada por el servidor mientras estaba
+                # libre: reintentar una vez con una conexión nueva
+                if not conn.reused:
+                    raise
+            finally:
+                pool.release(conn, reuse)
+
+    def client_stats(self):
+        # Contadores del lado del cliente (stats() es la ACTION del servidor)
+        return {
+            "latency": self.latency.stats(),
+            "hedging": dict(self.hedge_budget.stats(), enabled=self.hedge),
+            "pools": [dict(pool.stats(), endpoint=pool.endpoint) for pool in self.pools],
+            "near_cache": self.near_cache.stats() if self.near_cache is not None else None,
+        }
+
+    def get(self, item_id, timeout=None):
+        if self.near_cache is None:
+            return self.request("get", timeout, ID=item_id)
+        cached = self.near_cache.get(item_id)
+        if cached is not None:
+            return cached
+        version = self.near_cache.version
+        response = self.request("get", timeout, ID=item_id)
+        self.near_cache.put(item_id, response, version)
+        return response
+
+    def set(self, item_id, attributes, timeout=None):
+        return self.request("set", timeout, **self._set_fields(item_id, attributes))
+
+    def patch(self, item_id, attributes=None, remove=None, timeout=None):
+        return self.request("patch", timeout, **self._patch_fields(item_id, attributes, remove))
+
+    def list(self, timeout=None):
+        return self.request("list", timeout)
+
+    def mget(self, item_ids, timeout=None):
+        return self.request("mget", timeout, IDS=list(item_ids))
+
+    def mset(self, items, timeout=None):
+        return self.request("mset", timeout, ITEMS=list(items))
+
+    def stats(self, timeout=None):
+        return self.request("stats", timeout)
+
+    def subscribe(self, timeout=None, ack=False, endpoint=0):
+        # Conexión dedicada (fuera del pool); iterar la suscripción devuelve las notificaciones
+        # Con 'ack' se espera la confirmación del servidor: al volver, ningún cambio se pierde.
+        # Cada instancia notifica solo sus propias escrituras: 'endpoint' elige a cuál suscribirse
+        sock = self.pools[endpoint]._connect(self.timeout)
+        request = self._build_request("subscribe", {"ACK": True} if ack else {})
+        sock.sendall(wire.encode_frame(request, self.encoding))
+        subscription = Subscription(sock)
+        if ack:
+            sock.settimeout(self.timeout)
+            confirmation = next(subscription, None)
+            if not wire.is_subscription_confirmation(confirmation):
+                subscription.close()
+                raise ConnectionError(f"Subscription not confirmed: {confirmation}")
+            if timeout is None and confirmation.get("heartbeat"):
+                timeout = confirmation["heartbeat"] * 3  # Sin latidos en 3 intervalos, la suscripción termina
+        sock.settimeout(timeout)  # None = esperar notificaciones indefinidamente
+        return subscription
+
+class Subscription:
+    def __init__(self, sock):
+        self.sock = sock
+        self._reader = wire.FrameReader()
+        self._ready = []
+        self.server_shutdown = False  # El servidor avisó que se apaga ordenadamente (reconectar ya)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while True:
+            while not self._ready:
+                try:
+                    data = self.sock.recv(65536)
+                except OSError:
+                    data = b""
+                if not data:
+                    self.close()
+                    raise StopIteration
+                self._ready.extend(self._reader.feed(data))
+            update = self._ready.pop(0)
+            if wire.is_heartbeat(update):
+                continue  # Solo confirma que la conexión sigue viva
+            if wire.is_shutdown_notice(update):
+                self.server_shutdown = True
+                self._ready = []
+                self.close()
+                raise StopIteration
+            return update
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        # shutdown despierta a un hilo bloqueado en recv (close solo no lo hace)
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+class AsyncCorporateClient(_ClientBase):
+    def __init__(self, host="localhost", port=8080, client_uuid=None, timeout=10.0, pool_size=8,
+                 encoding=wire.ENCODING_JSON, compression=None, unix_socket=None, trace_ids=False):
+        super().__init__(client_uuid, encoding, compression, trace_ids)
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket  # Ruta del socket Unix del servidor (reemplaza a host/port)
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._idle = []  # (reader, writer) libres, se reutilizan en orden LIFO
+        self._slots = None  # asyncio.Semaphore, creado dentro del event loop
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+
+    async def _open(self):
+        if self.unix_socket:
+            return await asyncio.open_unix_connection(self.unix_socket)
+        return await asyncio.open_connection(self.host, self.port)
+
+    @staticmethod
+    async def _read_frame(reader):
+        try:
+            header = await reader.readexactly(wire.HEADER.size)
+        except asyncio.IncompleteReadError as e:
+            if e.partial:
+                raise wire.FrameError("Connection closed in the middle of a frame") from e
+            raise ConnectionError("Server closed the connection") from e
+        flags, length = wire.parse_header(header)
+        try:
+            payload = await reader.readexactly(length)
+        except asyncio.IncompleteReadError as e:
+            raise wire.FrameError("Connection closed in the middle of a frame") from e
+        return wire.decode_payload(payload, flags), flags
+
+    async def request(self, action, timeout=None, **fields):
+        timeout = self.timeout if timeout is None else timeout
+        return await asyncio.wait_for(self._request(action, fields), timeout)
+
+    async def _request(self, action, fields):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        data = wire.encode_frame(self._build_request(action, fields), self.encoding, flags=wire.FLAG_KEEPALIVE)
+        async with self._slots:
+            while True:
+                reused = bool(self._idle)
+                reader, writer = self._idle.pop() if reused else await self._open()
+                reuse = False
+                try:
+                    writer.write(data)
+                    await writer.drain()
+                    response, flags = await self._read_frame(reader)
+                    reuse = bool(flags & wire.FLAG_KEEPALIVE)
+                    return response
+                except (ConnectionError, wire.FrameError):
+                    if not reused:
+                        raise
+                finally:
+                    # Cancelada por timeout a mitad de la respuesta, la conexión queda inservible
+                    if reuse:
+                        self._idle.append((reader, writer))
+                    else:
+                        writer.close()
+
+    async def get(self, item_id, timeout=None):
+        return await self.request("get", timeout, ID=item_id)
+
+    async def set(self, item_id, attributes, timeout=None):
+        return await self.request("set", timeout, **self._set_fields(item_id, attributes))
+
+    async def patch(self, item_id, attributes=None, remove=None, timeout=None):
+        return await self.request("patch", timeout, **self._patch_fields(item_id, attributes, remove))
+
+    async def list(self, timeout=None):
+        return await self.request("list", timeout)
+
+    async def mget(self, item_ids, timeout=None):
+        return await self.request("mget", timeout, IDS=list(item_ids))
+
+    async def mset(self, items, timeout=None):
+        return await self.request("mset", timeout, ITEMS=list(items))
+
+    async def stats(self, timeout=None):
+        return await self.request("stats", timeout)
+
+    async def subscribe(self, ack=False):
+        # Iterador asíncrono de notificaciones sobre una conexión dedicada
+        reader, writer = await self._open()
+        writer.write(wire.encode_frame(self._build_request("subscribe", {"ACK": True} if ack else {}), self.encoding))
+        await writer.drain()
+        try:
+            liveness = None
+            if ack:
+                confirmation, _ = await asyncio.wait_for(self._read_frame(reader), self.timeout)
+                if not wire.is_subscription_confirmation(confirmation):
+                    raise ConnectionError(f"Subscription not confirmed: {confirmation}")
+                if confirmation.get("heartbeat"):
+                    liveness = confirmation["heartbeat"] * 3  # Sin latidos en 3 intervalos, termina
+            while True:
+                try:
+                    update, _ = await asyncio.wait_for(self._read_frame(reader), liveness)
+                except (ConnectionError, asyncio.TimeoutError):
+                    return
+                if wire.is_heartbeat(update):
+                    continue
+                if wire.is_shutdown_notice(update):
+                    return
+                yield update
+        finally:
+            writer.close()
@@ -0,0 +1,93 @@
+# latency.py
+# Latencias observadas por ACTION (ventana de las últimas N) para calcular timeouts adaptativos
+# y la demora de los pedidos de cobertura ("hedged requests"), y el presupuesto que limita
+# cuántos pedidos extra se pueden enviar
+import threading
+from collections import deque
+
+# Piso del timeout adaptativo como fracción del timeout base: con un p99 de pocos milisegundos,
+# una pausa de GC o un reintento de DynamoDB no debe cortar solicitudes sanas
+MIN_TIMEOUT_FRACTION = 0.1
+
+class LatencyTracker:
+    def __init__(self, window=256, min_samples=20):
+        self.window = window
+        self.min_samples = min_samples  # Sin suficientes muestras no se adapta nada
+        self._samples = {}  # ACTION -> deque de segundos
+        self._lock = threading.Lock()
+
+    def record(self, action, seconds):
+        with self._lock:
+            samples = self._samples.get(action)
+            if samples is None:
+                samples = self._samples[action] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, action, p):
+        # Segundos del percentil 'p' (0-100), o None si todavía no hay suficientes muestras
+        with self._lock:
+            samples = self._samples.get(action)
+            if samples is None or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def timeout_for(self, action, default, multiplier=3.0, minimum=None):
+        # Timeout adaptativo: 'multiplier' veces el p99 observado, nunca mayor que 'default'
+        # ni menor que 'minimum' (por defecto MIN_TIMEOUT_FRACTION de 'default')
+        p99 = self.percentile(action, 99)
+        if p99 is None:
+            return default
+        if minimum is None:
+            minimum = default * MIN_TIMEOUT_FRACTION
+        return min(default, max(minimum, p99 * multiplier))
+
+    def stats(self):
+        with self._lock:
+            actions = list(self._samples)
+        result = {}
+        for action in actions:
+            p50, p95, p99 = (self.percentile(action, p) for p in (50, 95, 99))
+            result[action] = {
+                "samples": len(self._samples[action]),
+                "p50_ms": round(p50 * 1000, 3) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 3) if p95 is not None else None,
+                "p99_ms": round(p99 * 1000, 3) if p99 is not None else None,
+            }
+        return result
+
+class HedgeBudget:
+    # Cada solicitud deposita 'ratio' de crédito y cada pedido de cobertura gasta 1:
+    # a la larga los pedidos extra nunca superan 'ratio' de la carga (p.ej. 0.1 = 10%)
+    def __init__(self, ratio=0.1, max_credit=10.0):
+        self.ratio = ratio
+        self.max_credit = max_credit
+        self._credit = 0.0
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+        self.denied = 0
+        self.wins = 0  # Pedidos de cobertura que respondieron antes que el original
+
+    def deposit(self):
+        with self._lock:
+            self.requests += 1
+            self._credit = min(self.max_credit, self._credit + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            if self._credit >= 1.0:
+                self._credit -= 1.0
+                self.hedges += 1
+                return True
+            self.denied += 1
+            return False
+
+    def record_win(self):
+        with self._lock:
+            self.wins += 1
+
+    def stats(self):
+        with self._lock:
+            return {"ratio": self.ratio, "requests": self.requests, "hedges": self.hedges,
+                    "wins": self.wins, "denied": self.denied, "credit": round(self._credit, 2)}
@@ -0,0 +1,150 @@
+# nearcache.py
+# Caché local (en el proceso del cliente) de las respuestas de 'get'
+# Se mantiene coherente con el canal de notificaciones del servidor: cada item notificado
+# reemplaza a su copia en caché, y ante una desconexión la caché entera se descarta hasta
+# volver a estar suscripto (resync). Sin suscripción confirmada no se sirve nada desde la caché.
+# Con varias instancias del servidor se mantiene una suscripción en cada una.
+import logging
+import threading
+from collections import OrderedDict
+from .backoff import Backoff
+
+class NearCache:
+    def __init__(self, client, max_items=10000, reconnect_delay=1.0, endpoints=1):
+        self._client = client  # CorporateClient: se usa su subscribe() con confirmación
+        self.max_items = max_items
+        self._items = OrderedDict()  # item_id -> respuesta de 'get'
+        self._lock = threading.Lock()
+        # Se incrementa con cada cambio conocido: una respuesta pedida antes de un cambio no se guarda
+        self.version = 0
+        # Cada instancia del servidor notifica solo a sus propios observadores: con varios endpoints
+        # hace falta una suscripción por instancia, y la caché sirve solo con todas confirmadas
+        self._subscribed = [False] * endpoints
+        self._subscriptions = [None] * endpoints
+        self._ready = threading.Event()    # Suscripciones confirmadas en todos los endpoints
+        self._stopped = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        self.updates = 0
+        self.invalidations = 0
+        self.resyncs = 0  # Veces que la caché se descartó por perder una suscripción
+        # Mientras no hay suscripción la caché no sirve nada: reintentar rápido, hasta 'reconnect_delay'
+        self._threads = [threading.Thread(target=self._listen, args=(endpoint, Backoff(cap=reconnect_delay)),
+                                          daemon=True) for endpoint in range(endpoints)]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def _listen(self, endpoint, backoff):
+        while not self._stopped.is_set():
+            try:
+                subscription = None
+                try:
+                    subscription = self._subscriptions[endpoint] = self._client.subscribe(ack=True, endpoint=endpoint)
+                    self._subscribed_to(endpoint, True)
+                    backoff.reset()
+                    for update in subscription:
+                        self.apply(update)
+                except Exception as e:
+                    logging.debug("Near cache subscription failed: %s", e)
+                finally:
+                    self._subscribed_to(endpoint, False)
+                    if subscription is not None:
+                        subscription.close()
+                self._stopped.wait(backoff.next_delay())
+            except Exception as e:
+                # Un error al cerrar o al esperar no puede terminar el hilo: la caché no volvería a estar lista
+                logging.error("Near cache listener error: %s", e)
+                self._stopped.wait(backoff.cap)
+
+    def _subscribed_to(self, endpoint, subscribed):
+        # Lo cacheado antes de confirmar una suscripción puede estar viejo, y sin ella se pierden cambios:
+        # en los dos casos la caché se descarta
+        with self._lock:
+            if not subscribed and not self._subscribed[endpoint]:
+                return  # La suscripción nunca se confirmó: no hay nada que descartar
+            self._subscribed[endpoint] = subscribed
+            if not subscribed and self._ready.is_set():
+                self.resyncs += 1
+            self.version += 1
+            self._items.clear()
+            if all(self._subscribed):
+                self._ready.set()
+            else:
+                self._ready.clear()
+
+    def apply(self, update):
+        # Notificación de set/patch (un item) o de mset (lista de items), siempre completos
+        items = update if isinstance(update, list) else [update]
+        with self._lock:
+            self.version += 1
+            for item in items:
+                if isinstance(item, dict) and item.get("id") in self._items:
+                    self._items[item["id"]] = {"status": "OK", "data": item}
+                    self.updates += 1
+
+    def get(self, item_id):
+        if not self._ready.is_set():
+            return None
+        with self._lock:
+            response = self._items.get(item_id)
+            if response is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(item_id)
+            self.hits += 1
+        return self._copy(response)
+
+    @staticmethod
+    def _copy(response):
+        # Quien recibe la respuesta puede modificarla sin alterar la caché
+        return dict(response, data=dict(response["data"]))
+
+    def put(self, item_id, response, version):
+        # Solo respuestas completas y frescas, y si nada cambió mientras se pedían
+        if not isinstance(response, dict) or response.get("status") != "OK" or response.get("stale"):
+            return
+        with self._lock:
+            if version != self.version or not self._ready.is_set():
+                return
+            self._items[item_id] = self._copy(response)
+            self._items.move_to_end(item_id)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def invalidate(self, item_ids):
+        with self._lock:
+            self.version += 1
+            for item_id in item_ids:
+                if self._items.pop(item_id, None) is not None:
+                    self.invalidations += 1
+
+    def invalidate_written(self, fields):
+        # IDs afectados por una escritura propia (ID en set/patch, ITEMS en mset)
+        item_ids = [fields["ID"]] if "ID" in fields else []
+        for item in fields.get("ITEMS") or []:
+            if isinstance(item, dict):
+                item_ids.append(item.get("ID", item.get("id")))
+        self.invalidate(item_ids)
+
+    def close(self):
+        self._stopped.set()
+        for subscription in self._subscriptions:
+            if subscription is not None:
+                subscription.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ready": self._ready.is_set(),
+                "subscriptions": sum(self._subscribed),
+                "items": len(self._items),
+                "hits": self.hits,
+                "misses": self.misses,
+                "updates": self.updates,
+                "invalidations": self.invalidations,
+                "resyncs": self.resyncs,
+            }
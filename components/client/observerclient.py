@@ -6,16 +6,35 @@ import uuid
 import time
 import argparse
 import sys
+import os
+import signal
+import sqlite3
+# Permitir importar el paquete compartido components.common al ejecutar como script
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from components.common import wire
+from components.client import sinks
+from components.client.backoff import Backoff
 
 class ObserverClient:
-    def __init__(self, host, port, output_file, verbose):
+    def __init__(self, host, port, output_file, verbose, encoding=wire.ENCODING_JSON, compression=None, sink=None,
+                 backoff=None, unix_socket=None):
         self.host = host
         self.port = port
+        self.unix_socket = unix_socket  # Ruta del socket Unix del servidor (reemplaza a host/port)
         self.output_file = output_file
         self.verbose = verbose
         self.cpu_uuid = str(uuid.getnode()) # [cite: 303]
         self.sock = None
-        self.retry_delay = 30 # Segundos para reintentar [cite: 79, 318]
+        # Espera para reintentar [cite: 79, 318]: exponencial con jitter, vuelve a ser corta al reconectar
+        self.backoff = backoff if backoff is not None else Backoff()
+        self.encoding = encoding  # 'json' (legacy, sin frames) o 'binary' (negociado con frames)
+        self.compression = compression  # 'zlib' para aceptar notificaciones comprimidas (requiere frames)
+        # Destino de las notificaciones (por defecto el formato original en -o, o stdout)
+        self.sink = sink if sink is not None or not output_file else sinks.PrettySink(output_file)
+
+    @property
+    def framed(self):
+        return self.encoding != wire.ENCODING_JSON or self.compression is not None
 
     def v_print(self, message):
         if self.verbose:
@@ -24,65 +43,86 @@ class ObserverClient:
     def connect(self):
         while True:
             try:
-                self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.sock.connect((self.host, self.port))
-                self.v_print(f"Connected to server at {self.host}:{self.port}")
+                self.sock = socket.socket(socket.AF_UNIX if self.unix_socket else socket.AF_INET, socket.SOCK_STREAM)
+                self.sock.connect(self.unix_socket or (self.host, self.port))
+                self.v_print(f"Connected to server at {self.unix_socket or f'{self.host}:{self.port}'}")
                 self.send_subscription()
                 self.listen_for_updates()
-            except socket.error as e:
-                self.v_print(f"Connection lost: {e}. Retrying in {self.retry_delay} seconds...")
-                if self.sock:
-                    self.sock.close()
-                time.sleep(self.retry_delay) # Manejo de servidor caído [cite: 318]
+                # Apagado ordenado del servidor: reintentar enseguida, sin esperar al backoff acumulado
+                self.backoff.reset()
+                delay = self.backoff.next_delay()
+                self.v_print(f"Server is shutting down. Reconnecting in {delay:.3f} seconds...")
+            except (socket.error, wire.FrameError) as e:
+                delay = self.backoff.next_delay()
+                self.v_print(f"Connection lost: {e}. Retrying in {delay:.3f} seconds...")
+            if self.sock:
+                self.sock.close()
+            time.sleep(delay) # Manejo de servidor caído [cite: 318]
 
     def send_subscription(self):
         # Enviar solicitud de suscripción [cite: 79, 303]
         subscribe_request = {
             "UUID": self.cpu_uuid,
-            "ACTION": "subscribe" 
+            "ACTION": "subscribe",
+            "ACK": True  # Confirmación y aviso de apagado (mensajes de control, no se escriben en -o)
         }
-        self.sock.sendall(json.dumps(subscribe_request).encode('utf-8'))
+        if self.compression:
+            subscribe_request["COMPRESSION"] = self.compression
+        if not self.framed:
+            self.sock.sendall(json.dumps(subscribe_request).encode('utf-8'))
+        else:
+            # Suscripción en un frame: las notificaciones llegan en frames con esta codificación
+            self.sock.sendall(wire.encode_frame(subscribe_request, self.encoding))
         self.v_print("Subscription request sent.")
 
     def listen_for_updates(self):
         # Quedar escuchando por notificaciones (múltiples respuestas) [cite: 314]
-        buffer = ""
+        # Con frames cada notificación está delimitada; en modo legacy los JSON llegan
+        # concatenados y el decodificador incremental los separa en una sola pasada
+        reader = wire.FrameReader() if self.framed else wire.JSONStreamReader()
+        confirmed = False
         while True:
-            data = self.sock.recv(1024)
+            data = self.sock.recv(65536)
             if not data:
                 # Conexión cerrada por el servidor
                 raise socket.error("Server closed connection")
-            
-            # Es posible que múltiples JSONs lleguen juntos o partidos
-            # Este es un buffer simple; para robustez, se necesita un delimitador
-            buffer += data.decode('utf-8')
-            
-            # Asumimos que cada JSON se envía como una unidad (esto puede fallar)
-            # Una mejor implementación usaría un delimitador de mensajes
-            try:
-                # Intentar procesar como un JSON completo
-                response_json = json.loads(buffer)
-                self.handle_update(response_json)
-                buffer = "" # Limpiar buffer si fue exitoso
-            except json.JSONDecodeError:
-                # Datos incompletos, esperar más
-                self.v_print(f"Incomplete data received, buffering... Buffer: {buffer}")
-                continue
+            for update in reader.feed(data):
+                if wire.is_shutdown_notice(update):
+                    return
+                if not confirmed:
+                    # El primer mensaje muestra que la suscripción funciona: recién ahí se reinicia el backoff
+                    confirmed = True
+                    self.backoff.reset()
+                    # Un servidor sin ACK no envía confirmación: su primer mensaje ya es una notificación
+                    if wire.is_subscription_confirmation(update):
+                        self.v_print("Subscription confirmed.")
+                        if update.get("heartbeat"):
+                            # Sin latidos durante 3 intervalos, la conexión se da por muerta
+                            self.sock.settimeout(update["heartbeat"] * 3)
+                        continue
+                if wire.is_heartbeat(update):
+                    continue
+                self.handle_update(update)
+            if reader.pending_bytes:
+                self.v_print(f"Incomplete data received, buffering {reader.pending_bytes} bytes...")
 
     def handle_update(self, update_data):
         # Mostrar la actualización (JSON de datos de CorporateData) [cite: 315]
-        output_content = json.dumps(update_data, indent=4)
-        self.v_print(f"Update received: {output_content}")
+        if self.verbose:
+            self.v_print(f"Update received: {json.dumps(update_data, default=wire.json_default)}")
         
-        if self.output_file:
-            # En modo observador, es mejor "append" que "write"
+        if self.sink is not None:
             try:
-                with open(self.output_file, 'a') as f:
-                    f.write(output_content + "\n") # Añadir nueva línea entre JSONs
-            except IOError as e:
+                self.sink.write(update_data)
+            except (IOError, sqlite3.Error) as e:
                 print(f"Error appending to output file: {e}", file=sys.stderr)
         else:
-            print(output_content)
+            print(json.dumps(update_data, indent=4, default=wire.json_default))
+
+    def close(self):
+        # Vaciar los buffers del sink antes de salir
+        if self.sink is not None:
+            self.sink.close()
 
 if __name__ == "__main__":
     # Configurar argparse para -s, -p, -o, -v [cite: 139, 301]
@@ -91,13 +131,44 @@ if __name__ == "__main__":
     parser.add_argument("-p", dest="server_port", type=int, default=8080, help="Server port (default: 8080).")
     parser.add_argument("-o", dest="output_file", help="Optional output file to append notifications.")
     parser.add_argument("-v", action="store_true", help="Enable verbose/debug mode.")
+    parser.add_argument("-u", dest="unix_socket", metavar="PATH", help="Connect through the server's Unix domain socket instead of TCP (-s/-p are ignored).")
+    parser.add_argument("-e", dest="encoding", choices=wire.ENCODINGS, default=wire.ENCODING_JSON, help="Wire encoding: json (legacy) or binary (default: json).")
+    parser.add_argument("-z", dest="compression", choices=wire.COMPRESSIONS, help="Accept compressed notifications (zlib).")
+    parser.add_argument("--sink", choices=sinks.SINKS, default="pretty", help="Output format for -o: pretty (indented JSON, default), jsonl (buffered, one line per notification) or sqlite (local CorporateData mirror).")
+    parser.add_argument("--flush-interval", type=float, default=1.0, help="jsonl/sqlite: seconds between buffer flushes (default: 1).")
+    parser.add_argument("--flush-bytes", type=int, default=64 * 1024, help="jsonl: buffered bytes that force a flush (default: 65536).")
+    parser.add_argument("--fsync", choices=sinks.FSYNC_POLICIES, default=sinks.FSYNC_NEVER, help="jsonl/sqlite: fsync policy (default: never).")
+    parser.add_argument("--rotate-bytes", type=int, default=0, help="jsonl: rotate the file when it reaches this size, 0 disables (default: 0).")
+    parser.add_argument("--backups", type=int, default=5, help="jsonl: rotated files to keep (default: 5).")
+    parser.add_argument("--no-gzip", action="store_true", help="jsonl: do not gzip rotated files.")
+    parser.add_argument("--retry-base", type=float, default=0.05, help="Seconds before the first reconnect attempt, doubled on each failure (default: 0.05).")
+    parser.add_argument("--retry-max", type=float, default=30.0, help="Maximum seconds between reconnect attempts (default: 30).")
+    parser.add_argument("--retry-multiplier", type=float, default=2.0, help="Growth factor of the reconnect delay (default: 2).")
+    parser.add_argument("--no-jitter", action="store_true", help="Wait the full reconnect delay instead of a random fraction of it.")
     
     args = parser.parse_args()
+    if args.sink != "pretty" and not args.output_file:
+        parser.error(f"--sink {args.sink} requires -o")
 
     client = ObserverClient(
         host=args.server_host,
         port=args.server_port,
         output_file=args.output_file,
-        verbose=args.v
+        verbose=args.v,
+        encoding=args.encoding,
+        compression=args.compression,
+        sink=sinks.open_sink(args.sink, args.output_file, flush_interval=args.flush_interval,
+                             flush_bytes=args.flush_bytes, fsync=args.fsync, max_bytes=args.rotate_bytes,
+                             backups=args.backups, compress=not args.no_gzip) if args.output_file else None,
+        backoff=Backoff(base=args.retry_base, cap=args.retry_max, multiplier=args.retry_multiplier,
+                        jitter=not args.no_jitter),
+        unix_socket=args.unix_socket
     )
-    client.connect() # Iniciar el bucle de conexión/escucha
\ No newline at end of file
+    # SIGTERM (p.ej. terminate() de las pruebas) sale ordenadamente para vaciar los buffers
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        client.connect() # Iniciar el bucle de conexión/escucha
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
\ No newline at end of file
@@ -6,16 +6,35 @@ import uuid
 import platform
 import argparse
 import sys
+import os
+import time
+import random
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+# Permitir importar el paquete compartido components.common al ejecutar como script
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from components.common import wire
+from components.client.corporateclient import CorporateClient
+
+# Escrituras que el servidor deduplica por REQUEST_ID (se pueden reintentar sin riesgo)
+IDEMPOTENT_ACTIONS = ("set", "patch", "update", "mset")
 
 class SingletonClient:
-    def __init__(self, host, port, input_file, output_file, verbose):
+    def __init__(self, host, port, input_file, output_file, verbose, retries=0, encoding=wire.ENCODING_JSON,
+                 compression=None, timeout=None, unix_socket=None, trace=False):
         self.host = host
         self.port = port
+        self.unix_socket = unix_socket  # Ruta del socket Unix del servidor (reemplaza a host/port)
         self.input_file = input_file
         self.output_file = output_file
         self.verbose = verbose
         # Obtener el UUID de la CPU como se pide [cite: 385]
         self.cpu_uuid = str(uuid.getnode()) 
+        self.retries = retries  # Reintentos ante errores de socket
+        self.encoding = encoding  # 'json' (legacy, sin frames) o 'binary' (negociado con frames)
+        self.compression = compression  # 'zlib' para aceptar respuestas comprimidas (requiere frames)
+        self.trace = trace  # Agregar un TRACE_ID a cada solicitud (el servidor lo usa en logs y trazas)
+        self.timeout = timeout  # Segundos máximos por operación de socket (None = sin límite)
 
     def v_print(self, message):
         # Imprimir mensajes de debug si -v está activado [cite: 276, 400]
@@ -30,6 +49,16 @@ class SingletonClient:
             
             # Insertar el UUID de la CPU en la solicitud [cite: 282, 287]
             request_data['UUID'] = self.cpu_uuid
+
+            if self.compression:
+                request_data['COMPRESSION'] = self.compression
+
+            # Con reintentos, las escrituras llevan un REQUEST_ID para que el servidor no las repita
+            if self.retries and request_data.get('ACTION') in IDEMPOTENT_ACTIONS:
+                request_data.setdefault('REQUEST_ID', str(uuid.uuid4()))
+
+            if self.trace:
+                request_data.setdefault('TRACE_ID', uuid.uuid4().hex)
             
             self.v_print(f"Request data loaded: {request_data}")
             return request_data
@@ -45,14 +74,30 @@ class SingletonClient:
         if request_json is None:
             return
 
+        # Solo se reintentan lecturas y escrituras con REQUEST_ID (idempotentes)
+        can_retry = request_json.get('ACTION') not in IDEMPOTENT_ACTIONS or 'REQUEST_ID' in request_json
+        attempts = self.retries + 1 if can_retry else 1
+        for attempt in range(attempts):
+            if self.send_once(request_json, is_last_attempt=attempt == attempts - 1):
+                return
+            delay = random.uniform(0, min(2.0, 0.1 * (2 ** attempt)))
+            self.v_print(f"Retrying in {delay:.2f} seconds (attempt {attempt + 2}/{attempts})...")
+            time.sleep(delay)
+
+    def send_once(self, request_json, is_last_attempt=True):
+        # Devuelve False si hubo un error de socket y se puede reintentar
         try:
-            # Conectar al servidor vía socket TCP [cite: 74, 297]
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((self.host, self.port))
-                self.v_print(f"Connected to server at {self.host}:{self.port}")
+            # Conectar al servidor vía socket TCP [cite: 74, 297] (o Unix, si está en el mismo host)
+            with socket.socket(socket.AF_UNIX if self.unix_socket else socket.AF_INET, socket.SOCK_STREAM) as s:
+                s.settimeout(self.timeout)
+                s.connect(self.unix_socket or (self.host, self.port))
+                self.v_print(f"Connected to server at {self.unix_socket or f'{self.host}:{self.port}'}")
                 
-                # Enviar la solicitud JSON
-                s.sendall(json.dumps(request_json).encode('utf-8'))
+                # Enviar la solicitud: JSON legacy o, si se pidió otra codificación o compresión, en un frame
+                if self.encoding == wire.ENCODING_JSON and not self.compression:
+                    s.sendall(json.dumps(request_json).encode('utf-8'))
+                else:
+                    s.sendall(wire.encode_frame(request_json, self.encoding))
                 self.v_print("Request sent.")
 
                 # Recibir la respuesta (leer hasta que el servidor cierre la conexión)
@@ -67,7 +112,13 @@ class SingletonClient:
                         break
                     chunks.append(data_chunk)
                 response_data = b"".join(chunks)
-                response_str = response_data.decode('utf-8')
+                if wire.is_framed(response_data):
+                    messages = wire.FrameReader().feed(response_data)
+                    self.v_print(f"Framed response received ({len(response_data)} bytes)")
+                    if messages:
+                        self.handle_response(messages[0])
+                        return True
+                response_str = response_data.decode('utf-8', errors='replace')
                 self.v_print(f"Raw response received: {response_str}")
 
                 try:
@@ -78,13 +129,17 @@ class SingletonClient:
                     self.handle_response(response_str) # Mostrar error o texto plano
 
         except socket.error as e:
+            if not is_last_attempt:
+                self.v_print(f"Socket Error: {e}")
+                return False
             print(f"Socket Error: {e}", file=sys.stderr)
         except Exception as e:
             print(f"An unexpected error occurred: {e}", file=sys.stderr)
+        return True
 
     def handle_response(self, response):
         # Manejar la respuesta: guardar en archivo -o o imprimir en salida estándar [cite: 76, 285]
-        output_content = json.dumps(response, indent=4)
+        output_content = json.dumps(response, indent=4, default=wire.json_default)
         
         if self.output_file:
             try:
@@ -97,23 +152,165 @@ class SingletonClient:
             # Imprimir a salida estándar
             print(output_content)
 
+    def run_batch(self, batch_file, concurrency=8, ordered=False, timeout=10.0, endpoints=None,
+                  hedge=False, adaptive_timeouts=False):
+        # Modo batch: un JSON por línea (archivo o '-' para stdin), ejecutados en paralelo sobre
+        # conexiones persistentes; cada resultado se escribe como una línea JSONL apenas termina
+        # (o en el orden de entrada con 'ordered'). Al final se imprime un resumen en stderr.
+        client = CorporateClient(self.host, self.port, client_uuid=self.cpu_uuid, timeout=timeout,
+                                 pool_size=concurrency, encoding=self.encoding, compression=self.compression,
+                                 endpoints=[(self.unix_socket, None) if self.unix_socket else (self.host, self.port)]
+                                           + list(endpoints or []),
+                                 hedge=hedge, adaptive_timeouts=adaptive_timeouts)
+        source = sys.stdin if batch_file == '-' else open(batch_file, 'r', encoding='utf-8')
+        out = open(self.output_file, 'w', encoding='utf-8') if self.output_file else sys.stdout
+        statuses = Counter()
+        latencies = []
+        window = concurrency * 4  # Solicitudes en vuelo como máximo (stdin puede no terminar nunca)
+
+        pending = deque()
+
+        def emit(future):
+            record = future.result()
+            if "response" in record:
+                statuses[record["response"].get("status", "Unknown")] += 1
+                latencies.append(record["latency_ms"])
+            else:
+                statuses["Failed"] += 1
+            out.write(json.dumps(record, default=wire.json_default) + "\n")
+            out.flush()
+
+        def drain(limit):
+            # Escribir resultados hasta que queden como mucho 'limit' solicitudes en vuelo
+            while len(pending) > limit:
+                if ordered:
+                    emit(pending.popleft())
+                    continue
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    emit(future)
+
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                for line_number, line in enumerate(source, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    pending.append(executor.submit(self._batch_call, client, line_number, line))
+                    drain(window - 1)
+                drain(0)
+        finally:
+            if hedge or adaptive_timeouts:
+                self.v_print(f"Client stats: {json.dumps(client.client_stats())}")
+            client.close()
+            if source is not sys.stdin:
+                source.close()
+            if out is not sys.stdout:
+                out.close()
+        self.print_batch_summary(statuses, latencies, time.perf_counter() - start)
+
+    def _batch_call(self, client, line_number, line):
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError:
+            return {"line": line_number, "error": "Invalid JSON"}
+        if not isinstance(request, dict) or not request.get("ACTION"):
+            return {"line": line_number, "error": "Missing ACTION"}
+        fields = {k: v for k, v in request.items() if k not in ("ACTION", "UUID")}
+        action = request["ACTION"]
+        # El mismo REQUEST_ID en todos los intentos: el servidor no repite la escritura
+        if self.retries and action in IDEMPOTENT_ACTIONS:
+            fields.setdefault("REQUEST_ID", str(uuid.uuid4()))
+        # También el mismo TRACE_ID: los reintentos aparecen juntos en las trazas del servidor
+        if self.trace:
+            fields.setdefault("TRACE_ID", uuid.uuid4().hex)
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                response = client.request(action, **fields)
+                result = {"line": line_number, "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+                          "response": response}
+                if "TRACE_ID" in fields:
+                    result["trace_id"] = fields["TRACE_ID"]
+                return result
+            except (OSError, wire.FrameError) as e:
+                error = str(e) or e.__class__.__name__
+                if attempt < self.retries:
+                    time.sleep(random.uniform(0, min(2.0, 0.1 * (2 ** attempt))))
+            except Exception as e:
+                # Cualquier otro error (p. ej. una solicitud que no se puede codificar) no se reintenta:
+                # la línea queda con su error y el batch sigue con las demás
+                error = f"{e.__class__.__name__}: {e}"
+                break
+        self.v_print(f"Line {line_number} failed: {error}")
+        return {"line": line_number, "error": error}
+
+    @staticmethod
+    def print_batch_summary(statuses, latencies, elapsed):
+        total = sum(statuses.values())
+        print(f"Batch: {total} requests in {elapsed:.3f}s ({total / elapsed if elapsed > 0 else 0:.1f} req/s); "
+              + ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items())), file=sys.stderr)
+        if latencies:
+            latencies.sort()
+            def percentile(p):
+                return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+            print(f"Latency ms: min {latencies[0]:.2f}, p50 {percentile(50):.2f}, p95 {percentile(95):.2f}, "
+                  f"p99 {percentile(99):.2f}, max {latencies[-1]:.2f}", file=sys.stderr)
+
 if __name__ == "__main__":
     # Configurar argparse para los argumentos -i, -o, -v [cite: 131, 276]
     # (También agregué -s y -p para la dirección del servidor)
     parser = argparse.ArgumentParser(description="Singleton Client for TPFI IS2.")
-    parser.add_argument("-i", dest="input_file", required=True, help="Input JSON file with the request.")
-    parser.add_argument("-o", dest="output_file", help="Optional output JSON file to store the response.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("-i", dest="input_file", help="Input JSON file with the request.")
+    source.add_argument("-b", dest="batch_file", help="Batch mode: JSONL file with one request per line ('-' reads stdin).")
+    parser.add_argument("-o", dest="output_file", help="Optional output JSON file to store the response (JSONL in batch mode).")
     parser.add_argument("-v", action="store_true", help="Enable verbose/debug mode.")
     parser.add_argument("-s", dest="server_host", default="localhost", help="Server host (default: localhost).")
     parser.add_argument("-p", dest="server_port", type=int, default=8080, help="Server port (default: 8080).")
+    parser.add_argument("-u", dest="unix_socket", metavar="PATH", help="Connect through the server's Unix domain socket instead of TCP (-s/-p are ignored).")
+    parser.add_argument("-e", dest="encoding", choices=wire.ENCODINGS, default=wire.ENCODING_JSON, help="Wire encoding: json (legacy) or binary (default: json).")
+    parser.add_argument("-z", dest="compression", choices=wire.COMPRESSIONS, help="Accept compressed responses (zlib).")
+    parser.add_argument("-r", dest="retries", type=int, default=0, help="Retries on socket errors; writes get a REQUEST_ID so retries are safe (default: 0).")
+    parser.add_argument("-c", dest="concurrency", type=int, default=8, help="Batch mode: concurrent requests and pooled connections (default: 8).")
+    parser.add_argument("-t", dest="timeout", type=float, default=None, help="Per-request timeout in seconds (default: none, 10 in batch mode).")
+    parser.add_argument("--endpoint", dest="endpoints", action="append", default=[], metavar="HOST:PORT", help="Batch mode: additional server instance, HOST:PORT or unix:PATH (repeatable); requests are spread round-robin.")
+    parser.add_argument("--hedge", action="store_true", help="Batch mode: duplicate slow get/list/mget to another endpoint after their p95 latency.")
+    parser.add_argument("--adaptive-timeout", action="store_true", help="Batch mode: per-action timeouts from observed p99 latency, capped by -t.")
+    parser.add_argument("--trace", action="store_true", help="Attach a TRACE_ID to each request, to find it in the server's logs and --trace-file.")
+    parser.add_argument("--ordered", action="store_true", help="Batch mode: write results in input order instead of completion order.")
     
     args = parser.parse_args()
+    if args.retries < 0:
+        parser.error("-r must be 0 or greater")
 
     client = SingletonClient(
         host=args.server_host,
         port=args.server_port,
         input_file=args.input_file,
         output_file=args.output_file,
-        verbose=args.v
+        verbose=args.v,
+        retries=args.retries,
+        encoding=args.encoding,
+        compression=args.compression,
+        timeout=args.timeout,
+        unix_socket=args.unix_socket,
+        trace=args.trace
     )
-    client.send_request()
\ No newline at end of file
+    if args.batch_file:
+        endpoints = []
+        for endpoint in args.endpoints:
+            if endpoint.startswith("unix:"):
+                endpoints.append((endpoint[len("unix:"):], None))
+                continue
+            endpoint_host, _, endpoint_port = endpoint.rpartition(":")
+            if not endpoint_host or not endpoint_port.isdigit():
+                parser.error(f"Invalid --endpoint '{endpoint}', expected HOST:PORT or unix:PATH")
+            endpoints.append((endpoint_host, int(endpoint_port)))
+        client.run_batch(args.batch_file, concurrency=max(1, args.concurrency), ordered=args.ordered,
+                         timeout=args.timeout or 10.0, endpoints=endpoints, hedge=args.hedge,
+                         adaptive_timeouts=args.adaptive_timeout)
+    else:
+        client.send_request()
\ No newline at end of file
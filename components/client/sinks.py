@@ -0,0 +1,204 @@
+# sinks.py
+# Destinos para las notificaciones del cliente Observer
+# - PrettySink: formato original (JSON con indent=4), visible apenas llega cada notificación
+# - JSONLSink: una línea por notificación, con buffer (flush por tiempo/tamaño), política de
+#   fsync, rotación por tamaño y compresión gzip de los archivos rotados
+# - SQLiteSink: espejo local de CorporateData (upsert por id) para consultar con SQL
+import gzip
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+# Permitir importar el paquete compartido components.common al ejecutar desde este directorio
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from components.common import wire
+
+FSYNC_NEVER = "never"    # El sistema operativo decide cuándo escribir a disco
+FSYNC_FLUSH = "flush"    # fsync después de cada flush del buffer
+FSYNC_ALWAYS = "always"  # flush + fsync por cada notificación
+FSYNC_POLICIES = (FSYNC_NEVER, FSYNC_FLUSH, FSYNC_ALWAYS)
+
+SINKS = ("pretty", "jsonl", "sqlite")
+
+class PrettySink:
+    def __init__(self, path):
+        # El archivo queda abierto: una escritura por notificación en lugar de open/write/close
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def write(self, update):
+        content = json.dumps(update, indent=4, default=wire.json_default) + "\n"  # Nueva línea entre JSONs
+        with self._lock:
+            self._file.write(content)
+            self._file.flush()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+class _BufferedSink:
+    # Un hilo vacía el buffer cada 'flush_interval' segundos aunque no lleguen más notificaciones
+    def __init__(self, flush_interval=1.0):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.flushes = 0
+        self.flush_errors = 0
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+
+    def _flush_periodically(self):
+        # Un error de disco (lleno, archivo rotado por otro proceso, base bloqueada) no detiene el
+        # hilo: se registra y se vuelve a intentar en el próximo intervalo
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except (OSError, sqlite3.Error) as e:
+                self.flush_errors += 1
+                logging.error("Sink flush failed: %s", e)
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        self._stopped.set()
+        self._flusher.join()
+        with self._lock:
+            self._flush_locked()
+            self._close_locked()
+
+class JSONLSink(_BufferedSink):
+    def __init__(self, path, flush_interval=1.0, flush_bytes=64 * 1024, fsync=FSYNC_NEVER,
+                 max_bytes=0, backups=5, compress=True):
+        self.path = path
+        self.flush_bytes = flush_bytes
+        self.fsync = fsync
+        self.max_bytes = max_bytes  # Tamaño a partir del cual se rota el archivo (0 = nunca)
+        self.backups = backups      # Archivos rotados que se conservan (path.1 es el más nuevo)
+        self.compress = compress
+        self._pending = []
+        self._pending_bytes = 0
+        self._file = open(path, 'ab')
+        self._size = self._file.tell()
+        self._compressor = None  # Hilo que comprime el último archivo rotado
+        self.rotations = 0
+        super().__init__(flush_interval)
+
+    def write(self, update):
+        line = json.dumps(update, separators=(',', ':'), default=wire.json_default).encode('utf-8') + b"\n"
+        with self._lock:
+            self._pending.append(line)
+            self._pending_bytes += len(line)
+            if self._pending_bytes >= self.flush_bytes or self.fsync == FSYNC_ALWAYS:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        data = b"".join(self._pending)
+        self._pending = []
+        self._pending_bytes = 0
+        if self.max_bytes and self._size and self._size + len(data) > self.max_bytes:
+            self._rotate_locked()
+        self._file.write(data)
+        self._file.flush()
+        if self.fsync != FSYNC_NEVER:
+            os.fsync(self._file.fileno())
+        self._size += len(data)
+        self.flushes += 1
+
+    def _backup_name(self, index):
+        return f"{self.path}.{index}" + (".gz" if self.compress else "")
+
+    def _rotate_locked(self):
+        self._file.close()
+        if self._compressor is not None:
+            self._compressor.join()  # path.1 todavía se está comprimiendo
+        if self.backups > 0:
+            oldest = self._backup_name(self.backups)
+            if os.path.exists(oldest):
+                os.remove(oldest)
+            for index in range(self.backups - 1, 0, -1):
+                if os.path.exists(self._backup_name(index)):
+                    os.replace(self._backup_name(index), self._backup_name(index + 1))
+            rotated = f"{self.path}.1"
+            os.replace(self.path, rotated)
+            if self.compress:
+                # Comprimir fuera del lock: las notificaciones siguen escribiéndose en el archivo nuevo
+                self._compressor = threading.Thread(target=self._gzip, args=(rotated,), daemon=True)
+                self._compressor.start()
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'ab')
+        self._size = 0
+        self.rotations += 1
+
+    @staticmethod
+    def _gzip(path):
+        with open(path, 'rb') as source, gzip.open(path + ".gz", 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.remove(path)
+
+    def _close_locked(self):
+        self._file.close()
+        if self._compressor is not None:
+            self._compressor.join()
+
+class SQLiteSink(_BufferedSink):
+    def __init__(self, path, flush_interval=1.0, batch_size=500, fsync=FSYNC_NEVER):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = {}  # id -> (JSON del item, instante); dentro de un lote gana el último
+        # La conexión se usa desde el hilo del observer y desde el de flush (siempre bajo el lock)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=" + ("FULL" if fsync != FSYNC_NEVER else "NORMAL"))
+        self._db.execute("CREATE TABLE IF NOT EXISTS CorporateData ("
+                         "id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)")
+        self._db.commit()
+        self.fsync = fsync
+        self.upserts = 0
+        super().__init__(flush_interval)
+
+    def write(self, update):
+        # set/patch notifican un item; mset, una lista de items
+        items = update if isinstance(update, list) else [update]
+        now = time.time()
+        with self._lock:
+            for item in items:
+                if isinstance(item, dict) and item.get("id") is not None:
+                    self._pending[str(item["id"])] = (json.dumps(item, default=wire.json_default), now)
+            if len(self._pending) >= self.batch_size or self.fsync == FSYNC_ALWAYS:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        rows = [(item_id, data, updated_at) for item_id, (data, updated_at) in self._pending.items()]
+        self._pending = {}
+        self._db.executemany(
+            "INSERT INTO CorporateData (id, data, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at", rows)
+        self._db.commit()
+        self.upserts += len(rows)
+        self.flushes += 1
+
+    def _close_locked(self):
+        self._db.close()
+
+def open_sink(kind, path, flush_interval=1.0, flush_bytes=64 * 1024, fsync=FSYNC_NEVER,
+              max_bytes=0, backups=5, compress=True):
+    if kind == "jsonl":
+        return JSONLSink(path, flush_interval=flush_interval, flush_bytes=flush_bytes, fsync=fsync,
+                         max_bytes=max_bytes, backups=backups, compress=compress)
+    if kind == "sqlite":
+        return SQLiteSink(path, flush_interval=flush_interval, fsync=fsync)
+    return PrettySink(path)
@@ -0,0 +1,5 @@
+# Common modules shared by the server and the clients (wire protocol)
+from . import binary_codec
+from . import wire
+
+__all__ = ['binary_codec', 'wire']
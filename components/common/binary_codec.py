@@ -0,0 +1,195 @@
+# binary_codec.py
+# Codificación binaria compacta (alternativa a JSON) para las respuestas y notificaciones
+#
+# Formato: 1 byte de versión seguido de un valor etiquetado:
+#   tag (1 byte) + contenido; los enteros sin signo se codifican como varint (LEB128)
+#   - int: zigzag varint          - float: 8 bytes IEEE 754 (big endian)
+#   - Decimal: varint largo + texto ASCII (se decodifica como Decimal, sin pasar por float)
+#   - str/bytes: varint largo + bytes
+#   - list: varint cantidad + valores
+#   - dict: varint cantidad + (clave, valor); la clave es un varint k:
+#       k == 0 -> clave nueva (varint largo + UTF-8), se agrega al diccionario del mensaje
+#       k >= 1 -> referencia a la entrada k-1 del diccionario (STATIC_KEYS + claves nuevas)
+#     Así las claves repetidas de un 'list' (id, telefono, ...) ocupan 1 byte por aparición
+import struct
+from decimal import Decimal
+
+VERSION = 1
+
+T_NONE = 0
+T_FALSE = 1
+T_TRUE = 2
+T_INT = 3
+T_FLOAT = 4
+T_DECIMAL = 5
+T_STR = 6
+T_BYTES = 7
+T_LIST = 8
+T_DICT = 9
+
+# Diccionario compartido de nombres de atributo (no cambiar el orden: es parte del protocolo)
+STATIC_KEYS = (
+    "id", "status", "data", "message", "missing", "unprocessed", "stale", "results",
+    "written", "failed", "retry_after", "replayed",
+    "UUID", "ACTION", "ID", "IDS", "ITEMS", "REQUEST_ID", "REMOVE", "ENCODING",
+    "telefono", "web", "sede", "localidad", "provincia", "domicilio", "cp", "CUIT",
+    "nombre", "descripcion", "seqID", "idSeq", "idreq",
+)
+_STATIC_INDEX = {key: index for index, key in enumerate(STATIC_KEYS)}
+
+_DOUBLE = struct.Struct('>d')
+
+# Anidamiento máximo de listas/diccionarios al decodificar (DynamoDB admite 32 niveles por item);
+# un mensaje malicioso muy anidado agotaría la pila de Python
+MAX_DEPTH = 64
+
+class BinaryDecodeError(ValueError):
+    pass
+
+def _write_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def encode(obj):
+    out = bytearray((VERSION,))
+    _encode(obj, out, dict(_STATIC_INDEX))
+    return bytes(out)
+
+def _encode(obj, out, keys):
+    kind = type(obj)
+    if kind is str:
+        data = obj.encode('utf-8')
+        out.append(T_STR)
+        _write_varint(len(data), out)
+        out += data
+    elif kind is dict:
+        out.append(T_DICT)
+        _write_varint(len(obj), out)
+        for key, value in obj.items():
+            if type(key) is not str:
+                key = str(key)
+            index = keys.get(key)
+            if index is None:
+                keys[key] = len(keys)
+                data = key.encode('utf-8')
+                out.append(0)
+                _write_varint(len(data), out)
+                out += data
+            else:
+                _write_varint(index + 1, out)
+            _encode(value, out, keys)
+    elif kind is list or kind is tuple or kind is set or kind is frozenset:
+        out.append(T_LIST)
+        _write_varint(len(obj), out)
+        for value in obj:
+            _encode(value, out, keys)
+    elif kind is Decimal:
+        data = str(obj).encode('ascii')
+        out.append(T_DECIMAL)
+        _write_varint(len(data), out)
+        out += data
+    elif obj is None:
+        out.append(T_NONE)
+    elif kind is bool:
+        out.append(T_TRUE if obj else T_FALSE)
+    elif kind is int:
+        out.append(T_INT)
+        _write_varint(obj << 1 if obj >= 0 else ((-obj) << 1) - 1, out)  # zigzag
+    elif kind is float:
+        out.append(T_FLOAT)
+        out += _DOUBLE.pack(obj)
+    elif kind is bytes or kind is bytearray:
+        out.append(T_BYTES)
+        _write_varint(len(obj), out)
+        out += obj
+    elif hasattr(obj, 'value') and isinstance(obj.value, (bytes, bytearray)):
+        _encode(bytes(obj.value), out, keys)  # boto3.dynamodb.types.Binary
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        _encode(list(obj), out, keys)
+    elif isinstance(obj, (bool, int, float, str, Decimal, dict)):
+        # Subclases (p.ej. OrderedDict): codificar como el tipo base
+        for base in (bool, int, float, str, Decimal, dict):
+            if isinstance(obj, base):
+                return _encode(base(obj), out, keys)
+    else:
+        raise TypeError(f"Object of type {kind.__name__} is not binary serializable")
+
+def decode(data):
+    if not data or data[0] != VERSION:
+        raise BinaryDecodeError("Unsupported binary encoding version")
+    try:
+        value, pos = _decode(data, 1, list(STATIC_KEYS), 0)
+    except (IndexError, UnicodeDecodeError, struct.error, ArithmeticError, RecursionError) as e:
+        raise BinaryDecodeError(f"Malformed binary message: {e}") from e
+    if pos != len(data):
+        raise BinaryDecodeError("Trailing bytes after binary message")
+    return value
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+def _read_bytes(data, pos, length):
+    end = pos + length
+    if end > len(data):
+        raise IndexError("length out of range")
+    return bytes(data[pos:end]), end
+
+def _decode(data, pos, keys, depth):
+    tag = data[pos]
+    pos += 1
+    if tag == T_STR:
+        length, pos = _read_varint(data, pos)
+        raw, pos = _read_bytes(data, pos, length)
+        return raw.decode('utf-8'), pos
+    if tag in (T_DICT, T_LIST) and depth >= MAX_DEPTH:
+        raise BinaryDecodeError(f"Binary message nested deeper than {MAX_DEPTH} levels")
+    if tag == T_DICT:
+        count, pos = _read_varint(data, pos)
+        result = {}
+        for _ in range(count):
+            index, pos = _read_varint(data, pos)
+            if index == 0:
+                length, pos = _read_varint(data, pos)
+                raw, pos = _read_bytes(data, pos, length)
+                key = raw.decode('utf-8')
+                keys.append(key)
+            else:
+                key = keys[index - 1]
+            result[key], pos = _decode(data, pos, keys, depth + 1)
+        return result, pos
+    if tag == T_LIST:
+        count, pos = _read_varint(data, pos)
+        result = []
+        for _ in range(count):
+            value, pos = _decode(data, pos, keys, depth + 1)
+            result.append(value)
+        return result, pos
+    if tag == T_DECIMAL:
+        length, pos = _read_varint(data, pos)
+        raw, pos = _read_bytes(data, pos, length)
+        return Decimal(raw.decode('ascii')), pos
+    if tag == T_INT:
+        value, pos = _read_varint(data, pos)
+        return (value >> 1) if not value & 1 else -((value + 1) >> 1), pos
+    if tag == T_NONE:
+        return None, pos
+    if tag == T_TRUE:
+        return True, pos
+    if tag == T_FALSE:
+        return False, pos
+    if tag == T_FLOAT:
+        return _DOUBLE.unpack_from(data, pos)[0], pos + 8
+    if tag == T_BYTES:
+        length, pos = _read_varint(data, pos)
+        return _read_bytes(data, pos, length)
+    raise BinaryDecodeError(f"Unknown tag {tag}")
@@ -0,0 +1,285 @@
+# wire.py
+# Protocolo de transporte compartido por el servidor y los clientes
+#
+# Modo legacy (por defecto): el JSON se envía tal cual, sin delimitadores.
+# Modo con frames (negociado): cada mensaje es
+#   MAGIC (1 byte) + flags (1 byte) + largo del payload (4 bytes, big endian) + payload
+# El bit FLAG_BINARY indica que el payload usa binary_codec en vez de JSON UTF-8.
+# El bit FLAG_ZLIB indica que el payload está comprimido con zlib (deflate).
+# El bit FLAG_KEEPALIVE en una solicitud pide mantener la conexión abierta para más solicitudes;
+# el servidor lo devuelve en la respuesta solo si efectivamente la mantiene.
+# Un cliente pide el modo con frames enviando su solicitud en un frame, o agregando
+# "ENCODING": "json" | "binary" y/o "COMPRESSION": "zlib" a una solicitud JSON legacy.
+# El formato negociado se representa como texto: "json", "binary", "json+zlib", "binary+zlib".
+import json
+import re
+import socket
+import struct
+import time
+import zlib
+from decimal import Decimal
+from . import binary_codec
+
+MAGIC = 0xA7  # Nunca es el primer byte de un JSON ('{', '[', espacios)
+HEADER = struct.Struct('>BBI')
+FLAG_BINARY = 0x01
+FLAG_ZLIB = 0x02
+FLAG_KEEPALIVE = 0x04
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+# Bytes que cambian el estado del escaneo de un stream JSON (fuera de ellos todo se saltea)
+_JSON_TOKENS = re.compile(rb'[\[\]{}"\\]')
+_JSON_START = re.compile(rb'\S')
+
+ENCODING_JSON = "json"
+ENCODING_BINARY = "binary"
+ENCODINGS = (ENCODING_JSON, ENCODING_BINARY)
+
+COMPRESSION_ZLIB = "zlib"
+COMPRESSIONS = (COMPRESSION_ZLIB,)
+
+# Aviso que reciben los observadores suscriptos con "ACK" cuando el servidor se apaga ordenadamente:
+# pueden reconectarse enseguida en lugar de esperar a que el reintento falle
+SHUTDOWN_NOTICE = {"status": "SHUTDOWN", "message": "Server shutting down"}
+# Latido periódico a los mismos observadores: confirma que la conexión sigue viva en ambos sentidos
+HEARTBEAT = {"status": "HEARTBEAT"}
+# Confirmación de una suscripción con "ACK" (puede traer además "heartbeat": segundos entre latidos)
+SUBSCRIBED = {"status": "OK", "message": "Subscribed"}
+
+class FrameError(ValueError):
+    pass
+
+def is_control_message(message):
+    # Las notificaciones son items (con "id") o listas de items; los mensajes de control no
+    return isinstance(message, dict) and "status" in message and "id" not in message
+
+def is_shutdown_notice(message):
+    return is_control_message(message) and message["status"] == "SHUTDOWN"
+
+def is_heartbeat(message):
+    return is_control_message(message) and message["status"] == "HEARTBEAT"
+
+def is_subscription_confirmation(message):
+    return is_control_message(message) and message["status"] == "OK" and message.get("message") == "Subscribed"
+
+def json_default(obj):
+    # Convertir Decimal de DynamoDB a tipos JSON nativos
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode('latin-1')
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+def encode_payload(obj, encoding=ENCODING_JSON):
+    # Devuelve (payload, flags)
+    if encoding == ENCODING_BINARY:
+        return binary_codec.encode(obj), FLAG_BINARY
+    return json.dumps(obj, default=json_default).encode('utf-8'), 0
+
+def format_name(encoding, compression=None):
+    return f"{encoding}+{compression}" if compression else encoding
+
+def split_format(wire_format):
+    # "binary+zlib" -> ("binary", "zlib"); "json" -> ("json", None)
+    encoding, _, compression = (wire_format or ENCODING_JSON).partition("+")
+    return encoding, compression or None
+
+def negotiate(frame_format=None, encoding=None, compression=None):
+    # Formato de respuesta: lo pedido explícitamente en la solicitud tiene prioridad sobre
+    # lo que se deduce del frame recibido; None = JSON legacy sin frames
+    if frame_format is None and encoding is None and compression is None:
+        return None
+    frame_encoding, frame_compression = split_format(frame_format)
+    return format_name(encoding or frame_encoding, compression or frame_compression)
+
+def _decompress(payload):
+    # Limitar el tamaño descomprimido para no aceptar "bombas" de compresión
+    decompressor = zlib.decompressobj()
+    try:
+        data = decompressor.decompress(payload, MAX_FRAME_BYTES)
+    except zlib.error as e:
+        raise FrameError(f"Invalid compressed payload: {e}") from e
+    if decompressor.unconsumed_tail:
+        raise FrameError("Decompressed frame too large")
+    return data
+
+def decode_payload(payload, flags, parse_float=None):
+    # 'parse_float': como en json.loads (el servidor usa Decimal, el tipo numérico de DynamoDB)
+    if flags & FLAG_ZLIB:
+        payload = _decompress(payload)
+    try:
+        if flags & FLAG_BINARY:
+            return binary_codec.decode(payload)
+        return json.loads(bytes(payload).decode('utf-8'), parse_float=parse_float)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise FrameError(f"Invalid frame payload: {e}") from e
+
+def frame(payload, flags=0):
+    return HEADER.pack(MAGIC, flags, len(payload)) + payload
+
+def parse_header(header):
+    # Devuelve (flags, largo del payload) validando el header
+    magic, flags, length = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise FrameError("Invalid frame header")
+    if length > MAX_FRAME_BYTES:
+        raise FrameError("Frame too large")
+    return flags, length
+
+def encode_frame(obj, wire_format=ENCODING_JSON, compressor=None, flags=0):
+    # 'compressor' decide si conviene comprimir (umbral, nivel) y lleva las estadísticas;
+    # sin compressor el payload se envía sin comprimir aunque el formato lo admita.
+    # 'flags' agrega bits que no dependen del payload (p.ej. FLAG_KEEPALIVE)
+    encoding, compression = split_format(wire_format)
+    payload, payload_flags = encode_payload(obj, encoding)
+    flags |= payload_flags
+    if compression and compressor is not None:
+        payload, compressed = compressor.compress(payload)
+        if compressed:
+            flags |= FLAG_ZLIB
+    return frame(payload, flags)
+
+def is_framed(data):
+    return bool(data) and data[0] == MAGIC
+
+def recv_before(sock, size, deadline=None):
+    # recv con un plazo total (time.monotonic()): un cliente que envía de a pocos bytes
+    # no puede estirar la lectura indefinidamente
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout("Read deadline exceeded")
+        sock.settimeout(remaining)
+    return sock.recv(size)
+
+def _recv_exact(sock, size, buffer=b"", deadline=None):
+    chunks = [buffer]
+    received = len(buffer)
+    while received < size:
+        chunk = recv_before(sock, min(size - received, 1024 * 1024), deadline)
+        if not chunk:
+            raise FrameError("Connection closed in the middle of a frame")
+        chunks.append(chunk)
+        received += len(chunk)
+    data = b"".join(chunks)
+    return data[:size], data[size:]
+
+def encoding_of(flags):
+    # Formato implícito de un frame recibido: quien envía comprimido también acepta comprimido
+    encoding = ENCODING_BINARY if flags & FLAG_BINARY else ENCODING_JSON
+    return format_name(encoding, COMPRESSION_ZLIB if flags & FLAG_ZLIB else None)
+
+def recv_payload(sock, initial=b"", deadline=None):
+    # Como recv_frame, pero devuelve el payload sin decodificar: (payload, flags, bytes sobrantes)
+    if not initial:
+        initial = recv_before(sock, 65536, deadline)
+        if not initial:
+            return None, None, b""
+    header, rest = _recv_exact(sock, HEADER.size, initial, deadline)
+    flags, length = parse_header(header)
+    payload, rest = _recv_exact(sock, length, rest, deadline)
+    return payload, flags, rest
+
+def recv_frame(sock, initial=b"", deadline=None):
+    # Lee un frame completo del socket. Devuelve (objeto, flags, bytes sobrantes)
+    # o (None, None, b"") si el socket se cerró antes de empezar un frame
+    payload, flags, rest = recv_payload(sock, initial, deadline)
+    if payload is None:
+        return None, None, b""
+    return decode_payload(payload, flags), flags, rest
+
+class FrameReader:
+    # Decodificador incremental de frames: se alimenta con los bytes recibidos y devuelve
+    # los mensajes completos, sin volver a procesar los datos ya consumidos
+    def __init__(self, max_frame_bytes=MAX_FRAME_BYTES):
+        self.max_frame_bytes = max_frame_bytes
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        self._buffer += data
+        messages = []
+        pos = 0
+        buffer = self._buffer
+        while len(buffer) - pos >= HEADER.size:
+            flags, length = parse_header(bytes(buffer[pos:pos + HEADER.size]))
+            if length > self.max_frame_bytes:
+                raise FrameError("Frame too large")
+            end = pos + HEADER.size + length
+            if end > len(buffer):
+                break  # Frame incompleto: esperar más datos
+            messages.append(decode_payload(bytes(buffer[pos + HEADER.size:end]), flags))
+            pos = end
+        if pos:
+            del buffer[:pos]
+        return messages
+
+    @property
+    def pending_bytes(self):
+        return len(self._buffer)
+
+class JSONStreamReader:
+    # Decodificador incremental del modo legacy: documentos JSON concatenados sin delimitador.
+    # Cada byte se escanea una sola vez (llevando profundidad y si se está dentro de un string)
+    # y json.loads se llama una única vez por documento completo
+    def __init__(self, max_message_bytes=MAX_FRAME_BYTES):
+        self.max_message_bytes = max_message_bytes
+        self._buffer = bytearray()
+        self._pos = 0          # Próximo byte a escanear
+        self._start = None     # Inicio del documento en curso
+        self._depth = 0
+        self._in_string = False
+
+    def feed(self, data):
+        self._buffer += data
+        buffer = self._buffer
+        messages = []
+        pos = self._pos
+        consumed = 0
+        while True:
+            if self._start is None:
+                match = _JSON_START.search(buffer, pos)
+                if match is None:
+                    consumed = pos = len(buffer)  # Solo espacios entre documentos
+                    break
+                if buffer[match.start()] not in b'{[':
+                    raise FrameError("Invalid JSON stream")
+                self._start = pos = match.start()
+            match = _JSON_TOKENS.search(buffer, pos)
+            if match is None:
+                pos = max(pos, len(buffer))  # Si el último byte fue un escape, pos ya lo saltea
+                break
+            token = buffer[match.start()]
+            pos = match.end()
+            if self._in_string:
+                if token == 0x5C:    # Barra invertida: saltear el byte escapado (puede no haber llegado aún)
+                    pos += 1
+                elif token == 0x22:  # '"'
+                    self._in_string = False
+            elif token == 0x22:
+                self._in_string = True
+            elif token in b'{[':
+                self._depth += 1
+            elif token in b'}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        messages.append(json.loads(bytes(buffer[self._start:pos])))
+                    except (ValueError, UnicodeDecodeError) as e:
+                        raise FrameError(f"Invalid JSON message: {e}") from e
+                    self._start = None
+                    consumed = pos
+        if consumed:
+            del buffer[:consumed]
+            pos -= consumed
+            if self._start is not None:
+                self._start -= consumed
+        self._pos = pos
+        if self._start is not None and len(buffer) - self._start > self.max_message_bytes:
+            raise FrameError("Message too large")
+        return messages
+
+    @property
+    def pending_bytes(self):
+        return len(self._buffer)
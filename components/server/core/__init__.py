@@ -1,6 +1,20 @@
 # Core modules for design patterns
-from .db_manager import DatabaseManager
+from .db_manager import DatabaseManager, DatabaseUnavailableError, ItemNotFoundError
 from .subscription_manager import SubscriptionManager
+from .cache import ItemCache
+from .single_flight import SingleFlight
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .compression import ResponseCompressor
+from .response_cache import EncodedResponseCache
+from .connections import ConnectionTracker
+from .log_pipeline import LogPipeline, LogSampler, JSONFormatter
+from .metrics import MetricsRegistry, serve_metrics
+from .tracing import TraceRecorder, RequestTrace
+from .profiler import Profiler, TimedLock
 
-__all__ = ['DatabaseManager', 'SubscriptionManager']
+__all__ = ['DatabaseManager', 'DatabaseUnavailableError', 'ItemNotFoundError', 'SubscriptionManager', 'ItemCache',
+           'SingleFlight', 'CircuitBreaker', 'CircuitOpenError', 'ResponseCompressor',
+           'EncodedResponseCache', 'ConnectionTracker', 'LogPipeline', 'LogSampler', 'JSONFormatter',
+           'MetricsRegistry', 'serve_metrics', 'TraceRecorder', 'RequestTrace',
+           'Profiler', 'TimedLock']
 
@@ -0,0 +1,114 @@
+# cache.py
+# Caché en memoria (LRU con TTL) de items de CorporateData
+# Los items expirados se conservan hasta ser desalojados para poder servirlos como 'stale'
+# Cada escritura deja la generación en la que ocurrió: un item leído de DynamoDB antes de una
+# escritura a ese id llega tarde y no reemplaza al escrito
+import threading
+import time
+from collections import OrderedDict
+
+class ItemCache:
+    def __init__(self, max_items=10000, ttl=30.0):
+        self.max_items = max_items
+        self.ttl = ttl  # Segundos de validez de cada item (0 desactiva la caché)
+        self._items = OrderedDict()  # item_id -> (instante de expiración, item)
+        self._lock = threading.Lock()
+        self._generation = 0  # Se incrementa con cada escritura
+        self._written = OrderedDict()  # item_id -> generación de su última escritura (las más recientes)
+        self._forgotten = 0  # Generación más alta descartada de _written
+        self.hits = 0
+        self.misses = 0
+        self.stale_fills = 0  # Lecturas descartadas por haber empezado antes de una escritura
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_items > 0
+
+    def get(self, item_id):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._items.get(item_id)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._items.move_to_end(item_id)
+            self.hits += 1
+            return entry[1]
+
+    def get_stale(self, item_id):
+        # Devuelve el item aunque haya expirado (para servir datos viejos si DynamoDB no responde)
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._items.get(item_id)
+            return entry[1] if entry is not None else None
+
+    def get_many(self, item_ids):
+        # Devuelve ({id: item} encontrados en caché, [ids que faltan])
+        found = {}
+        missing = []
+        for item_id in item_ids:
+            item = self.get(item_id)
+            if item is None:
+                missing.append(item_id)
+            else:
+                found[item_id] = item
+        return found, missing
+
+    def generation(self):
+        # Se toma antes de consultar DynamoDB y se pasa a put() con el resultado
+        with self._lock:
+            return self._generation
+
+    def _written_since_locked(self, item_id, generation):
+        mark = self._written.get(item_id)
+        if mark is None:
+            # Sin marca: pudo haberse descartado una posterior a la lectura (se descarta por las dudas)
+            return generation < self._forgotten
+        return mark > generation
+
+    def _store_locked(self, item):
+        self._items[item['id']] = (time.monotonic() + self.ttl, item)
+        self._items.move_to_end(item['id'])
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)  # Descartar el menos usado
+
+    def put(self, item, generation):
+        # Item leído de DynamoDB; 'generation' es la de antes de la lectura
+        if not self.enabled or not item or 'id' not in item:
+            return
+        with self._lock:
+            if self._written_since_locked(item['id'], generation):
+                self.stale_fills += 1
+                return
+            self._store_locked(item)
+
+    def put_many(self, items, generation):
+        for item in items:
+            self.put(item, generation)
+
+    def write(self, item):
+        # Item recién escrito por este servidor: reemplaza al cacheado y marca la escritura
+        if not self.enabled or not item or 'id' not in item:
+            return
+        with self._lock:
+            self._generation += 1
+            self._written[item['id']] = self._generation
+            self._written.move_to_end(item['id'])
+            while len(self._written) > self.max_items:
+                _, forgotten = self._written.popitem(last=False)
+                self._forgotten = max(self._forgotten, forgotten)
+            self._store_locked(item)
+
+    def write_many(self, items):
+        for item in items:
+            self.write(item)
+
+    def invalidate(self, item_id):
+        with self._lock:
+            self._items.pop(item_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
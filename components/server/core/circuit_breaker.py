@@ -0,0 +1,87 @@
+# circuit_breaker.py
+# Circuit breaker para las llamadas a DynamoDB: tras varios errores (o llamadas
+# demasiado lentas) seguidos deja de llamar y falla rápido durante un tiempo.
+# Con 'is_failure' solo cuentan los errores de disponibilidad; el resto (errores del pedido) no
+import logging
+import threading
+import time
+
+class CircuitOpenError(Exception):
+    pass
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, latency_threshold=2.0, reset_timeout=10.0, is_failure=None):
+        self.failure_threshold = failure_threshold  # Fallos seguidos para abrir
+        self.latency_threshold = latency_threshold  # Segundos: una llamada más lenta cuenta como fallo
+        self.reset_timeout = reset_timeout          # Segundos abierto antes de probar (half-open)
+        self.is_failure = is_failure                # excepción -> bool; None = toda excepción es un fallo
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.trips = 0     # Veces que se abrió
+        self.rejected = 0  # Llamadas rechazadas sin llegar a DynamoDB
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def call(self, fn, *args, **kwargs):
+        with self._lock:
+            state = self._current_state()
+            if state == self.OPEN or (state == self.HALF_OPEN and self._trial_in_flight):
+                self.rejected += 1
+                raise CircuitOpenError("DynamoDB circuit breaker is open")
+            is_trial = state == self.HALF_OPEN
+            if is_trial:
+                self._trial_in_flight = True  # En half-open solo pasa una llamada de prueba
+
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            # Un error del pedido (validación, condición) dice que DynamoDB respondió
+            failed = self.is_failure is None or self.is_failure(e)
+            self._record(not failed and time.monotonic() - start <= self.latency_threshold, is_trial)
+            raise
+        self._record(time.monotonic() - start <= self.latency_threshold, is_trial)
+        return result
+
+    def _record(self, success, is_trial):
+        with self._lock:
+            if is_trial:
+                self._trial_in_flight = False
+            if success:
+                # Un éxito tardío de una llamada previa a la apertura no cierra el circuito
+                if self._state != self.OPEN or is_trial:
+                    if self._state != self.CLOSED:
+                        logging.info("Circuit breaker closed: DynamoDB recovered")
+                    self._state = self.CLOSED
+                    self._failures = 0
+                return
+            self._failures += 1
+            if is_trial or (self._state == self.CLOSED and self._failures >= self.failure_threshold):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self.trips += 1
+                logging.warning("Circuit breaker opened after %d consecutive failures", self._failures)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,67 @@
+# client_limiter.py
+# Limitación de tasa por cliente (UUID): cada cliente tiene su propio token bucket
+# y cada ACTION tiene un costo en tokens (un 'list' cuesta más que un 'get')
+import threading
+from collections import OrderedDict
+from .token_bucket import TokenBucket
+
+DEFAULT_ACTION_COSTS = {
+    "get": 1,
+    "set": 1,
+    "patch": 1,
+    "update": 1,
+    "subscribe": 1,
+    "mget": 5,
+    "mset": 10,
+    "list": 10,
+    "stats": 0,
+}
+
+class ClientRateLimiter:
+    def __init__(self, rate=0, burst=None, action_costs=None, max_clients=10000):
+        self.rate = rate  # Tokens por segundo por cliente (0 desactiva el límite)
+        self.burst = burst if burst is not None else rate * 2
+        self.action_costs = dict(DEFAULT_ACTION_COSTS)
+        self.action_costs.update(action_costs or {})
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # UUID -> TokenBucket (LRU)
+        self._lock = threading.Lock()
+        self.throttled = 0
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def _bucket(self, client_uuid):
+        with self._lock:
+            bucket = self._buckets.get(client_uuid)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[client_uuid] = bucket
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)  # Olvidar al cliente inactivo más antiguo
+            else:
+                self._buckets.move_to_end(client_uuid)
+            return bucket
+
+    def check(self, client_uuid, action):
+        # Devuelve 0 si se admite la solicitud, o los segundos a esperar antes de reintentar
+        if not self.enabled:
+            return 0
+        cost = self.action_costs.get(action, 1)
+        if cost <= 0:
+            return 0
+        bucket = self._bucket(client_uuid)
+        if bucket.try_acquire(cost):
+            return 0
+        with self._lock:
+            self.throttled += 1
+        return max(bucket.wait_time(cost), 0.001)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "clients": len(self._buckets),
+                "throttled": self.throttled,
+            }
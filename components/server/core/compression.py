@@ -0,0 +1,55 @@
+# compression.py
+# Compresión zlib de respuestas y notificaciones para los clientes que la negociaron
+# Solo se comprimen los payloads de al menos 'threshold' bytes; se mide la relación
+# de compresión y el tiempo de CPU usado
+import threading
+import time
+import zlib
+
+class ResponseCompressor:
+    def __init__(self, level=6, threshold=1024):
+        self.level = level          # Nivel zlib 1-9 (0 desactiva la compresión)
+        self.threshold = threshold  # Bytes mínimos del payload para comprimir
+        self._lock = threading.Lock()
+        self.compressed = 0
+        self.skipped = 0       # Menores al umbral o que no se achicaron
+        self.bytes_in = 0      # Bytes originales de los payloads comprimidos
+        self.bytes_out = 0     # Bytes enviados de esos payloads
+        self.cpu_seconds = 0.0
+
+    @property
+    def enabled(self):
+        return self.level > 0
+
+    def compress(self, payload):
+        # Devuelve (payload a enviar, True si quedó comprimido)
+        if not self.enabled or len(payload) < self.threshold:
+            with self._lock:
+                self.skipped += 1
+            return payload, False
+        start = time.thread_time()
+        data = zlib.compress(payload, self.level)
+        elapsed = time.thread_time() - start
+        with self._lock:
+            self.cpu_seconds += elapsed
+            if len(data) >= len(payload):
+                self.skipped += 1
+                return payload, False
+            self.compressed += 1
+            self.bytes_in += len(payload)
+            self.bytes_out += len(data)
+        return data, True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "level": self.level,
+                "threshold": self.threshold,
+                "compressed": self.compressed,
+                "skipped": self.skipped,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "ratio": round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+                "cpu_seconds": round(self.cpu_seconds, 4),
+            }
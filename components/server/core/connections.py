@@ -0,0 +1,67 @@
+# connections.py
+# Conexiones abiertas del servidor y el estado de cada una, para exponer cuántas hay en cada
+# momento (stats) y cuántas se cerraron por timeout
+import socket
+import threading
+
+READING = "reading"        # Esperando la primera solicitud
+PROCESSING = "processing"  # Ejecutando una solicitud
+IDLE = "idle"              # Persistente, esperando la siguiente solicitud
+OBSERVER = "observer"      # Suscripta a las notificaciones
+STATES = (READING, PROCESSING, IDLE, OBSERVER)
+
+class ConnectionTracker:
+    def __init__(self, keepalive_idle=60, keepalive_interval=10, keepalive_count=5):
+        # TCP keepalive: detecta conexiones "medio abiertas" (el otro extremo desapareció sin FIN)
+        self.keepalive_idle = keepalive_idle
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_count = keepalive_count
+        self._states = {}  # socket -> estado
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.read_timeouts = 0  # Solicitudes que no llegaron completas a tiempo (clientes lentos)
+        self.idle_timeouts = 0  # Conexiones persistentes sin solicitudes nuevas
+
+    def configure(self, conn):
+        if not self.keepalive_idle or conn.family not in (socket.AF_INET, socket.AF_INET6):
+            return  # Los sockets Unix no tienen keepalive TCP
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # Las opciones finas no existen en todas las plataformas
+        for option, value in (("TCP_KEEPIDLE", self.keepalive_idle), ("TCP_KEEPINTVL", self.keepalive_interval),
+                              ("TCP_KEEPCNT", self.keepalive_count)):
+            if hasattr(socket, option):
+                conn.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+    def opened(self, conn):
+        with self._lock:
+            self._states[conn] = READING
+            self.accepted += 1
+
+    def set_state(self, conn, state):
+        with self._lock:
+            if conn in self._states:
+                self._states[conn] = state
+
+    def timed_out(self, state):
+        with self._lock:
+            if state == IDLE:
+                self.idle_timeouts += 1
+            else:
+                self.read_timeouts += 1
+
+    def closed(self, conn):
+        with self._lock:
+            self._states.pop(conn, None)
+
+    def stats(self):
+        with self._lock:
+            by_state = dict.fromkeys(STATES, 0)
+            for state in self._states.values():
+                by_state[state] += 1
+            return {
+                "open": len(self._states),
+                "by_state": by_state,
+                "accepted": self.accepted,
+                "read_timeouts": self.read_timeouts,
+                "idle_timeouts": self.idle_timeouts,
+            }
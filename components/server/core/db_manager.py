@@ -2,12 +2,37 @@
 # Implementa el patrón Singleton para gestionar el acceso a DynamoDB
 import boto3
 import logging
+from botocore.config import Config
+from botocore.exceptions import ConnectionError as BotoConnectionError, HTTPClientError
+import random
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .rate_governor import CapacityGovernor
+from . import tracing
+
+class DatabaseUnavailableError(Exception):
+    # DynamoDB falló (o el circuit breaker está abierto): distinto de "item inexistente"
+    pass
+
+class ItemNotFoundError(Exception):
+    # Actualización parcial de un ID que no existe (patch no crea items)
+    pass
 
 class DatabaseManager:
     _instance = None
 
+    BATCH_GET_LIMIT = 100       # Máximo de claves por llamada a BatchGetItem
+    BATCH_WRITE_LIMIT = 25      # Máximo de items por llamada a BatchWriteItem
+    BATCH_MAX_WORKERS = 8       # Bloques consultados en paralelo
+    BATCH_MAX_RETRIES = 5       # Reintentos de UnprocessedKeys
+    BATCH_BACKOFF_BASE = 0.05   # Segundos (backoff exponencial con jitter)
+    BATCH_BACKOFF_MAX = 2.0
+    SCAN_PAGE_SIZE = 100        # Items por página de scan cuando el governor está activo
+    THROTTLING_CODES = ('ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded')
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(DatabaseManager, cls).__new__(cls)
@@ -16,37 +41,254 @@ class DatabaseManager:
                 cls._instance.dynamodb = boto3.resource('dynamodb')
                 cls._instance.corporate_data_table = cls._instance.dynamodb.Table('CorporateData')
                 cls._instance.corporate_log_table = cls._instance.dynamodb.Table('CorporateLog')
+                # Scans y operaciones batch usan su propio recurso (y pool de conexiones)
+                cls._instance.bulk_dynamodb = cls._instance.dynamodb
+                cls._instance.bulk_data_table = cls._instance.corporate_data_table
+                # Todas las llamadas a DynamoDB pasan por el circuit breaker
+                cls._instance.breaker = CircuitBreaker(is_failure=cls.is_service_failure)
+                # Limitador de capacidad de salida (desactivado hasta que el servidor lo configure)
+                cls._instance.governor = CapacityGovernor()
+                # Histograma de latencia y contador de errores por operación (los asigna el servidor)
+                cls._instance.call_latency = None
+                cls._instance.call_errors = None
+                cls._instance.batch_executor = ThreadPoolExecutor(
+                    max_workers=cls.BATCH_MAX_WORKERS, thread_name_prefix="dynamodb-batch")
                 logging.info("Singleton DatabaseManager instance created. Connected to DynamoDB.")
             except Exception as e:
-                logging.error(f"Failed to connect to DynamoDB: {e}")
+                logging.error("Failed to connect to DynamoDB: %s", e)
                 cls._instance = None
         return cls._instance
 
+    def configure_connection_pools(self, point_connections, bulk_connections):
+        # Pools HTTP separados: un scan largo no puede ocupar las conexiones de los get/set
+        self.dynamodb = boto3.resource('dynamodb', config=Config(max_pool_connections=point_connections))
+        self.corporate_data_table = self.dynamodb.Table('CorporateData')
+        self.corporate_log_table = self.dynamodb.Table('CorporateLog')
+        self.bulk_dynamodb = boto3.resource('dynamodb', config=Config(max_pool_connections=bulk_connections))
+        self.bulk_data_table = self.bulk_dynamodb.Table('CorporateData')
+        logging.info("DynamoDB connection pools: %d point, %d bulk", point_connections, bulk_connections)
+
+    @staticmethod
+    def _error_code(error):
+        # Código de error de DynamoDB de una ClientError de botocore ('' si no lo es)
+        return getattr(error, 'response', {}).get('Error', {}).get('Code', '')
+
+    @classmethod
+    def is_service_failure(cls, error):
+        # Para el circuit breaker: throttling, 5xx, timeouts y errores de conexión. Los errores del
+        # pedido (ValidationException, ConditionalCheckFailed, tipos inválidos) no cuentan
+        if isinstance(error, (BotoConnectionError, HTTPClientError, OSError)):
+            return True  # HTTPClientError incluye ReadTimeoutError; OSError incluye TimeoutError
+        if cls._error_code(error) in cls.THROTTLING_CODES:
+            return True
+        status = getattr(error, 'response', {}).get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+        return status >= 500
+
+    def _check_throttled(self, error, kind):
+        # Avisar al governor si DynamoDB rechazó por capacidad aprovisionada
+        code = self._error_code(error)
+        if code in self.THROTTLING_CODES:
+            self.governor.on_throttled(kind)
+
+    def _call(self, operation, fn, **kwargs):
+        # Todas las llamadas pasan por el circuit breaker; se mide la latencia por operación
+        start = time.perf_counter()
+        try:
+            return self.breaker.call(fn, **kwargs)
+        except Exception:
+            if self.call_errors is not None:
+                self.call_errors.inc(operation)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            if self.call_latency is not None:
+                self.call_latency.observe(elapsed, operation)
+            tracing.add("db." + operation, elapsed)
+
     def get_corporate_data(self, item_id):
+        # Devuelve None si el item no existe (o el ID es inválido para DynamoDB);
+        # lanza DatabaseUnavailableError si DynamoDB falla
         try:
-            response = self.corporate_data_table.get_item(Key={'id': item_id})
+            estimate = self.governor.acquire_read(0.5)
+            response = self._call("get_item", self.corporate_data_table.get_item, Key={'id': item_id},
+                                         ReturnConsumedCapacity='TOTAL')
+            self.governor.record_read(estimate, response)
             return response.get('Item')
+        except CircuitOpenError as e:
+            raise DatabaseUnavailableError(str(e)) from e
         except Exception as e:
-            logging.error(f"Error getting item {item_id} from CorporateData: {e}")
-            return None
+            logging.error("Error getting item %s from CorporateData: %s", item_id, e)
+            if not self.is_service_failure(e):
+                return None  # Error del pedido (p. ej. ValidationException): como un item inexistente
+            self._check_throttled(e, "read")
+            raise DatabaseUnavailableError(str(e)) from e
 
     def list_corporate_data(self):
+        # Lanza DatabaseUnavailableError si DynamoDB falla (en vez de devolver una tabla vacía)
+        # Recorre todas las páginas; con el governor activo las páginas son chicas para repartir el consumo
+        params = {'ReturnConsumedCapacity': 'TOTAL'}
+        if self.governor.enabled:
+            params['Limit'] = self.SCAN_PAGE_SIZE
+        items = []
         try:
-            response = self.corporate_data_table.scan()
-            return response.get('Items', [])
+            while True:
+                estimate = self.governor.acquire_scan()
+                response = self._call("scan", self.bulk_data_table.scan, **params)
+                self.governor.record_scan(estimate, response)
+                items.extend(response.get('Items', []))
+                if 'LastEvaluatedKey' not in response:
+                    return items
+                params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        except CircuitOpenError as e:
+            raise DatabaseUnavailableError(str(e)) from e
         except Exception as e:
-            logging.error(f"Error scanning CorporateData: {e}")
-            return []
+            logging.error("Error scanning CorporateData: %s", e)
+            self._check_throttled(e, "read")
+            raise DatabaseUnavailableError(str(e)) from e
+
+    def batch_get_corporate_data(self, item_ids):
+        # Devuelve ({id: item} encontrados, [ids no procesados por error o throttling])
+        unique_ids = list(dict.fromkeys(item_ids))
+        chunks = [unique_ids[i:i + self.BATCH_GET_LIMIT]
+                  for i in range(0, len(unique_ids), self.BATCH_GET_LIMIT)]
+        found = {}
+        unprocessed = []
+        for chunk_found, chunk_unprocessed in self.batch_executor.map(tracing.bind(self._batch_get_chunk), chunks):
+            found.update(chunk_found)
+            unprocessed.extend(chunk_unprocessed)
+        return found, unprocessed
+
+    def _batch_get_chunk(self, item_ids):
+        table_name = self.bulk_data_table.name
+        request_items = {table_name: {'Keys': [{'id': item_id} for item_id in item_ids]}}
+        found = {}
+        try:
+            for attempt in range(self.BATCH_MAX_RETRIES + 1):
+                estimate = self.governor.acquire_read(0.5 * len(request_items[table_name]['Keys']), bulk=True)
+                response = self._call("batch_get_item", self.bulk_dynamodb.batch_get_item, RequestItems=request_items,
+                                             ReturnConsumedCapacity='TOTAL')
+                self.governor.record_read(estimate, response)
+                for item in response.get('Responses', {}).get(table_name, []):
+                    found[item['id']] = item
+                request_items = response.get('UnprocessedKeys') or {}
+                if not request_items:
+                    return found, []
+                if attempt < self.BATCH_MAX_RETRIES:
+                    time.sleep(self._backoff_delay(attempt))
+            logging.warning("BatchGetItem gave up with %d unprocessed keys", len(request_items[table_name]['Keys']))
+            return found, [key['id'] for key in request_items[table_name]['Keys']]
+        except CircuitOpenError as e:
+            logging.warning("BatchGetItem skipped, circuit open: %s", e)
+            return found, [item_id for item_id in item_ids if item_id not in found]
+        except Exception as e:
+            logging.error("Error in BatchGetItem on CorporateData: %s", e)
+            if not self.is_service_failure(e):
+                return found, []  # Error del pedido (p. ej. ValidationException): los IDs quedan como inexistentes
+            self._check_throttled(e, "read")
+            return found, [item_id for item_id in item_ids if item_id not in found]
+
+    def update_corporate_data(self, item_id, attributes, remove_attributes=()):
+        # Actualización parcial: solo se envían los atributos modificados (o eliminados)
+        names = {}
+        values = {}
+        set_clauses = []
+        remove_clauses = []
+        for i, (name, value) in enumerate(attributes.items()):
+            names[f"#s{i}"] = name
+            values[f":v{i}"] = value
+            set_clauses.append(f"#s{i} = :v{i}")
+        for i, name in enumerate(remove_attributes):
+            names[f"#r{i}"] = name
+            remove_clauses.append(f"#r{i}")
+
+        update_expression = ""
+        if set_clauses:
+            update_expression += "SET " + ", ".join(set_clauses)
+        if remove_clauses:
+            update_expression += " REMOVE " + ", ".join(remove_clauses)
+
+        # update_item crea el item si no existe: la condición lo impide
+        names["#id"] = "id"
+        params = {
+            'Key': {'id': item_id},
+            'UpdateExpression': update_expression.strip(),
+            'ConditionExpression': 'attribute_exists(#id)',
+            'ExpressionAttributeNames': names,
+            'ReturnValues': 'ALL_NEW',
+        }
+        if values:
+            params['ExpressionAttributeValues'] = values
+        try:
+            estimate = self.governor.acquire_write(1.0)
+            response = self._call("update_item", self.corporate_data_table.update_item, ReturnConsumedCapacity='TOTAL', **params)
+            self.governor.record_write(estimate, response)
+            logging.info("Item updated in CorporateData: %s", item_id, extra={"event": "db.write"})
+            return response.get('Attributes')
+        except Exception as e:
+            if self._error_code(e) == 'ConditionalCheckFailedException':
+                raise ItemNotFoundError(item_id) from e
+            logging.error("Error updating item %s in CorporateData: %s", item_id, e)
+            self._check_throttled(e, "write")
+            return None
+
+    def batch_set_corporate_data(self, items):
+        # Devuelve ([ids escritos], {id: motivo} de los que fallaron)
+        # BatchWriteItem no admite claves repetidas en una misma llamada: gana la última
+        unique_items = list({item['id']: item for item in items}.values())
+        chunks = [unique_items[i:i + self.BATCH_WRITE_LIMIT]
+                  for i in range(0, len(unique_items), self.BATCH_WRITE_LIMIT)]
+        written = []
+        failed = {}
+        for chunk_written, chunk_failed in self.batch_executor.map(tracing.bind(self._batch_write_chunk), chunks):
+            written.extend(chunk_written)
+            failed.update(chunk_failed)
+        logging.info("Batch set in CorporateData: %d written, %d failed", len(written), len(failed),
+                     extra={"event": "db.write"})
+        return written, failed
+
+    def _batch_write_chunk(self, items):
+        table_name = self.bulk_data_table.name
+        request_items = {table_name: [{'PutRequest': {'Item': item}} for item in items]}
+        pending = {item['id'] for item in items}
+        try:
+            for attempt in range(self.BATCH_MAX_RETRIES + 1):
+                estimate = self.governor.acquire_write(float(len(request_items[table_name])))
+                response = self._call("batch_write_item", self.bulk_dynamodb.batch_write_item, RequestItems=request_items,
+                                             ReturnConsumedCapacity='TOTAL')
+                self.governor.record_write(estimate, response)
+                request_items = response.get('UnprocessedItems') or {}
+                unprocessed = {req['PutRequest']['Item']['id'] for req in request_items.get(table_name, [])}
+                if not unprocessed:
+                    return [item['id'] for item in items], {}
+                pending = unprocessed
+                if attempt < self.BATCH_MAX_RETRIES:
+                    time.sleep(self._backoff_delay(attempt))
+            logging.warning("BatchWriteItem gave up with %d unprocessed items", len(pending))
+            return ([item['id'] for item in items if item['id'] not in pending],
+                    {item_id: "Unprocessed after retries" for item_id in pending})
+        except Exception as e:
+            logging.error("Error in BatchWriteItem on CorporateData: %s", e)
+            self._check_throttled(e, "write")
+            return ([item['id'] for item in items if item['id'] not in pending],
+                    {item_id: str(e) for item_id in pending})
+
+    def _backoff_delay(self, attempt):
+        # Backoff exponencial con "full jitter"
+        return random.uniform(0, min(self.BATCH_BACKOFF_MAX, self.BATCH_BACKOFF_BASE * (2 ** attempt)))
 
     def set_corporate_data(self, item_data):
         # Esto crea o actualiza el item
         try:
             # Asumimos que item_data es un dict que incluye la 'id'
-            self.corporate_data_table.put_item(Item=item_data)
-            logging.info(f"Item set in CorporateData: {item_data.get('id')}")
+            estimate = self.governor.acquire_write(1.0)
+            response = self._call("put_item", self.corporate_data_table.put_item, Item=item_data,
+                                         ReturnConsumedCapacity='TOTAL')
+            self.governor.record_write(estimate, response)
+            logging.info("Item set in CorporateData: %s", item_data.get('id'), extra={"event": "db.write"})
             return item_data
         except Exception as e:
-            logging.error(f"Error setting item in CorporateData: {e}")
+            logging.error("Error setting item in CorporateData: %s", e)
+            self._check_throttled(e, "write")
             return None
     
     def log_action(self, client_uuid, session_id, action, details=""):
@@ -60,8 +302,12 @@ class DatabaseManager:
                 'timestamp': datetime.now().isoformat(),
                 'details': details
             }
-            self.corporate_log_table.put_item(Item=log_entry)
-            logging.info(f"Action logged: {action} by {client_uuid}")
+            estimate = self.governor.acquire_write(1.0)
+            response = self._call("log_put_item", self.corporate_log_table.put_item, Item=log_entry,
+                                         ReturnConsumedCapacity='TOTAL')
+            self.governor.record_write(estimate, response)
+            logging.info("Action logged: %s by %s", action, client_uuid, extra={"event": "db.log_action"})
         except Exception as e:
-            logging.error(f"Error writing to CorporateLog: {e}")
+            logging.error("Error writing to CorporateLog: %s", e)
+            self._check_throttled(e, "write")
 
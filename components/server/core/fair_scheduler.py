@@ -0,0 +1,84 @@
+# fair_scheduler.py
+# Control de admisión con reparto justo: como máximo 'max_concurrent' solicitudes en
+# ejecución; cuando hay cola, los lugares libres se asignan por turnos entre clientes
+# (round-robin por UUID), así un cliente con muchas solicitudes no acapara el servidor
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+class FairScheduler:
+    def __init__(self, max_concurrent=0):
+        self.max_concurrent = max_concurrent  # 0 = sin límite
+        self._active = 0
+        self._queues = OrderedDict()  # UUID -> deque de Events en espera (orden de turno)
+        self._lock = threading.Lock()
+        self.queued = 0      # Solicitudes que tuvieron que esperar
+        self.rejected = 0    # Solicitudes que agotaron el tiempo de espera
+        self.wait_time = 0.0
+
+    @property
+    def enabled(self):
+        return self.max_concurrent > 0
+
+    def acquire(self, client_id, timeout=None):
+        if not self.enabled:
+            return True
+        with self._lock:
+            if self._active < self.max_concurrent and not self._queues:
+                self._active += 1
+                return True
+            ticket = threading.Event()
+            self._queues.setdefault(client_id, deque()).append(ticket)
+            self.queued += 1
+        start = time.monotonic()
+        granted = ticket.wait(timeout)
+        with self._lock:
+            self.wait_time += time.monotonic() - start
+            if granted or ticket.is_set():
+                return True  # El lugar se asignó (aunque sea justo al vencer el timeout)
+            queue = self._queues.get(client_id)
+            if queue is not None:
+                queue.remove(ticket)
+                if not queue:
+                    del self._queues[client_id]
+            self.rejected += 1
+            return False
+
+    def release(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            if not self._queues:
+                self._active -= 1
+                return
+            # Entregar el lugar al siguiente cliente en turno (el lugar no se libera)
+            client_id, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            if queue:
+                self._queues.move_to_end(client_id)
+            else:
+                del self._queues[client_id]
+            ticket.set()
+
+    @contextmanager
+    def slot(self, client_id, timeout=None):
+        # Uso: with scheduler.slot(uuid) as admitted: ...
+        admitted = self.acquire(client_id, timeout)
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "active": self._active,
+                "waiting": sum(len(queue) for queue in self._queues.values()),
+                "waiting_clients": len(self._queues),
+                "queued": self.queued,
+                "rejected": self.rejected,
+                "wait_seconds": round(self.wait_time, 3),
+            }
@@ -0,0 +1,85 @@
+# idempotency.py
+# Tabla de idempotencia en memoria (acotada y con TTL): un 'set' reintentado con el mismo
+# REQUEST_ID devuelve la respuesta original sin volver a escribir en DynamoDB ni notificar
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+class _Entry:
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        self.response = None
+        self.expires = 0.0
+
+class IdempotencyTable:
+    def __init__(self, ttl=300.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._in_flight = {}           # (UUID, REQUEST_ID) -> _Entry en curso
+        self._completed = OrderedDict()  # (UUID, REQUEST_ID) -> _Entry, en orden de finalización
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.replayed = 0
+
+    @staticmethod
+    def fingerprint(payload):
+        # Huella del contenido: el mismo REQUEST_ID con otro contenido es un error del cliente
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.sha1(encoded).hexdigest()
+
+    def _purge(self, now, reserve=0):
+        # Las entradas vencidas (o las más viejas si se supera el máximo) están al principio;
+        # 'reserve' deja lugar para las que se van a insertar sin pasar de 'max_entries'
+        while self._completed:
+            entry = next(iter(self._completed.values()))
+            if entry.expires > now and len(self._completed) + reserve <= self.max_entries:
+                break
+            self._completed.popitem(last=False)
+
+    def execute(self, key, payload, fn, should_store):
+        # Ejecuta fn() una sola vez por clave; los duplicados reciben la respuesta guardada
+        fingerprint = self.fingerprint(payload)
+        while True:
+            with self._lock:
+                self._purge(time.monotonic())
+                entry = self._completed.get(key) or self._in_flight.get(key)
+                if entry is None:
+                    entry = _Entry(fingerprint)
+                    self._in_flight[key] = entry
+                    self.executed += 1
+                    break
+                if entry.fingerprint != fingerprint:
+                    return {"status": "Error", "message": "REQUEST_ID already used with a different request"}
+                if key in self._completed:
+                    self.replayed += 1
+                    return dict(entry.response, replayed=True)
+            # Un duplicado concurrente espera a que termine la solicitud original
+            entry.done.wait()
+
+        response = None
+        try:
+            response = fn()
+            return response
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                # Las fallas no se recuerdan: el reintento vuelve a ejecutar la escritura
+                if response is not None and should_store(response):
+                    now = time.monotonic()
+                    self._purge(now, reserve=1)
+                    entry.response = response
+                    entry.expires = now + self.ttl
+                    self._completed[key] = entry
+            entry.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._completed),
+                "in_flight": len(self._in_flight),
+                "executed": self.executed,
+                "replayed": self.replayed,
+            }
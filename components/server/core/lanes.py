@@ -0,0 +1,38 @@
+# lanes.py
+# Carriles de ejecución: las lecturas/escrituras puntuales (get/set) no compiten con
+# los scans y las operaciones masivas (list/mget/mset), que tienen su propio límite
+from .fair_scheduler import FairScheduler
+
+FAST_LANE = "fast"
+BULK_LANE = "bulk"
+
+LANE_BY_ACTION = {
+    "get": FAST_LANE,
+    "set": FAST_LANE,
+    "patch": FAST_LANE,
+    "update": FAST_LANE,
+    "subscribe": FAST_LANE,
+    "stats": FAST_LANE,
+    "list": BULK_LANE,
+    "mget": BULK_LANE,
+    "mset": BULK_LANE,
+}
+
+class LaneRouter:
+    def __init__(self, fast_concurrency=0, bulk_concurrency=0):
+        # Cada carril reparte sus lugares por turnos entre clientes (0 = sin límite). Los límites son
+        # opcionales: el aislamiento por defecto lo dan los pools de conexiones separados
+        self.lanes = {
+            FAST_LANE: FairScheduler(max_concurrent=fast_concurrency),
+            BULK_LANE: FairScheduler(max_concurrent=bulk_concurrency),
+        }
+
+    @staticmethod
+    def lane_for(action):
+        return LANE_BY_ACTION.get(action, FAST_LANE)
+
+    def slot(self, action, client_id, timeout=None):
+        return self.lanes[self.lane_for(action)].slot(client_id, timeout)
+
+    def stats(self):
+        return {name: lane.stats() for name, lane in self.lanes.items()}
@@ -0,0 +1,162 @@
+# log_pipeline.py
+# Logging fuera del camino de las solicitudes: los hilos solo encolan el registro (sin formatearlo)
+# y un hilo de fondo lo formatea y lo escribe en stderr, por lotes (un write y un flush por lote).
+# Los mensajes frecuentes (INFO/DEBUG) se pueden muestrear y limitar por tipo; WARNING y
+# superiores siempre se escriben.
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_FORMATS = ("text", "json")
+
+# Atributos propios de un LogRecord: lo demás llegó por 'extra' y va como campo en modo json
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+class JSONFormatter(logging.Formatter):
+    # Una línea JSON por registro: campos fijos + los de 'extra' (event, action, ...)
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class LogSampler(logging.Filter):
+    # Tipo de mensaje = 'event' del extra o, si no tiene, la plantilla sin formatear (record.msg)
+    # 'sample_rates': {tipo: fracción que se escribe}; 'rate_limit': máximo por tipo y por segundo
+    def __init__(self, sample_rates=None, rate_limit=0):
+        super().__init__()
+        self.sample_rates = dict(sample_rates or {})
+        self.rate_limit = rate_limit
+        self._windows = {}  # tipo -> [segundo, registros escritos en ese segundo]
+        self._lock = threading.Lock()
+        self.passed = 0
+        self.sampled_out = 0
+        self.rate_limited = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        kind = getattr(record, "event", None) or record.msg
+        fraction = self.sample_rates.get(kind)
+        with self._lock:
+            if fraction is not None and random.random() >= fraction:
+                self.sampled_out += 1
+                return False
+            if self.rate_limit:
+                second = int(time.monotonic())
+                window = self._windows.get(kind)
+                if window is None or window[0] != second:
+                    window = self._windows[kind] = [second, 0]
+                if window[1] >= self.rate_limit:
+                    self.rate_limited += 1
+                    return False
+                window[1] += 1
+            self.passed += 1
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {"passed": self.passed, "sampled_out": self.sampled_out, "rate_limited": self.rate_limited}
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    # QueueHandler.prepare formatea el mensaje en el hilo que loguea; acá se encola tal cual
+    # y el formateo (incluido el de los argumentos) lo hace el hilo de escritura
+    def __init__(self, log_queue, max_size):
+        super().__init__(log_queue)
+        self.max_size = max_size  # Con stderr trabado la cola no crece sin límite
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if self.max_size and record.levelno < logging.WARNING and self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+class LogPipeline:
+    MAX_BATCH = 512  # Registros como máximo por escritura
+
+    def __init__(self, level=logging.INFO, log_format="text", sample_rates=None, rate_limit=0,
+                 asynchronous=True, stream=None, max_queue=100000):
+        self.level = level
+        self.log_format = log_format
+        self.sampler = LogSampler(sample_rates, rate_limit)
+        self.asynchronous = asynchronous
+        self.stream = stream or sys.stderr
+        self.formatter = JSONFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT)
+        self._queue = queue.SimpleQueue()
+        self.max_queue = max_queue
+        self._handler = None
+        self._writer = None
+        self.batches = 0
+
+    def start(self):
+        if self.asynchronous:
+            handler = self._handler = _DeferredQueueHandler(self._queue, self.max_queue)
+            self._writer = threading.Thread(target=self._write_batches, name="log-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.stop)  # Escribir lo que quedó en la cola antes de salir
+        else:
+            handler = logging.StreamHandler(self.stream)
+            handler.setFormatter(self.formatter)
+        # El filtro va en el handler: un registro descartado ni siquiera se encola
+        handler.addFilter(self.sampler)
+        root = logging.getLogger()
+        root.handlers[:] = [handler]
+        root.setLevel(self.level)
+        return self
+
+    def _write_batches(self):
+        while True:
+            batch = [self._queue.get()]  # Bloquea hasta que haya algo
+            while len(batch) < self.MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch  # Marca de stop(): escribir lo anterior y terminar
+            lines = []
+            for record in batch:
+                if record is None:
+                    break
+                try:
+                    lines.append(self.formatter.format(record) + "\n")
+                except Exception:
+                    lines.append(f"Unformattable log record: {record.msg!r}\n")
+            try:
+                self.stream.write("".join(lines))
+                self.stream.flush()
+            except (OSError, ValueError):
+                pass  # stderr cerrado: no hay dónde avisar
+            self.batches += 1
+            if stop:
+                return
+
+    def stop(self):
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def stats(self):
+        return dict(self.sampler.stats(), format=self.log_format, asynchronous=self.asynchronous,
+                    queued=self._queue.qsize(), batches=self.batches,
+                    dropped=self._handler.dropped if self._handler is not None else 0)
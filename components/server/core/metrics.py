@@ -0,0 +1,200 @@
+# metrics.py
+# Registro de métricas en memoria: contadores e histogramas con etiquetas, y métricas leídas al
+# momento de exportar (callbacks sobre los contadores que ya llevan los otros componentes).
+# Se exportan como resumen para la acción 'stats' y en formato de texto de Prometheus por HTTP.
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Segundos: de 0.5 ms (caché) a 10 s (scans grandes o DynamoDB degradado)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # tupla de etiquetas -> valor
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in self.samples()]
+
+    def snapshot(self):
+        return {",".join(map(str, labels)) or "total": value for labels, value in self.samples()}
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # tupla de etiquetas -> [conteos por bucket (+Inf al final), suma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *labels):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def _copy(self):
+        with self._lock:
+            return [(labels, list(series[0]), series[1], series[2]) for labels, series in self._series.items()]
+
+    def render(self):
+        lines = []
+        for labels, counts, total_sum, count in self._copy():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == "+Inf" else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total_sum!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+    def _percentile(self, counts, count, p):
+        # Límite superior del bucket donde cae el percentil (estimación por exceso)
+        target = p / 100 * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return round(bound * 1000, 3)
+        return None  # Por encima del último bucket
+
+    def snapshot(self):
+        result = {}
+        for labels, counts, total_sum, count in self._copy():
+            result[",".join(map(str, labels)) or "total"] = {
+                "count": count,
+                "avg_ms": round(total_sum / count * 1000, 3) if count else 0,
+                "p50_ms": self._percentile(counts, count, 50),
+                "p95_ms": self._percentile(counts, count, 95),
+                "p99_ms": self._percentile(counts, count, 99),
+            }
+        return result
+
+class CallbackMetric:
+    # Valor leído al exportar: 'fn' devuelve un número o {tupla de etiquetas: número}
+    def __init__(self, name, help_text, kind, fn, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.kind = kind  # 'gauge' o 'counter'
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        value = self.fn()
+        return list(value.items()) if isinstance(value, dict) else [((), value)]
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in self.samples()]
+
+    def snapshot(self):
+        return {",".join(map(str, labels)) or "total": value for labels, value in self.samples()}
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def callback(self, name, help_text, fn, kind="gauge", labelnames=()):
+        return self._register(CallbackMetric(name, help_text, kind, fn, labelnames))
+
+    def render(self):
+        # Formato de texto de Prometheus (version 0.0.4)
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.render()
+            except Exception as e:
+                logging.warning("Metric %s could not be collected: %s", metric.name, e)
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        # Igual que en render: una métrica que no se puede leer no deja sin 'stats' al resto
+        with self._lock:
+            metrics = list(self._metrics)
+        result = {}
+        for metric in metrics:
+            try:
+                result[metric.name] = metric.snapshot()
+            except Exception as e:
+                logging.warning("Metric %s could not be collected: %s", metric.name, e)
+        return result
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("Metrics scrape from %s: %s", self.client_address[0], format % args)
+
+def serve_metrics(registry, host, port):
+    # Endpoint HTTP /metrics en un puerto aparte, atendido por hilos propios
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+    logging.info("Metrics endpoint listening on %s:%s/metrics", host, httpd.server_address[1])
+    return httpd
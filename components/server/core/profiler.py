@@ -0,0 +1,282 @@
+# profiler.py
+# Perfilado a pedido del servidor en marcha, por una ventana de tiempo (sin reiniciarlo):
+# - 'sample': un hilo toma la pila de todos los hilos cada pocos ms (sys._current_frames) y cuenta
+#   pilas colapsadas (formato de flamegraph.pl / speedscope). Tiempo de reloj: incluye esperas
+# - 'cprofile': cada solicitud que llega durante la ventana corre con su cProfile (cProfile solo
+#   perfila el hilo que lo activa) y los resultados se juntan en un .pstats
+# En cada intervalo se escribe además un .json con el CPU por hilo y la espera en los locks vigilados.
+import cProfile
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+PROFILE_MODES = ("sample", "cprofile")
+
+class TimedLock:
+    # threading.Lock que, mientras se perfila, mide cuánto se espera para tomarlo
+    # (los contadores se actualizan con el lock tomado: no necesitan otro lock)
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timing = False
+        self.reset()
+
+    def reset(self):
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if not self.timing:
+            return self._lock.acquire(blocking, timeout)
+        if self._lock.acquire(False):
+            self.acquisitions += 1
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter()
+        if not self._lock.acquire(True, timeout):
+            return False
+        waited = time.perf_counter() - start
+        self.acquisitions += 1
+        self.contended += 1
+        self.wait_time += waited
+        self.max_wait = max(self.max_wait, waited)
+        return True
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc, tb):
+        self._lock.release()
+
+    def stats(self):
+        return {"acquisitions": self.acquisitions, "contended": self.contended,
+                "wait_ms": round(self.wait_time * 1000, 3), "max_wait_ms": round(self.max_wait * 1000, 3)}
+
+def _thread_group(name):
+    # "Thread-12 (handle_client)" -> "Thread (handle_client)": los hilos por conexión se agrupan
+    return re.sub(r"-\d+", "", name)
+
+def _thread_cpu_times():
+    # {ident: (nombre, segundos de CPU)}; vacío si la plataforma no expone el reloj por hilo
+    if not hasattr(time, "pthread_getcpuclockid"):
+        return {}
+    times = {}
+    for thread in threading.enumerate():
+        try:
+            times[thread.ident] = (thread.name, time.clock_gettime(time.pthread_getcpuclockid(thread.ident)))
+        except (OSError, TypeError):
+            pass  # El hilo terminó mientras se recorría la lista
+    return times
+
+class Profiler:
+    MAX_TOP = 20  # Pilas/funciones y hilos en el resumen
+
+    def __init__(self, output_dir, sample_interval=0.01):
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval  # Segundos entre muestras en modo 'sample'
+        self.locks = {}  # nombre -> TimedLock
+        self._lock = threading.Lock()
+        self._mode = None  # Modo de la ventana en curso (None = sin perfilar)
+        self._stop = threading.Event()
+        self._thread = None
+        self._stacks = Counter()
+        self._samples = 0
+        self._stats = None  # pstats.Stats de las solicitudes perfiladas en el intervalo
+        self._requests = 0
+        self._skipped = 0
+        self.windows = 0
+        self.files = []  # Archivos escritos por la última ventana
+        self.last_report = None
+
+    def watch_lock(self, name, lock):
+        self.locks[name] = lock
+
+    def start(self, mode="sample", duration=30.0, interval=0):
+        # Ventana de 'duration' segundos; con 'interval' se escribe un juego de archivos cada tanto
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}'")
+        if duration <= 0:
+            raise ValueError("Profile duration must be positive")
+        if interval and interval < 1:
+            raise ValueError("Profile interval must be at least 1 second")  # Un juego de archivos por segundo
+        with self._lock:
+            if self._thread is not None:
+                raise ValueError("A profile is already running")
+            os.makedirs(self.output_dir, exist_ok=True)
+            self._stop.clear()
+            self._reset_interval()
+            self.files = []
+            self._mode = mode
+            for lock in self.locks.values():
+                lock.reset()
+                lock.timing = True
+            self._thread = threading.Thread(target=self._run, args=(mode, duration, interval or duration),
+                                            name="profiler", daemon=True)
+            self._thread.start()
+        logging.info("Profiling started: %s for %ss, output in %s", mode, duration, self.output_dir)
+
+    def stop(self):
+        # Termina la ventana antes de tiempo (se escribe lo acumulado); no hace nada si no hay una
+        thread = self._thread
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def _reset_interval(self):
+        self._stacks = Counter()
+        self._samples = 0
+        self._stats = None
+        self._requests = 0
+        self._skipped = 0
+
+    def _run(self, mode, duration, interval):
+        end = time.monotonic() + duration
+        try:
+            while True:
+                started = time.time()
+                cpu_before = _thread_cpu_times()
+                process_before = time.process_time()
+                interval_end = min(end, time.monotonic() + interval)
+                if mode == "sample":
+                    self._sample_until(interval_end)
+                else:
+                    self._stop.wait(max(0.0, interval_end - time.monotonic()))
+                self._write_interval(mode, started, cpu_before, process_before)
+                if self._stop.is_set() or time.monotonic() >= end:
+                    break
+        except Exception as e:
+            logging.error("Profiler failed: %s", e, exc_info=True)
+        finally:
+            with self._lock:
+                self._mode = None
+                for lock in self.locks.values():
+                    lock.timing = False
+                self._thread = None
+                self.windows += 1
+            logging.info("Profiling finished: %d files written", len(self.files))
+
+    def _sample_until(self, deadline):
+        own = threading.get_ident()
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(_thread_group(names.get(ident, str(ident))))
+                self._stacks[";".join(reversed(stack))] += 1
+            self._samples += 1
+            self._stop.wait(self.sample_interval)
+
+    # --- Modo cprofile: lo llama handle_client alrededor de cada solicitud ---
+    def request_started(self):
+        if self._mode != "cprofile":
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: un solo perfilador activo a la vez en el intérprete
+            self._skipped += 1
+            return None
+        return profile
+
+    def request_finished(self, profile):
+        profile.disable()
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self._requests += 1
+
+    def _write_interval(self, mode, started, cpu_before, process_before):
+        prefix = os.path.join(self.output_dir, "profile-" + datetime.fromtimestamp(started).strftime("%Y%m%d-%H%M%S"))
+        elapsed = time.time() - started
+        # CPU por hilo en el intervalo (un hilo creado durante el intervalo arranca de 0)
+        threads = []
+        for ident, (name, cpu) in _thread_cpu_times().items():
+            used = cpu - cpu_before.get(ident, (name, 0.0))[1]
+            if used > 0:
+                threads.append({"name": name, "cpu_ms": round(used * 1000, 3)})
+        threads.sort(key=lambda entry: entry["cpu_ms"], reverse=True)
+        groups = Counter()
+        for entry in threads:
+            groups[_thread_group(entry["name"])] += entry["cpu_ms"]
+        report = {
+            "mode": mode,
+            "started": datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+            "seconds": round(elapsed, 3),
+            "process_cpu_ms": round((time.process_time() - process_before) * 1000, 3),
+            "threads": threads[:self.MAX_TOP],
+            "thread_groups": {name: round(cpu, 3) for name, cpu in groups.most_common()},
+            "locks": {},
+        }
+        for name, lock in self.locks.items():
+            report["locks"][name] = lock.stats()
+            lock.reset()  # Aproximado: se leen sin tomar el lock vigilado
+        with self._lock:
+            stacks, samples = self._stacks, self._samples
+            stats, requests, skipped = self._stats, self._requests, self._skipped
+            self._reset_interval()
+        if mode == "sample":
+            path = prefix + ".collapsed"
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            report["samples"] = samples
+            report["top"] = [{"function": function, "samples": count}
+                             for function, count in self._leaf_counts(stacks).most_common(self.MAX_TOP)]
+        else:
+            path = prefix + ".pstats"
+            report["requests"] = requests
+            report["skipped"] = skipped
+            if stats is not None:
+                stats.dump_stats(path)
+                report["top"] = self._top_functions(stats)
+            else:
+                path = None
+        with open(prefix + ".json", 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        self.files.extend(p for p in (path, prefix + ".json") if p)
+        self.last_report = report
+        logging.info("Profile written to %s.* (%s ms CPU in %ss)", prefix, report['process_cpu_ms'], report['seconds'])
+
+    @staticmethod
+    def _leaf_counts(stacks):
+        # Muestras por función en la cima de la pila (dónde estaba cada hilo)
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves
+
+    def _top_functions(self, stats):
+        # Funciones con más tiempo propio (tottime)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:self.MAX_TOP]
+        return [{"function": f"{name} ({os.path.basename(filename)}:{line})", "calls": calls,
+                 "tottime_ms": round(tottime * 1000, 3), "cumtime_ms": round(cumtime * 1000, 3)}
+                for (filename, line, name), (_, calls, tottime, cumtime, _) in rows]
+
+    def status(self):
+        with self._lock:
+            return {"running": self._mode, "windows": self.windows, "output_dir": self.output_dir,
+                    "files": list(self.files), "last_report": self.last_report}
@@ -0,0 +1,105 @@
+# rate_governor.py
+# Limitador de salida hacia DynamoDB ajustado a la capacidad aprovisionada de la tabla
+# Presupuestos separados de lectura y escritura; los scans solo usan una fracción de la
+# capacidad de lectura y dejan una reserva para las lecturas puntuales (get)
+import threading
+from .token_bucket import TokenBucket
+
+def consumed_capacity_units(response):
+    # ConsumedCapacity es un dict en operaciones simples y una lista en las batch
+    consumed = response.get('ConsumedCapacity') if response else None
+    if consumed is None:
+        return None
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    return sum(float(entry.get('CapacityUnits', 0)) for entry in consumed)
+
+class CapacityGovernor:
+    def __init__(self, read_capacity=0, write_capacity=0, scan_fraction=0.5, read_reserve=0.2, max_wait=5.0):
+        # Capacidades en unidades por segundo (RCU/WCU); 0 desactiva el límite correspondiente
+        self.read_bucket = TokenBucket(read_capacity) if read_capacity > 0 else None
+        self.scan_bucket = TokenBucket(read_capacity * scan_fraction) if read_capacity > 0 else None
+        self.write_bucket = TokenBucket(write_capacity) if write_capacity > 0 else None
+        self.read_reserve = read_capacity * read_reserve  # RCU que los scans/batch no pueden usar
+        self.max_wait = max_wait  # Segundos máximos de espera antes de llamar igual
+        self.scan_page_estimate = 1.0  # RCU estimadas por página de scan (se ajusta con el consumo real)
+        self._lock = threading.Lock()
+        self.waited = {"read": 0.0, "scan": 0.0, "write": 0.0}    # Segundos esperados por tipo
+        self.consumed = {"read": 0.0, "scan": 0.0, "write": 0.0}  # Unidades consumidas informadas
+        self.throttled = 0
+
+    @property
+    def enabled(self):
+        return self.read_bucket is not None or self.write_bucket is not None
+
+    def _add_wait(self, kind, seconds):
+        if seconds > 0:
+            with self._lock:
+                self.waited[kind] += seconds
+
+    def acquire_read(self, units, bulk=False):
+        # Las lecturas masivas (batch) respetan la reserva de las lecturas puntuales
+        if self.read_bucket is not None:
+            reserve = self.read_reserve if bulk else 0.0
+            self._add_wait("read", self.read_bucket.acquire(units, reserve=reserve, timeout=self.max_wait))
+        return units
+
+    def acquire_scan(self):
+        # Devuelve la estimación usada, para corregirla luego con record_scan
+        estimate = self.scan_page_estimate
+        if self.read_bucket is not None:
+            waited = self.scan_bucket.acquire(estimate, timeout=self.max_wait)
+            waited += self.read_bucket.acquire(estimate, reserve=self.read_reserve, timeout=self.max_wait)
+            self._add_wait("scan", waited)
+        return estimate
+
+    def acquire_write(self, units):
+        if self.write_bucket is not None:
+            self._add_wait("write", self.write_bucket.acquire(units, timeout=self.max_wait))
+        return units
+
+    def record_read(self, estimate, response):
+        self._record("read", self.read_bucket, estimate, response)
+
+    def record_write(self, estimate, response):
+        self._record("write", self.write_bucket, estimate, response)
+
+    def record_scan(self, estimate, response):
+        consumed = self._record("scan", self.read_bucket, estimate, response)
+        if consumed is not None:
+            if self.scan_bucket is not None:
+                self.scan_bucket.adjust(consumed - estimate)
+            with self._lock:
+                # Media móvil del consumo por página
+                self.scan_page_estimate = max(0.5, 0.8 * self.scan_page_estimate + 0.2 * consumed)
+
+    def _record(self, kind, bucket, estimate, response):
+        consumed = consumed_capacity_units(response)
+        if consumed is None:
+            return None
+        with self._lock:
+            self.consumed[kind] += consumed
+        if bucket is not None:
+            bucket.adjust(consumed - estimate)  # Corregir la estimación con el consumo real
+        return consumed
+
+    def on_throttled(self, kind):
+        # DynamoDB rechazó por capacidad: vaciar el bucket para frenar las siguientes llamadas
+        with self._lock:
+            self.throttled += 1
+        buckets = [self.write_bucket] if kind == "write" else [self.read_bucket, self.scan_bucket]
+        for bucket in buckets:
+            if bucket is not None:
+                bucket.drain()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "read_tokens": round(self.read_bucket.tokens, 2) if self.read_bucket else None,
+                "write_tokens": round(self.write_bucket.tokens, 2) if self.write_bucket else None,
+                "scan_page_estimate": round(self.scan_page_estimate, 2),
+                "waited_seconds": {k: round(v, 3) for k, v in self.waited.items()},
+                "consumed_units": {k: round(v, 2) for k, v in self.consumed.items()},
+                "throttled": self.throttled,
+            }
@@ -0,0 +1,68 @@
+# response_cache.py
+# Caché de respuestas ya codificadas (bytes listos para sendall), una por variante de
+# codificación/compresión. Cada entrada queda asociada a la versión de los datos: cualquier
+# escritura (set/patch/mset) incrementa la versión y descarta todas las entradas
+import threading
+import time
+from collections import OrderedDict
+
+class EncodedResponseCache:
+    def __init__(self, ttl=30.0, max_entries=256):
+        self.ttl = ttl  # Segundos de validez (por si otro proceso escribe en DynamoDB); 0 la desactiva
+        self.max_entries = max_entries
+        self.version = 0
+        self._entries = OrderedDict()  # (clave, variante) -> (instante de expiración, bytes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.bytes_served = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def bump(self):
+        # Los datos cambiaron: nueva versión, ninguna respuesta codificada sigue siendo válida
+        with self._lock:
+            self.version += 1
+            self.invalidations += 1
+            self._entries.clear()
+
+    def get(self, key, variant):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get((key, variant))
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end((key, variant))
+            self.hits += 1
+            self.bytes_served += len(entry[1])
+            return entry[1]
+
+    def put(self, key, variant, data, version):
+        # 'version' es la leída antes de consultar los datos: si hubo una escritura en el
+        # medio la respuesta puede ser vieja y no se guarda
+        if not self.enabled:
+            return
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[(key, variant)] = (time.monotonic() + self.ttl, data)
+            self._entries.move_to_end((key, variant))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "version": self.version,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "bytes_served": self.bytes_served,
+            }
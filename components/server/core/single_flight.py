@@ -0,0 +1,55 @@
+# single_flight.py
+# Coalescencia de lecturas: las llamadas concurrentes con la misma clave
+# comparten una única consulta a DynamoDB
+import threading
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}  # clave -> _Call en curso
+        self._lock = threading.Lock()
+        self.executed = 0   # Llamadas que llegaron al backend
+        self.coalesced = 0  # Llamadas que reutilizaron el resultado de otra
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                is_leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                is_leader = True
+
+        if not is_leader:
+            # Esperar el resultado de la llamada en curso
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
@@ -4,34 +4,124 @@ import json
 import logging
 import threading
 import socket
+import time
+from components.common import wire
+from . import tracing
+from .profiler import TimedLock
 
 class SubscriptionManager:  # Este es el "Subject"
     _observers = []  # Lista de sockets de observadores
-    _lock = threading.Lock()
+    _formats = {}    # socket -> formato negociado (None = JSON legacy sin frames)
+    _acknowledged = set()  # Sockets suscriptos con "ACK": entienden mensajes de control
+    compressor = None  # ResponseCompressor del servidor, para los formatos con compresión
+    heartbeats = 0     # Latidos enviados
+    dropped = 0        # Observadores descartados porque un envío falló (conexión muerta o lenta)
+    fanout_latency = None  # Histograma (métricas del servidor): duración de cada notify
+    _lock = TimedLock()  # Mide la espera solo mientras se perfila
 
-    def attach(self, observer_socket):
+    def attach(self, observer_socket, wire_format=None, greeting=None):
+        # 'greeting' (opcional) se envía antes de agregar el socket y bajo el mismo lock que
+        # notify: el observador sabe que desde ahí no se pierde ninguna notificación
         with self._lock:
+            if greeting is not None:
+                observer_socket.sendall(self._encode(greeting, wire_format))
             if observer_socket not in self._observers:
                 self._observers.append(observer_socket)
-                logging.info(f"New observer attached. Total: {len(self._observers)}")
+                self._formats[observer_socket] = wire_format
+                if greeting is not None:
+                    self._acknowledged.add(observer_socket)
+                logging.info("New observer attached. Total: %d", len(self._observers))
 
     def detach(self, observer_socket):
         with self._lock:
             try:
                 self._observers.remove(observer_socket)
-                logging.info(f"Observer detached. Total: {len(self._observers)}")
+                self._formats.pop(observer_socket, None)
+                self._acknowledged.discard(observer_socket)
+                logging.info("Observer detached. Total: %d", len(self._observers))
             except ValueError:
                 pass  # Ya no estaba en la lista
 
     def notify(self, message_json):  # Notificar a todos
+        start = time.perf_counter()
         with self._lock:
-            logging.info(f"Notifying {len(self._observers)} observers...")
-            message_bytes = json.dumps(message_json).encode('utf-8')
+            logging.info("Notifying %d observers...", len(self._observers), extra={"event": "notify"})
+            # Codificar (y comprimir) una sola vez por cada formato en uso
+            encoded = {}
             # Iterar sobre una copia por si la lista se modifica
             for observer in list(self._observers):
+                wire_format = self._formats.get(observer)
+                message_bytes = encoded.get(wire_format)
+                if message_bytes is None:
+                    message_bytes = encoded[wire_format] = self._encode(message_json, wire_format)
                 try:
                     observer.sendall(message_bytes)
                 except socket.error:
-                    # El socket está roto o cerrado, eliminarlo
-                    self.detach(observer)
+                    # El socket está roto o cerrado, eliminarlo (ya tenemos el lock: no usar detach)
+                    self._drop_locked(observer)
+        elapsed = time.perf_counter() - start
+        if self.fanout_latency is not None:
+            self.fanout_latency.observe(elapsed)
+        tracing.add("notify", elapsed)
 
+    def heartbeat(self):
+        # Latido a los observadores que entienden mensajes de control; los que no lo reciben
+        # a tiempo (socket roto o cliente que no lee) se descartan. Devuelve cuántos se enviaron.
+        # Los legacy (sin ACK) no lo reciben: lo tomarían por una notificación. Solo se descartan
+        # si no leen una notificación a tiempo, o por TCP keepalive si la conexión quedó medio abierta
+        with self._lock:
+            sent = 0
+            encoded = {}
+            for observer in list(self._acknowledged):
+                wire_format = self._formats.get(observer)
+                message_bytes = encoded.get(wire_format)
+                if message_bytes is None:
+                    message_bytes = encoded[wire_format] = self._encode(wire.HEARTBEAT, wire_format)
+                try:
+                    observer.sendall(message_bytes)
+                    sent += 1
+                except socket.error:
+                    self._drop_locked(observer)
+            self.heartbeats += sent
+            return sent
+
+    def _drop_locked(self, observer):
+        self._observers.remove(observer)
+        self._formats.pop(observer, None)
+        self._acknowledged.discard(observer)
+        self.dropped += 1
+        # shutdown despierta al hilo de handle_client bloqueado en recv: libera el hilo y el socket
+        try:
+            observer.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        logging.info("Observer dropped. Total: %d", len(self._observers))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "observers": len(self._observers),
+                "acknowledged": len(self._acknowledged),
+                "heartbeats": self.heartbeats,
+                "dropped": self.dropped,
+            }
+
+    def close_all(self):
+        # Apagado ordenado: avisar a quien lo entiende y cerrar todas las suscripciones
+        with self._lock:
+            logging.info("Closing %d observers...", len(self._observers))
+            for observer in self._observers:
+                try:
+                    if observer in self._acknowledged:
+                        observer.sendall(self._encode(wire.SHUTDOWN_NOTICE, self._formats.get(observer)))
+                    observer.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+            self._observers.clear()
+            self._formats.clear()
+            self._acknowledged.clear()
+
+    def _encode(self, message_json, wire_format):
+        if wire_format is None:
+            return json.dumps(message_json, default=wire.json_default).encode('utf-8')
+        return wire.encode_frame(message_json, wire_format, self.compressor)
@@ -0,0 +1,69 @@
+# token_bucket.py
+# Token bucket thread-safe: 'rate' tokens por segundo con ráfagas de hasta 'capacity'
+import threading
+import time
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else float(rate)  # Ráfaga de 1 segundo
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _needed(self, tokens, reserve):
+        # Un pedido más grande que el bucket se admite con el bucket lleno y queda en deuda
+        return min(tokens, self.capacity - reserve) + reserve
+
+    @property
+    def tokens(self):
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def try_acquire(self, tokens=1.0, reserve=0.0):
+        # Toma 'tokens' solo si quedan al menos 'reserve' disponibles después
+        with self._lock:
+            self._refill()
+            if self._tokens >= self._needed(tokens, reserve):
+                self._tokens -= tokens
+                return True
+            return False
+
+    def wait_time(self, tokens=1.0, reserve=0.0):
+        # Segundos hasta que 'try_acquire' pueda tener éxito
+        with self._lock:
+            self._refill()
+            missing = self._needed(tokens, reserve) - self._tokens
+            return max(0.0, missing / self.rate) if self.rate > 0 else float('inf')
+
+    def acquire(self, tokens=1.0, reserve=0.0, timeout=None):
+        # Bloquea hasta obtener los tokens; si se supera 'timeout' los toma igual (queda en deuda)
+        # Devuelve los segundos esperados
+        start = time.monotonic()
+        while not self.try_acquire(tokens, reserve):
+            delay = self.wait_time(tokens, reserve)
+            if timeout is not None:
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self.adjust(tokens)
+                    break
+                delay = min(delay, remaining)
+            time.sleep(max(delay, 0.001))
+        return time.monotonic() - start
+
+    def adjust(self, tokens):
+        # Descontar (o devolver, si es negativo) tokens ya consumidos, p.ej. según ConsumedCapacity
+        with self._lock:
+            self._refill()
+            self._tokens = max(-self.capacity, min(self.capacity, self._tokens - tokens))
+
+    def drain(self):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
@@ -0,0 +1,161 @@
+# tracing.py
+# Desglose por fases de cada solicitud (recv, parse, admit, handle, encode, send) y de las llamadas
+# a DynamoDB y a los observadores que hace (db.<operación> y notify, incluidas dentro de 'handle').
+# La traza activa vive en el hilo que atiende la solicitud: los componentes la completan con
+# mark()/add() sin recibirla como parámetro, y sin traza activa no hacen nada.
+import atexit
+import json
+import logging
+import queue
+import random
+import threading
+import time
+
+_local = threading.local()
+
+def current():
+    return getattr(_local, "trace", None)
+
+def activate(trace):
+    _local.trace = trace
+
+def mark(phase):
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace.mark(phase)
+
+def add(phase, seconds):
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace.add(phase, seconds)
+
+def bind(fn):
+    # Para tareas que corren en otro hilo (bloques de mget/mset): suman a la traza de quien las creó
+    trace = current()
+    if trace is None:
+        return fn
+    def run(*args, **kwargs):
+        activate(trace)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            activate(None)
+    return run
+
+class RequestTrace:
+    __slots__ = ("trace_id", "action", "status", "ts", "started", "phases", "_last", "_lock")
+
+    def __init__(self):
+        self.trace_id = None
+        self.action = None
+        self.status = None
+        self.ts = time.time()
+        self.started = self._last = time.perf_counter()
+        self.phases = {}  # fase -> segundos (se acumulan si se repite)
+        self._lock = threading.Lock()
+
+    def begin(self):
+        # Llegaron los primeros bytes: la espera previa (conexión inactiva) no es parte de la solicitud
+        self.ts = time.time()
+        self.started = self._last = time.perf_counter()
+
+    def mark(self, phase):
+        # Cierra la fase que termina ahora: el tiempo desde la marca anterior
+        now = time.perf_counter()
+        self.add(phase, now - self._last)
+        self._last = now
+
+    def add(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def total(self):
+        return self._last - self.started
+
+    def to_dict(self):
+        with self._lock:
+            phases = {phase: round(seconds * 1000, 3) for phase, seconds in self.phases.items()}
+        return {"ts": round(self.ts, 3), "trace_id": self.trace_id, "action": self.action,
+                "status": self.status, "total_ms": round(self.total() * 1000, 3), "phases_ms": phases}
+
+class TraceRecorder:
+    MAX_BATCH = 512  # Trazas como máximo por escritura al archivo
+
+    def __init__(self, slow_threshold=0, export_path=None, sample=1.0, max_queue=100000):
+        self.slow_threshold = slow_threshold  # Segundos; 0 = no se registran solicitudes lentas
+        self.export_path = export_path        # JSONL con una traza por solicitud (None = no se exporta)
+        self.sample = sample                  # Fracción de las solicitudes que se exportan
+        self.max_queue = max_queue
+        self.enabled = bool(slow_threshold or export_path)
+        self.traced = 0
+        self.slow = 0
+        self.exported = 0
+        self.dropped = 0
+        self._queue = queue.SimpleQueue()
+        self._writer = None
+        self._file = None
+
+    def start(self):
+        if self.export_path:
+            self._file = open(self.export_path, 'a', encoding='utf-8')
+            self._writer = threading.Thread(target=self._write_batches, name="trace-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.stop)  # Escribir las trazas encoladas antes de salir
+        return self
+
+    def begin(self):
+        # None si el trazado está desactivado: el camino de la solicitud no paga nada
+        if not self.enabled:
+            return None
+        trace = RequestTrace()
+        activate(trace)
+        return trace
+
+    def finish(self, trace):
+        activate(None)
+        self.traced += 1
+        total = trace.total()
+        if self.slow_threshold and total >= self.slow_threshold:
+            self.slow += 1
+            entry = trace.to_dict()
+            breakdown = ", ".join(f"{phase}={ms}" for phase, ms in entry["phases_ms"].items())
+            logging.warning("Slow request %s (trace %s) took %.1f ms: %s", trace.action, trace.trace_id,
+                            total * 1000, breakdown, extra={"event": "request.slow", "trace": entry})
+        if self._writer is not None and (self.sample >= 1 or random.random() < self.sample):
+            # El JSON se arma en el hilo de escritura; acá solo se encola la traza
+            if self._queue.qsize() >= self.max_queue:
+                self.dropped += 1
+            else:
+                self._queue.put(trace)
+
+    def _write_batches(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            lines = [json.dumps(trace.to_dict()) + "\n" for trace in batch if trace is not None]
+            try:
+                self._file.write("".join(lines))
+                self._file.flush()
+                self.exported += len(lines)
+            except (OSError, ValueError) as e:
+                self.dropped += len(lines)
+                logging.error("Error writing traces to %s: %s", self.export_path, e)
+            if stop:
+                return
+
+    def stop(self):
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+            self._file.close()
+
+    def stats(self):
+        return {"enabled": self.enabled, "slow_threshold_ms": round(self.slow_threshold * 1000, 3),
+                "traced": self.traced, "slow": self.slow, "exported": self.exported,
+                "queued": self._queue.qsize(), "dropped": self.dropped}
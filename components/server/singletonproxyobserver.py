@@ -7,28 +7,129 @@ import uuid
 import platform
 import logging
 import argparse
+import signal
+import stat
+import errno
 import threading
+import time
 import sys
+import os
 from datetime import datetime
-from core.db_manager import DatabaseManager
+# Permitir importar el paquete compartido components.common al ejecutar como script
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from components.common import wire
+from core.db_manager import DatabaseManager, DatabaseUnavailableError, ItemNotFoundError
 from core.subscription_manager import SubscriptionManager
+from core.cache import ItemCache
+from core.single_flight import SingleFlight
+from core.circuit_breaker import CircuitBreaker
+from core.rate_governor import CapacityGovernor
+from core.client_limiter import ClientRateLimiter
+from core.fair_scheduler import FairScheduler
+from core.lanes import LaneRouter
+from core.idempotency import IdempotencyTable
+from core.compression import ResponseCompressor
+from core.response_cache import EncodedResponseCache
+from core.connections import ConnectionTracker, READING, PROCESSING, IDLE, OBSERVER
+from core.log_pipeline import LogPipeline, LOG_FORMATS
+from core.metrics import MetricsRegistry, serve_metrics
+from core.tracing import TraceRecorder
+from core.profiler import Profiler, PROFILE_MODES
+from core import tracing
 from decimal import Decimal
 
+MAX_REQUEST_BYTES = 1024 * 1024  # Tamaño máximo de una solicitud (mget/mset pueden ser grandes)
+MAX_MGET_IDS = 1000
+MAX_MSET_ITEMS = 1000
+# Claves de control del protocolo: nunca se persisten como atributos del item
+CONTROL_KEYS = ("ACTION", "UUID", "ID", "REQUEST_ID", "TRACE_ID", "ENCODING", "COMPRESSION", "ACK", "REMOVE")
+# Escrituras que admiten REQUEST_ID para reintentos idempotentes
+IDEMPOTENT_ACTIONS = ("set", "patch", "update", "mset")
+# Claves de transporte: un reintento puede cambiarlas (otro TRACE_ID, otra codificación) y sigue siendo el mismo pedido
+TRANSPORT_KEYS = ("REQUEST_ID", "TRACE_ID", "ENCODING", "COMPRESSION", "ACK")
+# ACTIONs con métricas propias; cualquier otro valor se cuenta como 'other' (etiquetas acotadas)
+METRIC_ACTIONS = ("get", "mget", "set", "patch", "update", "mset", "list", "stats", "subscribe", "profile")
+MAX_TRACE_ID = 128  # Caracteres de TRACE_ID que se conservan
+MAX_ITEM_ID_BYTES = 2048  # Límite de DynamoDB para la clave de partición
+
 # --- Servidor Principal (que usa los patrones) ---
 class Server:
-    def __init__(self, host, port):
+    def __init__(self, host, port, cache_ttl=30.0, cache_size=10000,
+                 breaker_failures=5, breaker_latency=2.0, breaker_reset=10.0,
+                 read_capacity=0, write_capacity=0, scan_fraction=0.5, read_reserve=0.2,
+                 client_rate=0, client_burst=None, action_costs=None, max_concurrent=0, queue_timeout=5.0,
+                 fast_concurrency=0, bulk_concurrency=0, fast_pool=20, bulk_pool=10,
+                 idempotency_ttl=300.0, idempotency_size=10000,
+                 compress_level=6, compress_threshold=1024, response_cache_size=256,
+                 read_timeout=10.0, idle_timeout=60.0, write_timeout=10.0, heartbeat_interval=15.0,
+                 keepalive_idle=60, unix_socket=None, unix_mode=0o660, log_requests="full", log_pipeline=None,
+                 metrics_port=0, tracer=None, profiler=None):
         self.host = host
-        self.port = port
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # Evitar error "Address already in use"
+        self.port = port  # None = sin TCP (solo el socket Unix)
+        self.sock = None
+        if port is not None:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # Evitar error "Address already in use"
+        # Socket Unix opcional para clientes en el mismo host: sin pasar por la pila TCP, y el
+        # acceso se controla con los permisos del archivo ('unix_mode')
+        self.unix_socket = unix_socket
+        self.unix_mode = unix_mode
+        self.unix_sock = None
+        # Cómo se loguea cada solicitud: 'full' (el dict completo), 'summary' (ACTION e IDs) u 'off'
+        self.log_requests = log_requests
+        self.log_pipeline = log_pipeline  # LogPipeline configurado en main (para stats)
+        self.tracer = tracer or TraceRecorder()  # Desglose por fases (desactivado si no se configura)
+        # Perfilado a pedido (ACTION 'profile'); None si no se configuró un directorio de salida
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.watch_lock("SubscriptionManager._lock", SubscriptionManager._lock)
+        self._stopping = False
         # Obtener la instancia Singleton del manejador de DB
         self.db_manager = DatabaseManager()
         # Instanciar el manejador de observers
         self.subscription_manager = SubscriptionManager()
+        # Caché de items para get/mget (se actualiza en cada set)
+        self.cache = ItemCache(max_items=cache_size, ttl=cache_ttl)
+        # Lecturas idénticas concurrentes comparten una sola llamada a DynamoDB
+        self.read_flight = SingleFlight()
+        # Límite de tasa por UUID y reparto justo de los lugares de ejecución entre clientes
+        self.client_limiter = ClientRateLimiter(rate=client_rate, burst=client_burst, action_costs=action_costs)
+        self.scheduler = FairScheduler(max_concurrent=max_concurrent)
+        self.queue_timeout = queue_timeout
+        # Carriles separados: get/set (latencia) y list/mget/mset (throughput)
+        self.lanes = LaneRouter(fast_concurrency=fast_concurrency, bulk_concurrency=bulk_concurrency)
+        # Respuestas de escrituras con REQUEST_ID, para que los reintentos no repitan la escritura
+        self.idempotency = IdempotencyTable(ttl=idempotency_ttl, max_entries=idempotency_size)
+        # Compresión de respuestas/notificaciones grandes para los clientes que la negociaron
+        self.compressor = ResponseCompressor(level=compress_level, threshold=compress_threshold)
+        self.subscription_manager.compressor = self.compressor
+        # Respuestas de get/list ya codificadas (por variante), válidas mientras no haya escrituras
+        self.response_cache = EncodedResponseCache(ttl=cache_ttl, max_entries=response_cache_size)
+        # Plazos por conexión: solicitud completa, espera entre solicitudes persistentes y envíos
+        self.read_timeout = read_timeout
+        self.idle_timeout = idle_timeout
+        self.write_timeout = write_timeout
+        self.heartbeat_interval = heartbeat_interval  # Latidos a los observadores (0 = desactivados)
+        self.connections = ConnectionTracker(keepalive_idle=keepalive_idle)
+        # Último 'list' completo, para servirlo como 'stale' si DynamoDB no responde
+        self._list_snapshot = None
+        self._revalidating = set()
+        self._revalidating_lock = threading.Lock()
 
         if self.db_manager is None:
             logging.critical("Failed to initialize DatabaseManager. Server cannot start.")
             sys.exit(1)
+        self.db_manager.breaker = CircuitBreaker(failure_threshold=breaker_failures,
+                                                 latency_threshold=breaker_latency,
+                                                 reset_timeout=breaker_reset,
+                                                 is_failure=DatabaseManager.is_service_failure)
+        # Cada carril usa su propio pool de conexiones HTTP hacia DynamoDB
+        self.db_manager.configure_connection_pools(point_connections=fast_pool, bulk_connections=bulk_pool)
+        self.db_manager.governor = CapacityGovernor(read_capacity=read_capacity, write_capacity=write_capacity,
+                                                    scan_fraction=scan_fraction, read_reserve=read_reserve)
+        self.metrics_port = metrics_port  # Endpoint HTTP de Prometheus (0 = desactivado)
+        self.metrics_http = None
+        self._setup_metrics()
 
     @staticmethod
     def _json_default(obj):
@@ -38,122 +139,759 @@ class Server:
             return int(obj) if obj % 1 == 0 else float(obj)
         raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
 
+    def _setup_metrics(self):
+        # En el camino de cada solicitud solo se incrementan contadores e histogramas; el resto
+        # se lee de los contadores de cada componente al exportar
+        self.metrics = MetricsRegistry()
+        self.request_count = self.metrics.counter(
+            "corporate_requests_total", "Requests handled by ACTION and response status.", ("action", "status"))
+        self.request_latency = self.metrics.histogram(
+            "corporate_request_duration_seconds", "Time from a complete request to the response sent.", ("action",))
+        self.db_manager.call_latency = self.metrics.histogram(
+            "corporate_dynamodb_call_duration_seconds", "DynamoDB call latency by operation.", ("operation",))
+        self.db_manager.call_errors = self.metrics.counter(
+            "corporate_dynamodb_call_errors_total", "Failed DynamoDB calls by operation.", ("operation",))
+        self.subscription_manager.fanout_latency = self.metrics.histogram(
+            "corporate_notify_duration_seconds", "Time to send one notification to every observer.")
+        self.metrics.callback("corporate_cache_hits_total", "Cache hits by cache.",
+                              lambda: {("item",): self.cache.hits, ("response",): self.response_cache.hits},
+                              kind="counter", labelnames=("cache",))
+        self.metrics.callback("corporate_cache_misses_total", "Cache misses by cache.",
+                              lambda: {("item",): self.cache.misses, ("response",): self.response_cache.misses},
+                              kind="counter", labelnames=("cache",))
+        self.metrics.callback("corporate_observers", "Subscribed observers.",
+                              lambda: self.subscription_manager.stats()["observers"])
+        self.metrics.callback("corporate_observers_dropped_total", "Observers dropped after a failed send.",
+                              lambda: self.subscription_manager.dropped, kind="counter")
+        self.metrics.callback("corporate_connections", "Open client connections by state.",
+                              lambda: {(state,): count for state, count in self.connections.stats()["by_state"].items()},
+                              labelnames=("state",))
+        self.metrics.callback("corporate_threads", "Live threads in the server process.", threading.active_count)
+
+    def _finish_request(self, action, response, seconds, trace):
+        # Sin respuesta: se envió desde la caché o es una suscripción
+        status = response.get("status", "unknown") if isinstance(response, dict) else "OK"
+        label = action if action in METRIC_ACTIONS else "other"
+        self.request_count.inc(label, status)
+        self.request_latency.observe(seconds, label)
+        if trace is not None:
+            trace.action = action
+            trace.status = status
+            self.tracer.finish(trace)
+
     def start(self):
+        listeners = []
         try:
-            self.sock.bind((self.host, self.port))
-            self.sock.listen()
-            logging.info(f"Server listening on {self.host}:{self.port}")
-            while True:
-                conn, addr = self.sock.accept()
-                logging.info(f"Accepted connection from {addr}")
-                # Manejar cada cliente en un hilo separado
-                client_thread = threading.Thread(target=self.handle_client, args=(conn, addr))
-                client_thread.daemon = True  # Hilos mueren si el principal muere
-                client_thread.start()
+            if self.metrics_port:
+                self.metrics_http = serve_metrics(self.metrics, self.host, self.metrics_port)
+            if self.sock is not None:
+                self.sock.bind((self.host, self.port))
+                self.sock.listen()
+                listeners.append(self.sock)
+                logging.info("Server listening on %s:%s", self.host, self.port)
+            if self.unix_socket:
+                self.unix_sock = self._bind_unix()
+                listeners.append(self.unix_sock)
+                logging.info("Server listening on unix:%s", self.unix_socket)
+            if self.heartbeat_interval:
+                threading.Thread(target=self._reap_observers, daemon=True).start()
+            # El primer listener se atiende en este hilo (recibe Ctrl+C); el otro, en uno propio
+            for listener in listeners[1:]:
+                threading.Thread(target=self._accept_in_background, args=(listener,), daemon=True).start()
+            self._accept_loop(listeners[0])
         except socket.error as e:
-            logging.error(f"Socket error: {e}")
+            if self._stopping:
+                logging.info("Server shutting down.")
+            else:
+                logging.error("Socket error: %s", e)
         except KeyboardInterrupt:
             logging.info("Server shutting down.")
         finally:
-            self.sock.close()
+            if self.sock is not None:
+                self.sock.close()
+            if self.unix_sock is not None:
+                self.unix_sock.close()
+                try:
+                    os.unlink(self.unix_socket)
+                except OSError:
+                    pass
+            if self.metrics_http is not None:
+                self.metrics_http.shutdown()
+            if self.profiler is not None:
+                self.profiler.stop()  # Escribir lo acumulado de una ventana en curso
+            # Los observadores suscriptos con ACK reciben el aviso y se reconectan enseguida
+            self.subscription_manager.close_all()
+
+    def _accept_loop(self, listener):
+        while True:
+            conn, addr = listener.accept()
+            addr = addr or f"unix:{self.unix_socket}"  # Los clientes Unix no tienen dirección propia
+            logging.info("Accepted connection from %s", addr, extra={"event": "connection.accepted"})
+            # Manejar cada cliente en un hilo separado
+            client_thread = threading.Thread(target=self.handle_client, args=(conn, addr))
+            client_thread.daemon = True  # Hilos mueren si el principal muere
+            client_thread.start()
+
+    def _accept_in_background(self, listener):
+        try:
+            self._accept_loop(listener)
+        except socket.error as e:
+            if not self._stopping:
+                logging.error("Socket error: %s", e)
+
+    def _bind_unix(self):
+        # Un archivo de socket que quedó de una ejecución anterior se reemplaza; uno en uso no
+        if os.path.exists(self.unix_socket):
+            if not stat.S_ISSOCK(os.stat(self.unix_socket).st_mode):
+                raise socket.error(errno.EEXIST, f"{self.unix_socket} exists and is not a socket")
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.unix_socket)
+                raise socket.error(errno.EADDRINUSE, "Address already in use")
+            except ConnectionRefusedError:
+                os.unlink(self.unix_socket)
+            finally:
+                probe.close()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Crearlo sin permisos para otros y recién después aplicar 'unix_mode'
+        previous_umask = os.umask(0o177)
+        try:
+            sock.bind(self.unix_socket)
+        finally:
+            os.umask(previous_umask)
+        os.chmod(self.unix_socket, self.unix_mode)
+        sock.listen()
+        return sock
+
+    def _reap_observers(self):
+        # Latidos periódicos: un observador que no los recibe (conexión muerta o cliente que no
+        # lee) se descarta y su hilo de handle_client termina
+        while not self._stopping:
+            time.sleep(self.heartbeat_interval)
+            self.subscription_manager.heartbeat()
+
+    def stop(self):
+        # Apagado ordenado desde otro hilo: despierta al accept() de start()
+        self._stopping = True
+        for listener in (self.sock, self.unix_sock):
+            try:
+                if listener is not None:
+                    listener.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
 
     def handle_client(self, conn, addr):
         # Generar un ID de sesión para este cliente
         session_id = str(uuid.uuid4())
         is_observer = False
+        wire_format = None  # None = JSON legacy; si no, el formato negociado (con frames)
+        pending = b""  # Bytes ya recibidos de la solicitud siguiente (conexiones persistentes)
+        state = READING
+        trace = None
+        profile = None
+        self.connections.opened(conn)
         try:
+            self.connections.configure(conn)
             while True:
-                data = conn.recv(1024)
-                if not data:
+                if is_observer:
+                    # Los observadores no envían nada más: el silencio no es un error y no se les aplica
+                    # --idle-timeout (los legacy, sin ACK, no reciben latidos). El recv vence cada
+                    # --write-timeout (el plazo de los envíos, que comparten el socket) y se vuelve a esperar
+                    try:
+                        request, frame_flags, pending = self._read_request(conn, pending)
+                    except socket.timeout:
+                        continue
+                else:
+                    # La solicitud entera debe llegar dentro del plazo (protege de clientes lentos)
+                    if not self.read_timeout:
+                        conn.settimeout(None)  # Sin plazo: no heredar el de los envíos
+                    trace = self.tracer.begin()
+                    try:
+                        request, frame_flags, pending = self._read_request(
+                            conn, pending, self.read_timeout, self.idle_timeout if state == IDLE else 0, trace)
+                    except socket.timeout:
+                        self.connections.timed_out(state)
+                        logging.info("Connection from %s timed out (%s)", addr, state,
+                                     extra={"event": "connection.timeout"})
+                        break
+                if request is None:
                     break  # Cliente desconectado
-                
-                request = json.loads(data.decode('utf-8'))
-                logging.info(f"Received request from {addr}: {request}")
+                started = time.perf_counter()
+                if self.profiler is not None:
+                    profile = self.profiler.request_started()
+                # Respuestas y notificaciones: un cliente que no lee no bloquea el envío para siempre
+                conn.settimeout(self.write_timeout or None)
+                if not is_observer:
+                    state = PROCESSING
+                    self.connections.set_state(conn, state)
+                frame_format = wire.encoding_of(frame_flags) if frame_flags is not None else None
+                # Solo las solicitudes con frames pueden pedir que la conexión siga abierta
+                keepalive = bool(frame_flags and frame_flags & wire.FLAG_KEEPALIVE)
                 
                 client_uuid = request.get("UUID")
                 action = request.get("ACTION")
+                # Identificador opcional del cliente para correlacionar sus trazas con las del servidor
+                trace_id = request.get("TRACE_ID")
+                if trace_id is not None:
+                    trace_id = str(trace_id)[:MAX_TRACE_ID]
+                    if trace is not None:
+                        trace.trace_id = trace_id
+                self._log_request(addr, request, action, client_uuid, trace_id)
+
+                # Negociar codificación y compresión de las respuestas (por defecto, las de la solicitud)
+                encoding = request.get("ENCODING")
+                compression = request.get("COMPRESSION")
+                if encoding is not None and encoding not in wire.ENCODINGS:
+                    self._send_response(conn, {"status": "Error", "message": "Unsupported ENCODING"},
+                                        frame_format and wire.ENCODING_JSON)
+                    break
+                if compression is not None and compression not in wire.COMPRESSIONS:
+                    self._send_response(conn, {"status": "Error", "message": "Unsupported COMPRESSION"},
+                                        frame_format and wire.ENCODING_JSON)
+                    break
+                wire_format = wire.negotiate(frame_format, encoding, compression)
 
                 if not client_uuid or not action:
-                    conn.sendall(json.dumps({"status": "Error", "message": "Missing UUID or ACTION"}).encode('utf-8'))
+                    self._send_response(conn, {"status": "Error", "message": "Missing UUID or ACTION"}, wire_format)
                     break
 
-                response = None
-                # --- Patrón Proxy (lógica de 'set') ---
-                # El servidor actúa como proxy: intercepta 'set', actualiza DB, y *luego* notifica
-                if action == "set":
-                    response = self.handle_set(request, session_id)
-                    if response.get("status") == "OK":
-                        # Notificar a todos los observadores
-                        self.subscription_manager.notify(response.get("data"))
-                
-                elif action == "get":
-                    response = self.handle_get(request, session_id)
-                elif action == "list":
-                    response = self.handle_list(request, session_id)
-                elif action == "subscribe":
-                    response = self.handle_subscribe(request, conn, session_id)
-                    is_observer = True
+                # Versión de los datos antes de consultarlos: la respuesta solo se cachea si no cambió
+                cache_key = self._response_cache_key(action, request)
+                version = self.response_cache.version
+
+                # Limitar por cliente (UUID) antes de tocar DynamoDB: respuesta rápida si se excede
+                retry_after = self.client_limiter.check(client_uuid, action)
+                if retry_after:
+                    response = {"status": "Error", "message": "Rate limit exceeded", "retry_after": round(retry_after, 3)}
+                elif cache_key is not None and self._send_cached(conn, action, request, session_id, cache_key,
+                                                                 wire_format, keepalive):
+                    response = None  # Ya se enviaron los bytes cacheados
                 else:
-                    response = {"status": "Error", "message": "Unknown ACTION"}
+                    response = self._dispatch_admitted(action, request, conn, session_id, client_uuid, wire_format)
+                    tracing.mark("handle")
+                    if action == "subscribe" and response is None and not is_observer:
+                        is_observer = True
+                        self.connections.set_state(conn, OBSERVER)
 
                 # Enviar respuesta al cliente (si no es un observador que se queda)
                 if response and not is_observer:
-                    conn.sendall(json.dumps(response, default=self._json_default).encode('utf-8'))
+                    self._send_response(conn, response, wire_format, cache_key, version, keepalive)
+                self._finish_request(action, response, time.perf_counter() - started, trace)
+                trace = None
+                if profile is not None:
+                    self.profiler.request_finished(profile)
+                    profile = None
                 
+                if not is_observer and not keepalive:
+                    break  # Terminar conexión para get/mget/set/patch/mset/list/stats
                 if not is_observer:
-                    break  # Terminar conexión para get/set/list
-                # Si es observador, el bucle sigue y el socket se queda abierto
+                    state = IDLE
+                    self.connections.set_state(conn, state)
+                # Si es observador o la conexión es persistente, el bucle sigue y el socket se queda abierto
             
+        except wire.FrameError as e:
+            logging.warning("Invalid frame received from %s: %s", addr, e)
+            self._send_response(conn, {"status": "Error", "message": "Invalid request"}, wire_format or wire.ENCODING_JSON)
         except json.JSONDecodeError:
-            logging.warning(f"Invalid JSON received from {addr}")
+            logging.warning("Invalid JSON received from %s", addr)
             conn.sendall(json.dumps({"status": "Error", "message": "Invalid JSON"}).encode('utf-8'))
         except socket.error as e:
-            logging.warning(f"Socket error with {addr}: {e}")
+            logging.warning("Socket error with %s: %s", addr, e)
         except Exception as e:
-            logging.error(f"Error handling client {addr}: {e}", exc_info=True)
+            logging.error("Error handling client %s: %s", addr, e, exc_info=True)
         finally:
+            if trace is not None:
+                tracing.activate(None)  # Solicitud sin terminar: la traza se descarta
+            if profile is not None:
+                self.profiler.request_finished(profile)
             if is_observer:
                 self.subscription_manager.detach(conn)
+            self.connections.closed(conn)
             conn.close()
-            logging.info(f"Connection closed for {addr}")
+            logging.info("Connection closed for %s", addr, extra={"event": "connection.closed"})
+
+    def _log_request(self, addr, request, action, client_uuid, trace_id=None):
+        # Formateo diferido (%s): el dict se convierte a texto en el hilo de logging, no en este
+        if self.log_requests == "off" or not logging.getLogger().isEnabledFor(logging.INFO):
+            return
+        extra = {"event": "request", "action": action, "client_uuid": client_uuid}
+        if trace_id is not None:
+            extra["trace_id"] = trace_id
+        if self.log_requests == "full":
+            logging.info("Received request from %s: %s", addr, request, extra=extra)
+            return
+        # Resumen: solo identificadores y tamaños, nunca los atributos
+        summary = [f"ID={request['ID']}"] if "ID" in request else []
+        for key in ("IDS", "ITEMS"):
+            if isinstance(request.get(key), list):
+                summary.append(f"{key}={len(request[key])}")
+        logging.info("Received %s from %s %s", action, addr, " ".join(summary), extra=extra)
+
+    def _encode_response(self, response, wire_format, keepalive=False):
+        if wire_format is None:
+            return json.dumps(response, default=self._json_default).encode('utf-8')
+        # Con frames: Decimal viaja nativo en binario, sin pasar por _json_default
+        flags = wire.FLAG_KEEPALIVE if keepalive else 0
+        return wire.encode_frame(response, wire_format, self.compressor, flags)
+
+    def _send_response(self, conn, response, wire_format, cache_key=None, version=None, keepalive=False):
+        data = self._encode_response(response, wire_format, keepalive)
+        # Solo se reutilizan respuestas completas y frescas
+        if cache_key is not None and response.get("status") == "OK" and not response.get("stale"):
+            self.response_cache.put(cache_key, (wire_format, keepalive), data, version)
+        tracing.mark("encode")
+        conn.sendall(data)
+        tracing.mark("send")
+
+    @staticmethod
+    def _response_cache_key(action, request):
+        if action == "list":
+            return ("list",)
+        item_id = Server._item_id(request.get("ID")) if action == "get" else None
+        if item_id:
+            return ("get", item_id)
+        return None
+
+    def _send_cached(self, conn, action, request, session_id, cache_key, wire_format, keepalive=False):
+        # Respuesta ya codificada para esta variante: un solo sendall, sin tocar los items
+        # (el flag de keep-alive va en el header, por eso es parte de la variante)
+        data = self.response_cache.get(cache_key, (wire_format, keepalive))
+        if data is None:
+            return False
+        # La auditoría en CorporateLog se mantiene aunque la respuesta salga de la caché
+        details = f"ID: {request['ID']}" if action == "get" else ""
+        self.db_manager.log_action(request["UUID"], session_id, action, details)
+        tracing.mark("handle")
+        conn.sendall(data)
+        tracing.mark("send")
+        return True
+
+    def _dispatch_admitted(self, action, request, conn, session_id, client_uuid, wire_format=None):
+        # Primero el carril y después el límite global: una solicitud masiva en espera
+        # nunca ocupa un lugar global que necesita un get
+        with self.lanes.slot(action, client_uuid, timeout=self.queue_timeout) as in_lane:
+            if not in_lane:
+                return {"status": "Error", "message": "Server busy"}
+            with self.scheduler.slot(client_uuid, timeout=self.queue_timeout) as admitted:
+                if not admitted:
+                    return {"status": "Error", "message": "Server busy"}
+                tracing.mark("admit")  # Espera en el carril y en el límite global
+                return self.dispatch(action, request, conn, session_id, wire_format)
+
+    def dispatch(self, action, request, conn, session_id, wire_format=None):
+        request_id = request.get("REQUEST_ID")
+        if request_id is not None and action in IDEMPOTENT_ACTIONS:
+            # Un duplicado devuelve la respuesta original sin tocar DynamoDB ni a los observadores.
+            # Solo se guardan las respuestas OK: un 'Partial' reintentado vuelve a escribir lo que faltó
+            payload = {k: v for k, v in request.items() if k not in TRANSPORT_KEYS}
+            return self.idempotency.execute(
+                (request["UUID"], str(request_id)), payload,
+                lambda: self._dispatch_action(action, request, conn, session_id, wire_format),
+                should_store=lambda response: response.get("status") == "OK")
+        return self._dispatch_action(action, request, conn, session_id, wire_format)
+
+    def _dispatch_action(self, action, request, conn, session_id, wire_format=None):
+        response = None
+        # --- Patrón Proxy (lógica de 'set') ---
+        # El servidor actúa como proxy: intercepta 'set', actualiza DB, y *luego* notifica
+        if action == "set":
+            response = self.handle_set(request, session_id)
+            if response.get("status") == "OK":
+                # Notificar a todos los observadores
+                self.subscription_manager.notify(response.get("data"))
+        
+        elif action in ("patch", "update"):
+            response = self.handle_patch(request, session_id)
+            if response.get("status") == "OK":
+                self.subscription_manager.notify(response.get("data"))
+
+        elif action == "mset":
+            response = self.handle_mset(request, session_id)
+
+        elif action == "get":
+            response = self.handle_get(request, session_id)
+        elif action == "mget":
+            response = self.handle_mget(request, session_id)
+        elif action == "list":
+            response = self.handle_list(request, session_id)
+        elif action == "stats":
+            response = self.handle_stats(request, session_id)
+        elif action == "profile":
+            response = self.handle_profile(request, session_id)
+        elif action == "subscribe":
+            response = self.handle_subscribe(request, conn, session_id, wire_format)
+        else:
+            response = {"status": "Error", "message": "Unknown ACTION"}
+        return response
+
+    @staticmethod
+    def _read_request(conn, pending=b"", read_timeout=0, idle_timeout=0, trace=None):
+        # Devuelve (solicitud, flags del frame o None si es JSON legacy, bytes sobrantes)
+        # (None, None, b"") si el cliente se desconectó
+        # 'idle_timeout' limita la espera del primer byte y 'read_timeout' el resto de la solicitud
+        # (sin 'idle_timeout', la solicitud entera); socket.timeout si se vencen
+        if not pending and idle_timeout:
+            conn.settimeout(idle_timeout)
+            pending = conn.recv(4096)
+            if not pending:
+                return None, None, b""
+        deadline = time.monotonic() + read_timeout if read_timeout else None
+        buffer = pending or wire.recv_before(conn, 4096, deadline)
+        if not buffer:
+            return None, None, b""
+        if trace is not None:
+            trace.begin()  # La traza empieza con los primeros bytes de la solicitud
+        if wire.is_framed(buffer):
+            payload, flags, rest = wire.recv_payload(conn, buffer, deadline)
+            if trace is not None:
+                trace.mark("recv")
+            request = wire.decode_payload(payload, flags, parse_float=Decimal)
+            if trace is not None:
+                trace.mark("parse")
+            return request, flags, rest
+        # JSON legacy: leer hasta completar el documento (las solicitudes grandes llegan en varios recv)
+        while True:
+            if trace is not None:
+                trace.mark("recv")
+            try:
+                # Decimal: DynamoDB no acepta float (un 1.5 haría fallar la escritura completa)
+                request = json.loads(buffer.decode('utf-8'), parse_float=Decimal)
+                complete = True
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                complete = False  # Datos incompletos, seguir leyendo
+            if trace is not None:
+                trace.mark("parse")
+            if complete:
+                return request, None, b""
+            if len(buffer) > MAX_REQUEST_BYTES:
+                raise json.JSONDecodeError("Request too large", "", 0)
+            data = wire.recv_before(conn, 4096, deadline)
+            if not data:
+                return json.loads(buffer.decode('utf-8'), parse_float=Decimal), None, b""  # Lanza JSONDecodeError si está incompleto
+            buffer += data
+
+    @staticmethod
+    def _item_id(value):
+        # Los IDs son strings; un número se convierte (como en mget). Listas, objetos, etc.: None
+        if isinstance(value, bool) or not isinstance(value, (str, int)):
+            return None
+        item_id = str(value)
+        if len(item_id.encode("utf-8")) > MAX_ITEM_ID_BYTES:
+            return None  # DynamoDB rechaza claves de más de 2048 bytes con ValidationException
+        return item_id
 
     def handle_get(self, request, session_id):
-        item_id = request.get("ID")
-        self.db_manager.log_action(request["UUID"], session_id, "get", f"ID: {item_id}")
-        data = self.db_manager.get_corporate_data(item_id)
+        item_id = self._item_id(request.get("ID"))
+        self.db_manager.log_action(request["UUID"], session_id, "get", f"ID: {request.get('ID')}")
+        if not item_id:
+            return {"status": "Error", "message": "Item not found"}
+        data = self.cache.get(item_id)
+        stale = False
+        if data is None:
+            try:
+                data, stale = self._read_through(("get", item_id), lambda: self._fetch_item(item_id),
+                                                 self.cache.get_stale(item_id))
+            except DatabaseUnavailableError:
+                return {"status": "Error", "message": "Service unavailable"}
         if data:
-            return {"status": "OK", "data": data}
+            response = {"status": "OK", "data": data}
+            if stale:
+                response["stale"] = True
+            return response
         else:
             return {"status": "Error", "message": "Item not found"}
 
+    def handle_mget(self, request, session_id):
+        item_ids = request.get("IDS")
+        if not isinstance(item_ids, list) or not item_ids:
+            return {"status": "Error", "message": "Missing IDS for mget operation"}
+        if len(item_ids) > MAX_MGET_IDS:
+            return {"status": "Error", "message": f"Too many IDS for mget operation (max {MAX_MGET_IDS})"}
+        # Los IDs inválidos (vacíos, listas, objetos, demasiado largos) no llegan a DynamoDB: un solo ID
+        # inválido haría fallar todo el BatchGetItem con ValidationException
+        valid_ids = []
+        invalid = []
+        for raw_id in item_ids:
+            item_id = self._item_id(raw_id)
+            if item_id:
+                valid_ids.append(item_id)
+            else:
+                invalid.append(raw_id)
+        item_ids = valid_ids
+
+        # Una sola entrada de auditoría para toda la operación
+        self.db_manager.log_action(request["UUID"], session_id, "mget", f"IDs ({len(item_ids)}): {', '.join(item_ids)}")
+
+        # Servir desde caché lo posible y buscar el resto con BatchGetItem
+        found, misses = self.cache.get_many(dict.fromkeys(item_ids))
+        unprocessed = []
+        if misses:
+            fetched, unprocessed = self.read_flight.do(
+                ("mget", tuple(sorted(misses))), lambda: self._fetch_items(misses))
+            found.update(fetched)
+
+        # Los IDs que DynamoDB no pudo devolver se sirven desde la caché aunque hayan expirado
+        stale_ids = []
+        for item_id in list(unprocessed):
+            stale_item = self.cache.get_stale(item_id)
+            if stale_item is not None:
+                found[item_id] = stale_item
+                stale_ids.append(item_id)
+                unprocessed.remove(item_id)
+
+        data = [found[item_id] for item_id in item_ids if item_id in found]
+        failed = set(unprocessed)
+        missing = [item_id for item_id in dict.fromkeys(item_ids) if item_id not in found and item_id not in failed]
+        response = {"status": "OK", "data": data, "missing": missing}
+        if unprocessed:
+            response["unprocessed"] = unprocessed
+        if stale_ids:
+            response["stale"] = stale_ids
+        if invalid:
+            response["invalid"] = invalid
+        return response
+
     def handle_list(self, request, session_id):
         self.db_manager.log_action(request["UUID"], session_id, "list")
-        data = self.db_manager.list_corporate_data()
-        return {"status": "OK", "data": data}
+        try:
+            data, stale = self._read_through(("list",), self.db_manager.list_corporate_data,
+                                             self._list_snapshot, self._store_list_snapshot)
+        except DatabaseUnavailableError:
+            return {"status": "Error", "message": "Service unavailable"}
+        response = {"status": "OK", "data": data}
+        if stale:
+            response["stale"] = True
+        return response
+
+    def _store_list_snapshot(self, items):
+        self._list_snapshot = items
+
+    # Las lecturas que llenan la caché de items corren dentro del single-flight: solo quien consulta
+    # DynamoDB guarda el resultado, con la generación de antes de su propia lectura
+    def _fetch_item(self, item_id):
+        generation = self.cache.generation()
+        item = self.db_manager.get_corporate_data(item_id)
+        self.cache.put(item, generation)
+        return item
+
+    def _fetch_items(self, item_ids):
+        generation = self.cache.generation()
+        fetched, unprocessed = self.db_manager.batch_get_corporate_data(item_ids)
+        self.cache.put_many(fetched.values(), generation)
+        return fetched, unprocessed
+
+    def _read_through(self, flight_key, fetch, stale_value, on_fresh=None):
+        # Stale-while-revalidate: devuelve (valor, es_stale)
+        # Con el circuit breaker abierto se sirve el dato viejo sin esperar a DynamoDB
+        if stale_value is not None and self.db_manager.breaker.state != CircuitBreaker.CLOSED:
+            self._revalidate_in_background(flight_key, fetch, on_fresh)
+            return stale_value, True
+        try:
+            value = self.read_flight.do(flight_key, fetch)
+        except DatabaseUnavailableError:
+            if stale_value is None:
+                raise
+            logging.warning("DynamoDB unavailable, serving stale data for %s", flight_key)
+            return stale_value, True
+        if on_fresh is not None:
+            on_fresh(value)
+        return value, False
+
+    def _revalidate_in_background(self, flight_key, fetch, on_fresh):
+        # Solo cuando el breaker pasa a half-open: la llamada de prueba corre fuera del hilo del cliente
+        if self.db_manager.breaker.state != CircuitBreaker.HALF_OPEN:
+            return
+        with self._revalidating_lock:
+            if flight_key in self._revalidating:
+                return
+            self._revalidating.add(flight_key)
+
+        def revalidate():
+            try:
+                value = self.read_flight.do(flight_key, fetch)
+                if on_fresh is not None:
+                    on_fresh(value)
+                logging.info("Revalidated %s in background", flight_key)
+            except DatabaseUnavailableError:
+                pass
+            finally:
+                with self._revalidating_lock:
+                    self._revalidating.discard(flight_key)
+
+        threading.Thread(target=revalidate, daemon=True).start()
+
+    def handle_stats(self, request, session_id):
+        # Contadores internos del servidor (no se registra en CorporateLog)
+        return {"status": "OK", "data": {
+            "cache": {"hits": self.cache.hits, "misses": self.cache.misses, "stale_fills": self.cache.stale_fills},
+            "coalescing": self.read_flight.stats(),
+            "circuit_breaker": self.db_manager.breaker.stats(),
+            "capacity_governor": self.db_manager.governor.stats(),
+            "client_limiter": self.client_limiter.stats(),
+            "scheduler": self.scheduler.stats(),
+            "lanes": self.lanes.stats(),
+            "idempotency": self.idempotency.stats(),
+            "compression": self.compressor.stats(),
+            "response_cache": self.response_cache.stats(),
+            "connections": self.connections.stats(),
+            "observers": self.subscription_manager.stats(),
+            "logging": self.log_pipeline.stats() if self.log_pipeline is not None else None,
+            "metrics": self.metrics.snapshot(),
+            "tracing": self.tracer.stats(),
+            "profiling": self.profiler.status() if self.profiler is not None else None,
+        }}
+
+    def handle_profile(self, request, session_id):
+        # Perfilado a pedido: COMMAND start (MODE, DURATION, INTERVAL), stop o status
+        if self.profiler is None:
+            return {"status": "Error", "message": "Profiling disabled (start the server with --profile-dir)"}
+        command = request.get("COMMAND", "status")
+        if command == "start":
+            self.db_manager.log_action(request["UUID"], session_id, "profile", f"start {request.get('MODE', 'sample')}")
+            try:
+                self.profiler.start(request.get("MODE", "sample"), duration=float(request.get("DURATION", 30)),
+                                    interval=float(request.get("INTERVAL", 0)))
+            except (TypeError, ValueError) as e:
+                return {"status": "Error", "message": str(e)}
+        elif command == "stop":
+            self.db_manager.log_action(request["UUID"], session_id, "profile", "stop")
+            self.profiler.stop()
+        elif command != "status":
+            return {"status": "Error", "message": "Unknown COMMAND"}
+        return {"status": "OK", "data": self.profiler.status()}
+
+    @staticmethod
+    def _clean_item(request_data):
+        # Remover las claves de control para que sea un 'Item' limpio de DynamoDB
+        return {k: Server._to_dynamo(v) for k, v in request_data.items() if k not in CONTROL_KEYS}
+
+    @staticmethod
+    def _to_dynamo(value):
+        # Los float (codificación binaria) pasan a Decimal; en JSON ya llegan como Decimal
+        if isinstance(value, float):
+            return Decimal(str(value))
+        if isinstance(value, dict):
+            return {k: Server._to_dynamo(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [Server._to_dynamo(v) for v in value]
+        return value
 
     def handle_set(self, request, session_id):
         # Los datos para 'set' vienen en el request
-        item_data = request.copy()
-        # Remover 'ACTION' y 'UUID' para que sea un 'Item' limpio de DynamoDB
-        item_id = item_data.pop("ID", None)
-        if not item_id:
+        if not request.get("ID"):
              return {"status": "Error", "message": "Missing ID for set operation"}
+        item_id = self._item_id(request["ID"])
+        if item_id is None:
+            return {"status": "Error", "message": "Invalid ID for set operation"}
         
-        item_data.pop("ACTION", None)
-        item_data.pop("UUID", None)
+        item_data = self._clean_item(request)
         item_data['id'] = item_id  # Asegurar que la clave primaria 'id' esté
 
         self.db_manager.log_action(request["UUID"], session_id, "set", f"ID: {item_id}")
         updated_data = self.db_manager.set_corporate_data(item_data)
         
         if updated_data:
+            # Primero la caché de items: un get que lea la versión nueva ya encuentra el item nuevo
+            self.cache.write(updated_data)
+            self.response_cache.bump()
             return {"status": "OK", "data": updated_data}
         else:
             return {"status": "Error", "message": "Failed to set item"}
 
-    def handle_subscribe(self, request, conn, session_id):
+    def handle_patch(self, request, session_id):
+        # Actualización parcial: solo los atributos enviados (y los de REMOVE) se modifican
+        if not request.get("ID"):
+            return {"status": "Error", "message": "Missing ID for patch operation"}
+        item_id = self._item_id(request["ID"])
+        if item_id is None:
+            return {"status": "Error", "message": "Invalid ID for patch operation"}
+
+        attributes = self._clean_item(request)
+        remove_attributes = request.get("REMOVE", [])
+        if isinstance(remove_attributes, str):
+            remove_attributes = [remove_attributes]
+        attributes.pop("id", None)  # La clave primaria no se puede modificar
+        # REMOVE: lista de nombres de atributo no vacíos (sin la clave primaria)
+        if (not isinstance(remove_attributes, list) or "id" in remove_attributes
+                or not all(isinstance(name, str) and name for name in remove_attributes)):
+            return {"status": "Error", "message": "Invalid REMOVE for patch operation"}
+        # Un nombre repetido (o también enviado con valor) haría fallar la expresión en DynamoDB
+        remove_attributes = [name for name in dict.fromkeys(remove_attributes) if name not in attributes]
+        if not attributes and not remove_attributes:
+            return {"status": "Error", "message": "No attributes to update"}
+
+        self.db_manager.log_action(request["UUID"], session_id, "patch", f"ID: {item_id}")
+        try:
+            updated_data = self.db_manager.update_corporate_data(item_id, attributes, remove_attributes)
+        except ItemNotFoundError:
+            return {"status": "Error", "message": "Item not found"}
+
+        if updated_data:
+            self.cache.write(updated_data)
+            self.response_cache.bump()
+            return {"status": "OK", "data": updated_data}
+        else:
+            return {"status": "Error", "message": "Failed to update item"}
+
+    def handle_mset(self, request, session_id):
+        items = request.get("ITEMS")
+        if not isinstance(items, list) or not items:
+            return {"status": "Error", "message": "Missing ITEMS for mset operation"}
+        if len(items) > MAX_MSET_ITEMS:
+            return {"status": "Error", "message": f"Too many ITEMS for mset operation (max {MAX_MSET_ITEMS})"}
+
+        # Normalizar cada item igual que en 'set' (clave 'id', sin ACTION/UUID)
+        results = []
+        valid_items = []
+        for raw_item in items:
+            raw_id = raw_item.get("ID", raw_item.get("id")) if isinstance(raw_item, dict) else None
+            if not raw_id:
+                results.append({"id": None, "status": "Error", "message": "Missing ID"})
+                continue
+            item_id = self._item_id(raw_id)
+            if item_id is None:
+                results.append({"id": None, "status": "Error", "message": "Invalid ID"})
+                continue
+            item_data = self._clean_item(raw_item)
+            item_data['id'] = item_id
+            valid_items.append(item_data)
+            results.append({"id": item_id})
+
+        self.db_manager.log_action(request["UUID"], session_id, "mset", f"Items: {len(valid_items)}")
+        written, failed = self.db_manager.batch_set_corporate_data(valid_items) if valid_items else ([], {})
+
+        written_ids = set(written)
+        for result in results:
+            if result["id"] in written_ids:
+                result["status"] = "OK"
+            elif result["id"] is not None:
+                result.update(status="Error", message=failed.get(result["id"], "Not written"))
+
+        # --- Patrón Proxy: una única notificación con todos los items escritos ---
+        written_items = list({item['id']: item for item in valid_items if item['id'] in written_ids}.values())
+        if written_items:
+            self.cache.write_many(written_items)
+            self.response_cache.bump()
+            self.subscription_manager.notify(written_items)
+
+        ok_count = sum(1 for result in results if result["status"] == "OK")
+        if ok_count == len(results):
+            status = "OK"
+        elif ok_count:
+            status = "Partial"
+        else:
+            status = "Error"
+        return {"status": status, "written": ok_count, "failed": len(results) - ok_count, "results": results}
+
+    def handle_subscribe(self, request, conn, session_id, wire_format=None):
         self.db_manager.log_action(request["UUID"], session_id, "subscribe")
-        self.subscription_manager.attach(conn)
+        # Las notificaciones se envían en la codificación negociada por el observador
+        # Con "ACK": true se confirma la suscripción antes de la primera notificación
+        # (con el intervalo de latidos: sin noticias en ~3 intervalos, el observador puede reconectarse)
+        greeting = dict(wire.SUBSCRIBED) if request.get("ACK") else None
+        if greeting is not None and self.heartbeat_interval:
+            greeting["heartbeat"] = self.heartbeat_interval
+        self.subscription_manager.attach(conn, wire_format, greeting)
         # No se envía respuesta, solo se mantiene el socket abierto
         return None 
 
@@ -161,12 +899,112 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Singleton Proxy Observer Server for TPFI IS2.")
     parser.add_argument("-p", dest="server_port", type=int, default=8080, help="Server port to listen on (default: 8080).")
     parser.add_argument("-v", action="store_true", help="Enable verbose/debug mode.")
+    parser.add_argument("--cache-ttl", type=float, default=30.0, help="Seconds an item stays in the read cache, 0 disables it (default: 30).")
+    parser.add_argument("--cache-size", type=int, default=10000, help="Maximum number of cached items (default: 10000).")
+    parser.add_argument("--breaker-failures", type=int, default=5, help="Consecutive DynamoDB failures that open the circuit breaker (default: 5).")
+    parser.add_argument("--breaker-latency", type=float, default=2.0, help="Seconds after which a DynamoDB call counts as a failure (default: 2).")
+    parser.add_argument("--breaker-reset", type=float, default=10.0, help="Seconds the breaker stays open before a trial call (default: 10).")
+    parser.add_argument("--read-capacity", type=float, default=0, help="Provisioned RCU/s to stay under, 0 disables read shaping (default: 0).")
+    parser.add_argument("--write-capacity", type=float, default=0, help="Provisioned WCU/s to stay under, 0 disables write shaping (default: 0).")
+    parser.add_argument("--scan-fraction", type=float, default=0.5, help="Fraction of read capacity that list scans may use (default: 0.5).")
+    parser.add_argument("--read-reserve", type=float, default=0.2, help="Fraction of read capacity reserved for point reads (default: 0.2).")
+    parser.add_argument("--client-rate", type=float, default=0, help="Tokens per second allowed per client UUID, 0 disables it (default: 0).")
+    parser.add_argument("--client-burst", type=float, default=None, help="Token bucket size per client UUID (default: 2x --client-rate).")
+    parser.add_argument("--action-cost", action="append", default=[], metavar="ACTION=COST", help="Token cost of an ACTION, can be repeated (e.g. --action-cost list=20).")
+    parser.add_argument("--max-concurrent", type=int, default=0, help="Requests executed at once, shared fairly between clients; 0 disables it (default: 0).")
+    parser.add_argument("--queue-timeout", type=float, default=5.0, help="Seconds a request may wait for an execution slot (default: 5).")
+    parser.add_argument("--fast-concurrency", type=int, default=0, help="Concurrent get/set/patch requests, 0 means unlimited (default: 0).")
+    parser.add_argument("--bulk-concurrency", type=int, default=0, help="Concurrent list/mget/mset requests, 0 means unlimited (default: 0).")
+    parser.add_argument("--fast-pool", type=int, default=20, help="DynamoDB HTTP connections for point operations (default: 20).")
+    parser.add_argument("--bulk-pool", type=int, default=10, help="DynamoDB HTTP connections for scans and batch operations (default: 10).")
+    parser.add_argument("--idempotency-ttl", type=float, default=300.0, help="Seconds a write response is kept for REQUEST_ID replays (default: 300).")
+    parser.add_argument("--idempotency-size", type=int, default=10000, help="Maximum remembered REQUEST_IDs (default: 10000).")
+    parser.add_argument("--compress-level", type=int, default=6, choices=range(0, 10), metavar="0-9", help="zlib level for clients that negotiate compression, 0 disables (default: 6).")
+    parser.add_argument("--compress-threshold", type=int, default=1024, help="Minimum payload bytes before compressing (default: 1024).")
+    parser.add_argument("--response-cache-size", type=int, default=256, help="Maximum pre-encoded get/list responses kept, 0 disables (default: 256).")
+    parser.add_argument("--read-timeout", type=float, default=10.0, help="Seconds a client has to send a complete request, 0 disables (default: 10).")
+    parser.add_argument("--idle-timeout", type=float, default=60.0, help="Seconds a persistent connection may wait for its next request, 0 disables (default: 60).")
+    parser.add_argument("--write-timeout", type=float, default=10.0, help="Seconds a response or notification may take to send, 0 disables (default: 10).")
+    parser.add_argument("--heartbeat-interval", type=float, default=15.0, help="Seconds between heartbeats to observers subscribed with ACK, 0 disables (default: 15).")
+    parser.add_argument("--unix-socket", metavar="PATH", help="Also listen on a Unix domain socket at PATH (for clients on the same host).")
+    parser.add_argument("--unix-mode", default="660", help="Octal permissions of the Unix socket file (default: 660).")
+    parser.add_argument("--no-tcp", action="store_true", help="Do not listen on TCP (requires --unix-socket).")
+    parser.add_argument("--metrics-port", type=int, default=0, help="Serve Prometheus metrics over HTTP on this port (/metrics), 0 disables (default: 0).")
+    parser.add_argument("--slow-request-ms", type=float, default=0, help="Log a WARNING with the per-phase breakdown of requests slower than this, 0 disables (default: 0).")
+    parser.add_argument("--trace-file", metavar="PATH", help="Append one JSON line per request with its per-phase timings to PATH.")
+    parser.add_argument("--trace-sample", type=float, default=1.0, help="Fraction of requests written to --trace-file (default: 1).")
+    parser.add_argument("--profile-dir", metavar="DIR", help="Enable on-demand profiling (ACTION 'profile') and write its output to DIR.")
+    parser.add_argument("--profile", dest="profile_mode", choices=PROFILE_MODES, help="Start a profile window at startup (requires --profile-dir).")
+    parser.add_argument("--profile-duration", type=float, default=30.0, help="Seconds the startup profile window lasts (default: 30).")
+    parser.add_argument("--profile-interval", type=float, default=0, help="Write the profile output every N seconds of the window, 0 writes it once at the end (default: 0).")
+    parser.add_argument("--profile-sample-ms", type=float, default=10.0, help="Milliseconds between stack samples in 'sample' mode (default: 10).")
+    parser.add_argument("--log-format", choices=LOG_FORMATS, default="text", help="Log output: text or json, one object per line (default: text).")
+    parser.add_argument("--log-requests", choices=("full", "summary", "off"), default="full", help="Per-request log line: full payload, summary (ACTION and IDs) or off (default: full).")
+    parser.add_argument("--log-sample", action="append", default=[], metavar="EVENT=FRACTION", help="Keep only FRACTION of INFO/DEBUG records of EVENT, e.g. request=0.01 (repeatable).")
+    parser.add_argument("--log-rate", type=int, default=0, help="Maximum INFO/DEBUG records per second per event, 0 disables (default: 0).")
+    parser.add_argument("--log-sync", action="store_true", help="Write log records from the calling thread instead of a background thread.")
+    parser.add_argument("--tcp-keepalive", type=int, default=60, help="Idle seconds before TCP keepalive probes, 0 disables (default: 60).")
     args = parser.parse_args()
+    if args.no_tcp and not args.unix_socket:
+        parser.error("--no-tcp requires --unix-socket")
+    if args.profile_mode and not args.profile_dir:
+        parser.error("--profile requires --profile-dir")
+    try:
+        unix_mode = int(args.unix_mode, 8)
+    except ValueError:
+        parser.error(f"Invalid --unix-mode value: {args.unix_mode}")
+
+    action_costs = {}
+    for entry in args.action_cost:
+        cost_action, _, cost = entry.partition("=")
+        try:
+            action_costs[cost_action] = float(cost)
+        except ValueError:
+            parser.error(f"Invalid --action-cost value: {entry}")
 
-    # Configurar logging
+    sample_rates = {}
+    for entry in args.log_sample:
+        event, _, fraction = entry.partition("=")
+        try:
+            sample_rates[event] = float(fraction)
+        except ValueError:
+            parser.error(f"Invalid --log-sample value: {entry}")
+
+    # Configurar logging (por defecto en un hilo de fondo: los hilos de las solicitudes solo encolan)
     log_level = logging.DEBUG if args.v else logging.INFO
-    logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    log_pipeline = LogPipeline(level=log_level, log_format=args.log_format, sample_rates=sample_rates,
+                               rate_limit=args.log_rate, asynchronous=not args.log_sync, stream=sys.stderr).start()
+    tracer = TraceRecorder(slow_threshold=args.slow_request_ms / 1000, export_path=args.trace_file,
+                           sample=args.trace_sample).start()
+
+    server = Server(host="0.0.0.0", port=None if args.no_tcp else args.server_port,  # Escuchar en todas las interfaces
+                    cache_ttl=args.cache_ttl, cache_size=args.cache_size,
+                    breaker_failures=args.breaker_failures, breaker_latency=args.breaker_latency,
+                    breaker_reset=args.breaker_reset,
+                    read_capacity=args.read_capacity, write_capacity=args.write_capacity,
+                    scan_fraction=args.scan_fraction, read_reserve=args.read_reserve,
+                    client_rate=args.client_rate, client_burst=args.client_burst, action_costs=action_costs,
+                    max_concurrent=args.max_concurrent, queue_timeout=args.queue_timeout,
+                    fast_concurrency=args.fast_concurrency, bulk_concurrency=args.bulk_concurrency,
+                    fast_pool=args.fast_pool, bulk_pool=args.bulk_pool,
+                    idempotency_ttl=args.idempotency_ttl, idempotency_size=args.idempotency_size,
+                    compress_level=args.compress_level, compress_threshold=args.compress_threshold,
+                    response_cache_size=args.response_cache_size,
+                    read_timeout=args.read_timeout, idle_timeout=args.idle_timeout,
+                    write_timeout=args.write_timeout, heartbeat_interval=args.heartbeat_interval,
+                    keepalive_idle=args.tcp_keepalive, unix_socket=args.unix_socket, unix_mode=unix_mode,
+                    log_requests=args.log_requests, log_pipeline=log_pipeline, metrics_port=args.metrics_port,
+                    tracer=tracer,
+                    profiler=Profiler(args.profile_dir, sample_interval=args.profile_sample_ms / 1000) if args.profile_dir else None)
+    if args.profile_mode:
+        try:
+            server.profiler.start(args.profile_mode, duration=args.profile_duration, interval=args.profile_interval)
+        except ValueError as e:
+            parser.error(str(e))
+
+    def terminate(signum, frame):
+        raise KeyboardInterrupt  # SIGTERM apaga igual que Ctrl+C (con aviso a los observadores)
 
-    server = Server(host="0.0.0.0", port=args.server_port)  # Escuchar en todas las interfaces
+    signal.signal(signal.SIGTERM, terminate)
     server.start()
 
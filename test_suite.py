@@ -22,6 +22,11 @@ OBSERVER_SCRIPT = os.path.join('components', 'client', 'observerclient.py')
 INPUT_GET = os.path.join('inputs', 'input_valid_get.json')
 INPUT_SET = os.path.join('inputs', 'input_valid_set.json')
 INPUT_LIST = os.path.join('inputs', 'input_valid_list.json')
+INPUT_MGET = os.path.join('inputs', 'input_valid_mget.json')
+INPUT_MSET = os.path.join('inputs', 'input_valid_mset.json')
+INPUT_PATCH = os.path.join('inputs', 'input_valid_patch.json')
+INPUT_STATS = os.path.join('inputs', 'input_valid_stats.json')
+INPUT_PROFILE = os.path.join('inputs', 'input_valid_profile.json')
 
 # Archivos de prueba temporales
 TEST_OUTPUT_DIR = 'test_outputs'
@@ -48,6 +53,13 @@ OUTPUT_CP06_NO_MIN = os.path.join(TEST_OUTPUT_DIR, 'output_cp06_sin_datos_minimo
 OUTPUT_CP07_MALFORM = os.path.join(TEST_OUTPUT_DIR, 'output_cp07_json_malformado.json')
 OUTPUT_CP08_GET_SIN_ID = os.path.join(TEST_OUTPUT_DIR, 'output_cp08_get_sin_id.json')
 OUTPUT_CP09_SERVER_DOWN = os.path.join(TEST_OUTPUT_DIR, 'output_cp09_servidor_caido.json')
+OUTPUT_CP11_MGET = os.path.join(TEST_OUTPUT_DIR, 'output_cp11_mget.json')
+OUTPUT_CP12_MSET = os.path.join(TEST_OUTPUT_DIR, 'output_cp12_mset.json')
+OUTPUT_CP13_PATCH = os.path.join(TEST_OUTPUT_DIR, 'output_cp13_patch.json')
+OUTPUT_CP14_STATS = os.path.join(TEST_OUTPUT_DIR, 'output_cp14_stats.json')
+OUTPUT_CP15_PROFILE = os.path.join(TEST_OUTPUT_DIR, 'output_cp15_profile.json')
+# (CP-15) Directorio del perfilado a pedido del servidor de prueba
+PROFILE_DIR = os.path.join(TEST_OUTPUT_DIR, 'profiles')
 
 def save_output(path, obj):
     try:
@@ -144,7 +156,7 @@ class TestIntegracionServidor(unittest.TestCase):
 
         # --- Iniciar el servidor (Corrección: Sin -v y sin pipes) ---
         cls.server_process = subprocess.Popen(
-            [PYTHON_EXE, SERVER_SCRIPT, '-p', str(TEST_PORT)], # Quitamos -v
+            [PYTHON_EXE, SERVER_SCRIPT, '-p', str(TEST_PORT), '--profile-dir', PROFILE_DIR], # Quitamos -v
             text=True,
             start_new_session=True
             # No capturamos stdout/stderr para evitar bloqueo de buffer
@@ -425,6 +437,61 @@ class TestIntegracionServidor(unittest.TestCase):
         self.assertIn("Address already in use", stderr, "El segundo servidor no falló como se esperaba.")
         print("... (El segundo servidor falló correctamente: Address already in use)")
 
+    def test_cp11_mget_exitoso(self):
+        """ CP-11: mget con varios IDs en una sola solicitud (Camino feliz). """
+        print("\nEjecutando: test_cp11_mget_exitoso")
+        result = self.run_client(INPUT_MGET)
+        self.assertEqual(result.get('status'), 'OK', f"Resultado: {result}")
+        self.assertIsInstance(result['data'], list, f"Resultado: {result}")
+        self.assertIn('UADER-FCYT-IS2', [item.get('id') for item in result['data']], f"Resultado: {result}")
+        self.assertIsInstance(result.get('missing'), list, f"Resultado: {result}")
+        save_output(OUTPUT_CP11_MGET, result)
+
+    def test_cp12_mset_exitoso(self):
+        """ CP-12: mset con varios items y resultado por item (Camino feliz). """
+        print("\nEjecutando: test_cp12_mset_exitoso")
+        result = self.run_client(INPUT_MSET)
+        self.assertEqual(result.get('status'), 'OK', f"Resultado: {result}")
+        self.assertEqual(result.get('written'), 2, f"Resultado: {result}")
+        self.assertTrue(all(r.get('status') == 'OK' for r in result['results']), f"Resultado: {result}")
+        save_output(OUTPUT_CP12_MSET, result)
+
+    def test_cp13_patch_exitoso(self):
+        """ CP-13: patch actualiza solo los atributos enviados (Camino feliz). """
+        print("\nEjecutando: test_cp13_patch_exitoso")
+        result = self.run_client(INPUT_PATCH)
+        self.assertEqual(result.get('status'), 'OK', f"Resultado: {result}")
+        self.assertEqual(result['data'].get('id'), 'UADER-FCYT-IS2', f"Resultado: {result}")
+        self.assertEqual(result['data'].get('telefono'), '03442 43-9999', f"Resultado: {result}")
+        self.assertNotIn('fax', result['data'], f"Resultado: {result}")
+        # El item completo se conserva y no se persisten claves de control
+        self.assertNotIn('ACTION', result['data'], f"Resultado: {result}")
+        self.assertNotIn('UUID', result['data'], f"Resultado: {result}")
+        save_output(OUTPUT_CP13_PATCH, result)
+
+    def test_cp14_stats(self):
+        """ CP-14: stats informa la coalescencia de lecturas y la caché (Camino feliz). """
+        print("\nEjecutando: test_cp14_stats")
+        result = self.run_client(INPUT_STATS)
+        self.assertEqual(result.get('status'), 'OK', f"Resultado: {result}")
+        coalescing = result['data'].get('coalescing')
+        self.assertEqual(set(coalescing), {'executed', 'coalesced', 'in_flight'}, f"Resultado: {result}")
+        self.assertEqual(coalescing['in_flight'], 0, f"Resultado: {result}")
+        self.assertIn('hits', result['data'].get('cache'), f"Resultado: {result}")
+        save_output(OUTPUT_CP14_STATS, result)
+
+    def test_cp15_profile(self):
+        """ CP-15: profile inicia una ventana de perfilado en el servidor en marcha (Camino feliz). """
+        print("\nEjecutando: test_cp15_profile")
+        result = self.run_client(INPUT_PROFILE)
+        self.assertEqual(result.get('status'), 'OK', f"Resultado: {result}")
+        self.assertEqual(result['data'].get('running'), 'sample', f"Resultado: {result}")
+        self.assertEqual(result['data'].get('output_dir'), PROFILE_DIR, f"Resultado: {result}")
+        # Una sola ventana a la vez
+        second = self.run_client(INPUT_PROFILE)
+        self.assertEqual(second.get('status'), 'Error', f"Resultado: {second}")
+        save_output(OUTPUT_CP15_PROFILE, result)
+
 
 # --- Ejecutar las pruebas ---
 if __name__ == "__main__":
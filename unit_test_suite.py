@@ -0,0 +1,1619 @@
+# unit_test_suite.py
+# Pruebas unitarias de los componentes del servidor y del cliente que no necesitan DynamoDB
+# (se ejecutan sin AWS; las de integración están en test_suite.py)
+
+import unittest
+import os
+import sys
+import threading
+import json
+import time
+import zlib
+import socket
+import asyncio
+import tempfile
+import contextlib
+import io
+import gzip
+import sqlite3
+import stat
+import errno
+import logging
+import queue
+import urllib.request
+import urllib.error
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+
+# Mismo esquema de imports que el servidor: el paquete 'core' y el paquete compartido 'components'
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'components', 'server'))
+
+from core.cache import ItemCache
+from core.single_flight import SingleFlight
+from core.circuit_breaker import CircuitBreaker, CircuitOpenError
+from core.db_manager import DatabaseManager, ItemNotFoundError
+from core.token_bucket import TokenBucket
+from core.rate_governor import CapacityGovernor, consumed_capacity_units
+from core.fair_scheduler import FairScheduler
+from core.lanes import LaneRouter, FAST_LANE, BULK_LANE
+from core.client_limiter import ClientRateLimiter
+from core.idempotency import IdempotencyTable
+from core.subscription_manager import SubscriptionManager
+from core.log_pipeline import LogPipeline, LogSampler, _DeferredQueueHandler
+from core.metrics import MetricsRegistry, serve_metrics
+from core.tracing import RequestTrace, TraceRecorder
+from core.profiler import Profiler, TimedLock
+from core import tracing
+from core.compression import ResponseCompressor
+from core.response_cache import EncodedResponseCache
+from components.common import binary_codec, wire
+from components.client.latency import HedgeBudget, LatencyTracker, MIN_TIMEOUT_FRACTION
+from components.client.backoff import Backoff
+from components.client.nearcache import NearCache
+from components.client.corporateclient import CorporateClient, AsyncCorporateClient
+from components.client.singletonclient import SingletonClient
+from components.client.sinks import JSONLSink, SQLiteSink
+from components.client.observerclient import ObserverClient
+from singletonproxyobserver import Server
+
+def wait_until(condition, timeout=2.0):
+    # Espera activa corta para sincronizar con hilos de la prueba
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("La condición no se cumplió a tiempo")
+        time.sleep(0.001)
+
+class TestItemCache(unittest.TestCase):
+
+    def test_expira_pero_se_conserva_como_stale(self):
+        """ Un item vencido no se sirve como fresco pero sí como 'stale'. """
+        cache = ItemCache(ttl=0.02)
+        cache.put({"id": "a", "v": 1}, cache.generation())
+        self.assertEqual(cache.get("a"), {"id": "a", "v": 1})
+        time.sleep(0.03)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get_stale("a"), {"id": "a", "v": 1})
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lectura_tardia_no_pisa_una_escritura(self):
+        """ Un item leído antes de una escritura a ese id se descarta al llegar. """
+        cache = ItemCache()
+        generation = cache.generation()  # Empieza la lectura de DynamoDB
+        cache.write({"id": "a", "v": "nuevo"})
+        cache.put({"id": "a", "v": "viejo"}, generation)  # La lectura termina después
+        cache.put({"id": "b", "v": "otro"}, generation)  # Otro id no se ve afectado
+        self.assertEqual(cache.get("a"), {"id": "a", "v": "nuevo"})
+        self.assertEqual(cache.get("b"), {"id": "b", "v": "otro"})
+        self.assertEqual(cache.stale_fills, 1)
+
+    def test_marcas_descartadas_invalidan_lecturas_viejas(self):
+        """ Si la marca de escritura ya se descartó, una lectura anterior se descarta por las dudas. """
+        cache = ItemCache(max_items=2)
+        generation = cache.generation()
+        cache.write_many([{"id": "a"}, {"id": "b"}, {"id": "c"}])  # La marca de 'a' se descarta
+        cache.put({"id": "a", "v": "viejo"}, generation)
+        self.assertEqual(cache.stale_fills, 1)
+        cache.put({"id": "a", "v": "nuevo"}, cache.generation())
+        self.assertEqual(cache.get("a"), {"id": "a", "v": "nuevo"})
+
+    def test_lru(self):
+        """ Se conservan como máximo 'max_items', descartando el menos usado. """
+        cache = ItemCache(max_items=2)
+        for item_id in ("a", "b"):
+            cache.put({"id": item_id}, cache.generation())
+        cache.get("a")
+        cache.put({"id": "c"}, cache.generation())
+        self.assertEqual(cache.get_many(["a", "b", "c"]), ({"a": {"id": "a"}, "c": {"id": "c"}}, ["b"]))
+
+class TestSingleFlight(unittest.TestCase):
+
+    def run_concurrent(self, flight, fn, callers):
+        # El primero ejecuta fn (bloqueada hasta 'release'); el resto debe quedar coalescido
+        release = threading.Event()
+        results = [None] * callers
+        errors = [None] * callers
+
+        def leader_fn():
+            release.wait(2)
+            return fn()
+
+        def call(index):
+            try:
+                results[index] = flight.do("get:item-1", leader_fn)
+            except Exception as e:
+                errors[index] = e
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+        for thread in threads:
+            thread.start()
+        wait_until(lambda: flight.coalesced == callers - 1)
+        release.set()
+        for thread in threads:
+            thread.join(2)
+        return results, errors
+
+    def test_lecturas_concurrentes_comparten_una_consulta(self):
+        """ Las lecturas concurrentes de la misma clave hacen una sola consulta. """
+        flight = SingleFlight()
+        calls = []
+        results, errors = self.run_concurrent(flight, lambda: calls.append(1) or {"id": "item-1"}, 8)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"id": "item-1"}] * 8)
+        self.assertEqual(errors, [None] * 8)
+        self.assertEqual(flight.stats(), {"executed": 1, "coalesced": 7, "in_flight": 0})
+
+    def test_error_se_propaga_a_todos(self):
+        """ Si la consulta compartida falla, todas las llamadas coalescidas reciben el error. """
+        flight = SingleFlight()
+
+        def fail():
+            raise RuntimeError("DynamoDB caído")
+
+        results, errors = self.run_concurrent(flight, fail, 4)
+        self.assertTrue(all(isinstance(e, RuntimeError) for e in errors))
+        self.assertEqual(flight.stats()["in_flight"], 0)
+
+    def test_llamadas_sucesivas_no_se_coalescen(self):
+        """ Una vez terminada la consulta, la siguiente vuelve a DynamoDB (no hay caché). """
+        flight = SingleFlight()
+        self.assertEqual(flight.do("k", lambda: 1), 1)
+        self.assertEqual(flight.do("k", lambda: 2), 2)
+        self.assertEqual(flight.stats(), {"executed": 2, "coalesced": 0, "in_flight": 0})
+
+class ServiceError(Exception):
+    # Imita una ClientError de botocore: código de error y estado HTTP en 'response'
+    def __init__(self, code, status=400):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def fail(self, breaker, error):
+        def raise_error():
+            raise error
+        with self.assertRaises(type(error)):
+            breaker.call(raise_error)
+
+    def test_abre_tras_fallos_seguidos_y_rechaza(self):
+        """ Tras 'failure_threshold' fallos seguidos el circuito se abre y falla rápido. """
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        for _ in range(3):
+            self.fail(breaker, ConnectionError("sin conexión"))
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.call(lambda: "no se llama")
+        self.assertEqual(breaker.stats()["rejected"], 1)
+        self.assertEqual(breaker.stats()["trips"], 1)
+
+    def test_exito_reinicia_la_cuenta(self):
+        """ Un éxito entre fallos reinicia la cuenta de fallos seguidos. """
+        breaker = CircuitBreaker(failure_threshold=2)
+        self.fail(breaker, ConnectionError("sin conexión"))
+        self.assertEqual(breaker.call(lambda: "ok"), "ok")
+        self.fail(breaker, ConnectionError("sin conexión"))
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_cierra_con_prueba_exitosa(self):
+        """ Pasado 'reset_timeout' se permite una llamada de prueba; si funciona, cierra. """
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        self.fail(breaker, ConnectionError("sin conexión"))
+        time.sleep(0.06)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertEqual(breaker.call(lambda: "ok"), "ok")
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_reabre_con_prueba_fallida(self):
+        """ Si la llamada de prueba falla, el circuito vuelve a abrirse. """
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        self.fail(breaker, ConnectionError("sin conexión"))
+        time.sleep(0.06)
+        self.fail(breaker, ConnectionError("sin conexión"))
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(breaker.stats()["trips"], 2)
+
+    def test_llamada_lenta_cuenta_como_fallo(self):
+        """ Una llamada más lenta que 'latency_threshold' cuenta como fallo aunque responda. """
+        breaker = CircuitBreaker(failure_threshold=1, latency_threshold=0.01)
+        self.assertEqual(breaker.call(lambda: time.sleep(0.02) or "tarde"), "tarde")
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    def test_errores_del_pedido_no_abren(self):
+        """ Con is_failure de DatabaseManager, ValidationException y TypeError no cuentan. """
+        breaker = CircuitBreaker(failure_threshold=1, is_failure=DatabaseManager.is_service_failure)
+        self.fail(breaker, ServiceError('ValidationException'))
+        self.fail(breaker, ServiceError('ConditionalCheckFailedException'))
+        self.fail(breaker, TypeError("Float types are not supported"))
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.stats()["consecutive_failures"], 0)
+
+    def test_errores_de_disponibilidad_abren(self):
+        """ Throttling, 5xx, timeouts y errores de conexión sí cuentan como fallos. """
+        for error in (ServiceError('ProvisionedThroughputExceededException'), ServiceError('InternalServerError', 500),
+                      TimeoutError("timeout"), ConnectionError("sin conexión")):
+            breaker = CircuitBreaker(failure_threshold=1, is_failure=DatabaseManager.is_service_failure)
+            self.fail(breaker, error)
+            self.assertEqual(breaker.state, CircuitBreaker.OPEN, error)
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_rafaga_hasta_la_capacidad(self):
+        """ El bucket arranca lleno: admite una ráfaga de 'capacity' tokens y después no. """
+        bucket = TokenBucket(rate=1, capacity=5)
+        self.assertTrue(all(bucket.try_acquire() for _ in range(5)))
+        self.assertFalse(bucket.try_acquire())
+        self.assertGreater(bucket.wait_time(), 0.5)
+
+    def test_reserva(self):
+        """ Con 'reserve' solo se toman tokens si quedan al menos esos disponibles después. """
+        bucket = TokenBucket(rate=0.001, capacity=10)
+        self.assertTrue(bucket.try_acquire(6, reserve=2))
+        self.assertFalse(bucket.try_acquire(3, reserve=2))
+        self.assertTrue(bucket.try_acquire(3))
+
+    def test_pedido_mayor_que_el_bucket_queda_en_deuda(self):
+        """ Un pedido más grande que la capacidad se admite con el bucket lleno. """
+        bucket = TokenBucket(rate=0.001, capacity=4)
+        self.assertTrue(bucket.try_acquire(10))
+        self.assertLess(bucket.tokens, 0)
+        self.assertFalse(bucket.try_acquire(1))
+
+    def test_acquire_con_timeout_toma_igual(self):
+        """ acquire() no espera más que 'timeout': vencido el plazo toma los tokens igual. """
+        bucket = TokenBucket(rate=0.001, capacity=1)
+        bucket.try_acquire()
+        waited = bucket.acquire(1, timeout=0.05)
+        self.assertLess(waited, 0.5)
+        self.assertLess(bucket.tokens, 0)
+
+    def test_recarga(self):
+        """ Los tokens se recargan a 'rate' por segundo. """
+        bucket = TokenBucket(rate=100, capacity=1)
+        bucket.try_acquire()
+        bucket.acquire(1, timeout=1.0)
+        self.assertGreaterEqual(bucket.tokens, -0.01)
+
+class TestCapacityGovernor(unittest.TestCase):
+
+    def test_desactivado_sin_capacidad(self):
+        """ Sin capacidades configuradas el governor no limita ni espera. """
+        governor = CapacityGovernor()
+        self.assertFalse(governor.enabled)
+        self.assertEqual(governor.acquire_read(100), 100)
+        self.assertEqual(governor.acquire_write(100), 100)
+        self.assertEqual(governor.stats()["waited_seconds"], {"read": 0.0, "scan": 0.0, "write": 0.0})
+
+    def test_consumo_real_corrige_la_estimacion(self):
+        """ ConsumedCapacity (dict o lista) se descuenta del bucket en lugar de la estimación. """
+        self.assertEqual(consumed_capacity_units({'ConsumedCapacity': {'CapacityUnits': 2.5}}), 2.5)
+        self.assertEqual(consumed_capacity_units({'ConsumedCapacity': [{'CapacityUnits': 1}, {'CapacityUnits': 2}]}), 3)
+        self.assertIsNone(consumed_capacity_units({}))
+        governor = CapacityGovernor(read_capacity=10)
+        estimate = governor.acquire_read(0.5)
+        governor.record_read(estimate, {'ConsumedCapacity': {'CapacityUnits': 4.5}})
+        self.assertAlmostEqual(governor.read_bucket.tokens, 10 - 4.5, delta=0.2)
+        self.assertEqual(governor.stats()["consumed_units"]["read"], 4.5)
+
+    def test_lecturas_masivas_respetan_la_reserva(self):
+        """ Las lecturas batch no usan la reserva de las lecturas puntuales. """
+        governor = CapacityGovernor(read_capacity=10, read_reserve=0.5, max_wait=0.05)
+        governor.acquire_read(5, bulk=True)
+        self.assertAlmostEqual(governor.read_bucket.tokens, 5.0, delta=0.2)
+        self.assertFalse(governor.read_bucket.try_acquire(1, reserve=governor.read_reserve))
+        self.assertTrue(governor.read_bucket.try_acquire(5))  # Un get puede usar la reserva
+
+    def test_throttling_vacia_los_buckets(self):
+        """ Un rechazo por capacidad vacía los buckets del tipo afectado. """
+        governor = CapacityGovernor(read_capacity=10, write_capacity=10)
+        governor.on_throttled("write")
+        self.assertLessEqual(governor.write_bucket.tokens, 0.1)
+        self.assertGreater(governor.read_bucket.tokens, 9)
+        self.assertEqual(governor.stats()["throttled"], 1)
+
+class TestFairScheduler(unittest.TestCase):
+
+    def test_sin_limite_siempre_admite(self):
+        """ Con max_concurrent=0 el scheduler está desactivado. """
+        scheduler = FairScheduler()
+        with scheduler.slot("A") as admitted:
+            self.assertTrue(admitted)
+        self.assertEqual(scheduler.stats()["active"], 0)
+
+    def test_turnos_entre_clientes(self):
+        """ Los lugares libres se reparten por turnos entre UUIDs, no por orden de llegada. """
+        scheduler = FairScheduler(max_concurrent=1)
+        self.assertTrue(scheduler.acquire("A"))
+        granted = []
+
+        def wait_turn(client_id, name):
+            if scheduler.acquire(client_id, timeout=2):
+                granted.append(name)
+
+        threads = []
+        for client_id, name in (("A", "A2"), ("A", "A3"), ("B", "B1")):
+            thread = threading.Thread(target=wait_turn, args=(client_id, name))
+            thread.start()
+            threads.append(thread)
+            wait_until(lambda: scheduler.stats()["waiting"] == len(threads))
+        for expected in range(1, 4):
+            scheduler.release()  # El lugar pasa al siguiente en turno sin liberarse
+            wait_until(lambda: len(granted) == expected)
+        for thread in threads:
+            thread.join(2)
+        self.assertEqual(granted, ["A2", "B1", "A3"])
+        scheduler.release()
+        self.assertEqual(scheduler.stats()["active"], 0)
+        self.assertEqual(scheduler.stats()["queued"], 3)
+
+    def test_timeout_rechaza_y_sale_de_la_cola(self):
+        """ Una solicitud que agota su espera se rechaza y no ocupa un turno. """
+        scheduler = FairScheduler(max_concurrent=1)
+        self.assertTrue(scheduler.acquire("A"))
+        self.assertFalse(scheduler.acquire("B", timeout=0.02))
+        stats = scheduler.stats()
+        self.assertEqual((stats["rejected"], stats["waiting"], stats["waiting_clients"]), (1, 0, 0))
+        scheduler.release()
+        self.assertEqual(scheduler.stats()["active"], 0)
+
+class TestClientRateLimiter(unittest.TestCase):
+
+    def test_limite_por_cliente_y_costo_por_accion(self):
+        """ Cada UUID tiene su bucket; un 'list' cuesta más que un 'get' y 'stats' no cuesta. """
+        limiter = ClientRateLimiter(rate=1, burst=10)
+        self.assertEqual(limiter.check("A", "list"), 0)
+        self.assertGreater(limiter.check("A", "get"), 0)
+        self.assertEqual(limiter.check("A", "stats"), 0)
+        self.assertEqual(limiter.check("B", "get"), 0)
+        self.assertEqual(limiter.throttled, 1)
+
+class TestIdempotencyTable(unittest.TestCase):
+
+    @staticmethod
+    def store_ok(response):
+        return response.get("status") == "OK"
+
+    def test_duplicado_devuelve_la_respuesta_original(self):
+        """ El mismo (UUID, REQUEST_ID) con el mismo contenido no vuelve a ejecutar la escritura. """
+        table = IdempotencyTable()
+        calls = []
+        payload = {"ACTION": "set", "ID": "a", "v": 1}
+        write = lambda: calls.append(1) or {"status": "OK", "data": {"id": "a"}}
+        first = table.execute(("u", "r1"), payload, write, self.store_ok)
+        second = table.execute(("u", "r1"), dict(payload), write, self.store_ok)
+        self.assertEqual(len(calls), 1)
+        self.assertNotIn("replayed", first)
+        self.assertEqual(second, {"status": "OK", "data": {"id": "a"}, "replayed": True})
+        self.assertEqual(table.stats(), {"entries": 1, "in_flight": 0, "executed": 1, "replayed": 1})
+
+    def test_mismo_request_id_con_otro_contenido(self):
+        """ Reusar un REQUEST_ID con otro contenido es un error del cliente. """
+        table = IdempotencyTable()
+        table.execute(("u", "r1"), {"v": 1}, lambda: {"status": "OK"}, self.store_ok)
+        response = table.execute(("u", "r1"), {"v": 2}, lambda: {"status": "OK"}, self.store_ok)
+        self.assertEqual(response["status"], "Error")
+
+    def test_respuestas_no_ok_no_se_guardan(self):
+        """ Los errores y los 'Partial' no se recuerdan: el reintento vuelve a ejecutar. """
+        table = IdempotencyTable()
+        responses = iter([{"status": "Partial"}, {"status": "Error"}, {"status": "OK"}])
+        for _ in range(3):
+            table.execute(("u", "r1"), {"v": 1}, lambda: next(responses), self.store_ok)
+        self.assertEqual(table.stats()["executed"], 3)
+        self.assertEqual(table.execute(("u", "r1"), {"v": 1}, lambda: None, self.store_ok).get("replayed"), True)
+
+    def test_duplicado_concurrente_espera_al_original(self):
+        """ Un duplicado que llega durante la escritura original recibe su respuesta. """
+        table = IdempotencyTable()
+        release = threading.Event()
+        results = []
+
+        def slow_write():
+            release.wait(2)
+            return {"status": "OK"}
+
+        original = threading.Thread(target=lambda: results.append(
+            table.execute(("u", "r1"), {"v": 1}, slow_write, self.store_ok)))
+        original.start()
+        wait_until(lambda: table.stats()["in_flight"] == 1)
+        duplicate = threading.Thread(target=lambda: results.append(
+            table.execute(("u", "r1"), {"v": 1}, lambda: {"status": "Error"}, self.store_ok)))
+        duplicate.start()
+        release.set()
+        original.join(2)
+        duplicate.join(2)
+        self.assertEqual(sorted(r.get("replayed", False) for r in results), [False, True])
+        self.assertEqual(table.stats()["executed"], 1)
+
+    def test_vencimiento_y_maximo_de_entradas(self):
+        """ Las entradas vencen a los 'ttl' segundos y se conservan como máximo 'max_entries'. """
+        table = IdempotencyTable(ttl=0.02, max_entries=2)
+        for request_id in ("r1", "r2", "r3"):
+            table.execute(("u", request_id), {}, lambda: {"status": "OK"}, self.store_ok)
+            self.assertLessEqual(table.stats()["entries"], 2)  # Nunca max_entries + 1, ni al insertar
+        self.assertEqual(table.stats()["entries"], 2)
+        replay = table.execute(("u", "r3"), {}, lambda: {"status": "Error"}, self.store_ok)
+        self.assertTrue(replay.get("replayed"))  # Se descartó la más vieja (r1), no la recién insertada
+        time.sleep(0.03)
+        table.execute(("u", "r1"), {}, lambda: {"status": "Error"}, self.store_ok)
+        self.assertEqual(table.stats()["entries"], 0)
+
+class TestBinaryCodec(unittest.TestCase):
+
+    def test_ida_y_vuelta(self):
+        """ Todos los tipos del protocolo se decodifican igual a como se codificaron. """
+        message = {
+            "status": "OK",
+            "data": [
+                {"id": "UADER-FCYT-IS2", "cp": Decimal("3260"), "saldo": Decimal("-12.50"), "activo": True,
+                 "baja": False, "fax": None, "ratio": 0.25, "firma": b"\x00\xff", "nombre": "Facultad ñ"},
+                {"id": "otro", "clave_nueva": 1, "lista": [0, -1, 2 ** 70, -(2 ** 70), "x", [None]]},
+            ],
+            "missing": [],
+        }
+        self.assertEqual(binary_codec.decode(binary_codec.encode(message)), message)
+
+    def test_decimal_no_pasa_por_float(self):
+        """ Los números de DynamoDB (Decimal) conservan su precisión. """
+        value = Decimal("0.1000000000000000000000000001")
+        decoded = binary_codec.decode(binary_codec.encode({"v": value}))["v"]
+        self.assertIsInstance(decoded, Decimal)
+        self.assertEqual(decoded, value)
+
+    def test_tuplas_y_conjuntos_como_listas(self):
+        """ Tuplas y sets (string sets de DynamoDB) se decodifican como listas. """
+        self.assertEqual(binary_codec.decode(binary_codec.encode((1, 2))), [1, 2])
+        self.assertEqual(binary_codec.decode(binary_codec.encode({"a"})), ["a"])
+
+    def test_claves_repetidas_ocupan_un_byte(self):
+        """ Una clave nueva repetida en varios items se envía una sola vez. """
+        one = len(binary_codec.encode([{"atributo_largo": 1}]))
+        two = len(binary_codec.encode([{"atributo_largo": 1}, {"atributo_largo": 1}]))
+        self.assertEqual(two - one, 5)  # Tag y cantidad del dict, referencia a la clave, tag y valor del entero
+
+    def test_mensajes_invalidos(self):
+        """ Versión desconocida, mensajes truncados o con bytes de más son BinaryDecodeError. """
+        encoded = binary_codec.encode({"id": "abc"})
+        for data in (b"", b"\x09" + encoded[1:], encoded[:-1], encoded + b"\x00", b"\x01\x63"):
+            with self.assertRaises(binary_codec.BinaryDecodeError):
+                binary_codec.decode(data)
+        with self.assertRaises(TypeError):
+            binary_codec.encode({"v": object()})
+
+    def test_anidamiento_maximo(self):
+        """ Un mensaje anidado más allá de MAX_DEPTH es BinaryDecodeError, no RecursionError. """
+        nested = []
+        for _ in range(binary_codec.MAX_DEPTH - 1):
+            nested = [nested]
+        self.assertEqual(binary_codec.decode(binary_codec.encode(nested)), nested)
+        bomb = bytes([binary_codec.VERSION]) + bytes([binary_codec.T_LIST, 1]) * 100000 + bytes([binary_codec.T_NONE])
+        for data in (binary_codec.encode([nested]), bomb):
+            with self.assertRaises(binary_codec.BinaryDecodeError):
+                binary_codec.decode(data)
+
+class TestHedgeBudget(unittest.TestCase):
+
+    def test_cobertura_limitada_a_la_fraccion(self):
+        """ Los pedidos de cobertura nunca superan 'ratio' de las solicitudes. """
+        budget = HedgeBudget(ratio=0.1)
+        spent = 0
+        for _ in range(100):
+            budget.deposit()
+            spent += budget.try_spend()
+        self.assertIn(spent, (9, 10))  # Suma de 0.1 en punto flotante: el décimo puede quedar justo debajo de 1
+        self.assertEqual(budget.stats()["denied"], 100 - spent)
+
+    def test_credito_acotado(self):
+        """ El crédito acumulado no pasa de 'max_credit': tras un período tranquilo no hay ráfaga. """
+        budget = HedgeBudget(ratio=0.5, max_credit=2.0)
+        for _ in range(100):
+            budget.deposit()
+        self.assertEqual(sum(budget.try_spend() for _ in range(5)), 2)
+        self.assertEqual(budget.stats()["credit"], 0)
+
+class TestLatencyTracker(unittest.TestCase):
+
+    def test_timeout_adaptativo(self):
+        """ Sin muestras suficientes se usa el default; después, p99 * multiplier con tope. """
+        tracker = LatencyTracker(window=100, min_samples=10)
+        self.assertEqual(tracker.timeout_for("get", 10.0), 10.0)
+        for i in range(100):
+            tracker.record("get", 0.01 if i < 99 else 0.1)
+        self.assertEqual(tracker.percentile("get", 50), 0.01)
+        self.assertAlmostEqual(tracker.timeout_for("get", 2.0), 0.3)
+        self.assertEqual(tracker.timeout_for("get", 0.2), 0.2)
+
+    def test_piso_del_timeout_adaptativo(self):
+        """ El timeout adaptativo no baja de una fracción del timeout base, o del mínimo indicado. """
+        tracker = LatencyTracker(window=100, min_samples=10)
+        for _ in range(100):
+            tracker.record("get", 0.001)
+        self.assertAlmostEqual(tracker.timeout_for("get", 10.0), 10.0 * MIN_TIMEOUT_FRACTION)
+        self.assertAlmostEqual(tracker.timeout_for("get", 10.0, minimum=0.5), 0.5)
+
+class TestStreamReaders(unittest.TestCase):
+
+    @staticmethod
+    def feed_bytewise(reader, data):
+        # Peor caso de la red: los bytes llegan de a uno
+        messages = []
+        for i in range(len(data)):
+            messages.extend(reader.feed(data[i:i + 1]))
+        return messages
+
+    def test_json_concatenado(self):
+        """ JSONStreamReader separa documentos concatenados sin delimitador, lleguen como lleguen. """
+        documents = [{"id": "a", "texto": "llaves } y { y comillas \\\" en un string"}, [{"id": "b"}], {"id": "ñ"}]
+        data = "  ".join(json.dumps(document, ensure_ascii=False) for document in documents).encode('utf-8')
+        self.assertEqual(wire.JSONStreamReader().feed(data), documents)
+        reader = wire.JSONStreamReader()
+        self.assertEqual(self.feed_bytewise(reader, data), documents)
+        self.assertEqual(reader.pending_bytes, 0)
+
+    def test_json_incompleto_queda_pendiente(self):
+        """ Un documento cortado no se devuelve hasta completarse. """
+        reader = wire.JSONStreamReader()
+        self.assertEqual(reader.feed(b'{"id": "a", "v": [1, 2'), [])
+        self.assertGreater(reader.pending_bytes, 0)
+        self.assertEqual(reader.feed(b']}{"id"'), [{"id": "a", "v": [1, 2]}])
+        self.assertEqual(reader.feed(b': "b"}'), [{"id": "b"}])
+
+    def test_json_invalido_o_demasiado_grande(self):
+        """ Basura fuera de un documento, JSON inválido o un mensaje sin fin son FrameError. """
+        for data in (b'hola', b'{"id": nada}'):
+            with self.assertRaises(wire.FrameError):
+                wire.JSONStreamReader().feed(data)
+        with self.assertRaises(wire.FrameError):
+            wire.JSONStreamReader(max_message_bytes=16).feed(b'{"id": "' + b'x' * 32)
+
+    def test_frames_en_todos_los_formatos(self):
+        """ FrameReader decodifica frames JSON, binarios y comprimidos, aunque lleguen partidos. """
+        message = {"status": "OK", "data": {"id": "a", "cp": Decimal("3260")}}
+        data = (wire.encode_frame(message, wire.ENCODING_JSON)
+                + wire.encode_frame(message, wire.ENCODING_BINARY)
+                + wire.frame(zlib.compress(binary_codec.encode(message)), wire.FLAG_BINARY | wire.FLAG_ZLIB))
+        expected = [{"status": "OK", "data": {"id": "a", "cp": 3260}}, message, message]
+        self.assertEqual(wire.FrameReader().feed(data), expected)
+        reader = wire.FrameReader()
+        self.assertEqual(self.feed_bytewise(reader, data), expected)
+        self.assertEqual(reader.pending_bytes, 0)
+
+    def test_frames_invalidos(self):
+        """ Un header sin MAGIC o un frame mayor que el máximo son FrameError. """
+        with self.assertRaises(wire.FrameError):
+            wire.FrameReader().feed(b'{"id": "a"}')
+        with self.assertRaises(wire.FrameError):
+            wire.FrameReader(max_frame_bytes=8).feed(wire.encode_frame({"id": "x" * 32}))
+
+class TestBackoff(unittest.TestCase):
+
+    def test_crece_hasta_el_tope(self):
+        """ Sin jitter la espera se duplica desde 'base' hasta 'cap'. """
+        backoff = Backoff(base=0.1, cap=1.0, jitter=False)
+        self.assertEqual([round(backoff.next_delay(), 3) for _ in range(6)], [0.1, 0.2, 0.4, 0.8, 1.0, 1.0])
+
+    def test_jitter_entre_cero_y_el_tope(self):
+        """ Con jitter cada espera es un valor al azar entre 0 y el tope del intento. """
+        backoff = Backoff(base=0.1, cap=1.0)
+        delays = [backoff.next_delay() for _ in range(50)]
+        self.assertTrue(all(0 <= delay <= 1.0 for delay in delays))
+        self.assertLessEqual(delays[0], 0.1)
+
+    def test_reset(self):
+        """ reset() vuelve a la espera inicial. """
+        backoff = Backoff(base=0.1, cap=1.0, jitter=False)
+        for _ in range(5):
+            backoff.next_delay()
+        backoff.reset()
+        self.assertEqual(backoff.next_delay(), 0.1)
+
+    def test_muchos_reintentos_sin_overflow(self):
+        """ Una caída larga (miles de reintentos) no termina en OverflowError. """
+        for backoff in (Backoff(cap=30.0), Backoff(base=0.0, cap=30.0)):
+            for _ in range(5000):
+                delay = backoff.next_delay()
+            self.assertLessEqual(delay, 30.0)
+            self.assertLessEqual(backoff.attempts, Backoff.MAX_EXPONENT)
+
+class TestResponseCompressor(unittest.TestCase):
+
+    def test_umbral_y_ganancia(self):
+        """ Solo se comprime a partir del umbral y si el resultado es más chico. """
+        compressor = ResponseCompressor(threshold=100)
+        self.assertEqual(compressor.compress(b"x" * 50), (b"x" * 50, False))
+        data, compressed = compressor.compress(b'{"id": "a"}' * 100)
+        self.assertTrue(compressed)
+        self.assertEqual(zlib.decompress(data), b'{"id": "a"}' * 100)
+        noise = os.urandom(200)
+        self.assertEqual(compressor.compress(noise), (noise, False))
+        stats = compressor.stats()
+        self.assertEqual((stats["compressed"], stats["skipped"]), (1, 2))
+        self.assertLess(stats["ratio"], 0.1)
+
+    def test_nivel_cero_desactiva(self):
+        """ Con nivel 0 nunca se comprime. """
+        compressor = ResponseCompressor(level=0, threshold=0)
+        self.assertFalse(compressor.enabled)
+        self.assertFalse(compressor.compress(b"x" * 5000)[1])
+
+class TestEncodedResponseCache(unittest.TestCase):
+
+    def test_una_entrada_por_variante(self):
+        """ Cada codificación/compresión de la misma respuesta se guarda por separado. """
+        cache = EncodedResponseCache()
+        version = cache.version
+        cache.put("get:a", "json", b"json-bytes", version)
+        cache.put("get:a", "binary+zlib", b"binary-bytes", version)
+        self.assertEqual(cache.get("get:a", "json"), b"json-bytes")
+        self.assertEqual(cache.get("get:a", "binary+zlib"), b"binary-bytes")
+        self.assertIsNone(cache.get("get:a", "binary"))
+        self.assertEqual(cache.stats()["bytes_served"], len(b"json-bytes") + len(b"binary-bytes"))
+
+    def test_escritura_invalida_todo(self):
+        """ bump() descarta todas las entradas y una respuesta armada antes no se guarda. """
+        cache = EncodedResponseCache()
+        version = cache.version
+        cache.put("list", "json", b"viejo", version)
+        cache.bump()
+        self.assertIsNone(cache.get("list", "json"))
+        cache.put("list", "json", b"viejo", version)  # Consultada antes de la escritura
+        self.assertIsNone(cache.get("list", "json"))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_ttl(self):
+        """ Las entradas vencen (otro proceso puede escribir en DynamoDB). """
+        cache = EncodedResponseCache(ttl=0.02)
+        cache.put("list", "json", b"datos", cache.version)
+        time.sleep(0.03)
+        self.assertIsNone(cache.get("list", "json"))
+
+class FakeSubscription:
+    # Suscripción controlada por la prueba: push() entrega una notificación y end() la corta
+    def __init__(self):
+        self._updates = []
+        self._event = threading.Condition()
+        self._closed = False
+
+    def push(self, update):
+        with self._event:
+            self._updates.append(update)
+            self._event.notify()
+
+    def end(self):
+        with self._event:
+            self._closed = True
+            self._event.notify()
+
+    close = end
+
+    def __iter__(self):
+        while True:
+            with self._event:
+                self._event.wait_for(lambda: self._updates or self._closed)
+                if self._updates:
+                    update = self._updates.pop(0)
+                else:
+                    return
+            yield update
+
+class FakeSubscribingClient:
+    # Cliente con una suscripción nueva por cada subscribe(endpoint=...)
+    def __init__(self):
+        self.subscriptions = {}
+
+    def subscribe(self, ack=False, endpoint=0):
+        subscription = self.subscriptions[endpoint] = FakeSubscription()
+        return subscription
+
+class TestNearCache(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeSubscribingClient()
+        self.cache = NearCache(self.client, max_items=2, reconnect_delay=0.01, endpoints=2)
+        self.addCleanup(self.cache.close)
+        wait_until(lambda: self.cache.ready)
+
+    @staticmethod
+    def response(item):
+        return {"status": "OK", "data": item}
+
+    def test_una_suscripcion_por_endpoint(self):
+        """ Se suscribe a cada instancia: una escritura notificada por cualquiera actualiza la caché. """
+        self.assertEqual(set(self.client.subscriptions), {0, 1})
+        self.assertEqual(self.cache.stats()["subscriptions"], 2)
+        self.cache.put("a", self.response({"id": "a", "v": 1}), self.cache.version)
+        self.client.subscriptions[1].push({"id": "a", "v": 2})
+        wait_until(lambda: self.cache.stats()["updates"] == 1)
+        self.assertEqual(self.cache.get("a"), self.response({"id": "a", "v": 2}))
+
+    def test_perder_una_suscripcion_descarta_la_caché(self):
+        """ Si se corta la suscripción a una instancia, la caché se descarta hasta resuscribirse. """
+        self.cache.put("a", self.response({"id": "a", "v": 1}), self.cache.version)
+        first = self.client.subscriptions[1]
+        first.end()
+        wait_until(lambda: self.client.subscriptions[1] is not first and self.cache.ready)
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats()["resyncs"], 1)
+
+    def test_respuesta_vieja_no_se_guarda(self):
+        """ Una respuesta pedida antes de una notificación no se guarda, ni una que no es OK o es stale. """
+        version = self.cache.version
+        self.client.subscriptions[0].push([{"id": "b"}])
+        wait_until(lambda: self.cache.version != version)
+        self.cache.put("a", self.response({"id": "a"}), version)
+        self.cache.put("c", {"status": "Error", "message": "Item not found"}, self.cache.version)
+        self.cache.put("d", dict(self.response({"id": "d"}), stale=True), self.cache.version)
+        self.assertEqual(self.cache.stats()["items"], 0)
+
+    def test_escrituras_propias_invalidan_y_copias_independientes(self):
+        """ set/mset propios invalidan; quien recibe una respuesta puede modificarla sin tocar la caché. """
+        for item_id in ("a", "b"):
+            self.cache.put(item_id, self.response({"id": item_id}), self.cache.version)
+        self.cache.get("a")["data"]["v"] = "modificado"
+        self.assertEqual(self.cache.get("a"), self.response({"id": "a"}))
+        self.cache.invalidate_written({"ITEMS": [{"ID": "a"}, {"id": "b"}]})
+        self.assertEqual(self.cache.stats()["items"], 0)
+        self.assertEqual(self.cache.stats()["invalidations"], 2)
+
+
+class FakeTable:
+    # Tabla de DynamoDB mínima: el nombre, las llamadas recibidas y un error opcional para update_item
+    def __init__(self, name="CorporateData", error=None):
+        self.name = name
+        self.error = error
+        self.calls = []
+
+    def update_item(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.error is not None:
+            raise self.error
+        return {'Attributes': {'id': kwargs['Key']['id']}}
+
+class FakeDynamoDB:
+    # Recurso de DynamoDB con respuestas programadas: cada llamada consume la siguiente (o la lanza)
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def _next(self, **kwargs):
+        self.calls.append(kwargs)
+        response = self.responses.pop(0) if self.responses else {}  # Sin respuestas programadas: todo procesado
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    batch_get_item = _next
+    batch_write_item = _next
+
+def make_db_manager(dynamodb=None, table=None):
+    # DatabaseManager sin boto3: se saltea el singleton y se inyectan los dobles
+    db = object.__new__(DatabaseManager)
+    db.dynamodb = db.bulk_dynamodb = dynamodb or FakeDynamoDB()
+    db.corporate_data_table = db.bulk_data_table = table or FakeTable()
+    db.breaker = CircuitBreaker(is_failure=DatabaseManager.is_service_failure)
+    db.governor = CapacityGovernor()
+    db.call_latency = None
+    db.call_errors = None
+    db.batch_executor = ThreadPoolExecutor(max_workers=2)
+    db.BATCH_BACKOFF_BASE = 0
+    return db
+
+class FakeServerDB:
+    # Lo que el servidor usa del DatabaseManager en mget y patch: auditoría, BatchGetItem y UpdateItem
+    def __init__(self, items=()):
+        self.items = {item["id"]: item for item in items}
+        self.batches = []
+        self.updates = []
+
+    def log_action(self, *args):
+        pass
+
+    def batch_get_corporate_data(self, item_ids):
+        self.batches.append(list(item_ids))
+        return {i: self.items[i] for i in item_ids if i in self.items}, []
+
+    def update_corporate_data(self, item_id, attributes, remove_attributes=()):
+        self.updates.append((item_id, attributes, remove_attributes))
+        return dict(attributes, id=item_id)
+
+def make_server(db):
+    # Server sin sockets ni DynamoDB: solo el estado que usan los handlers
+    server = object.__new__(Server)
+    server.db_manager = db
+    server.cache = ItemCache(max_items=100, ttl=30)
+    server.read_flight = SingleFlight()
+    server.response_cache = EncodedResponseCache()
+    return server
+
+class TestBatchGet(unittest.TestCase):
+
+    def test_ids_invalidos_no_llegan_a_dynamodb(self):
+        """ mget devuelve los IDs inválidos en 'invalid' y consulta solo los válidos. """
+        db = FakeServerDB([{"id": "a"}, {"id": "7"}])
+        server = make_server(db)
+        ids = ["a", 7, "", ["x"], {"k": 1}, True, "b", "z" * 2049]
+        response = server.handle_mget({"UUID": "u", "IDS": ids}, "s")
+        self.assertEqual(response["status"], "OK")
+        self.assertEqual(response["data"], [{"id": "a"}, {"id": "7"}])
+        self.assertEqual(response["missing"], ["b"])
+        self.assertEqual(response["invalid"], ["", ["x"], {"k": 1}, True, "z" * 2049])
+        self.assertEqual(sorted(db.batches[0]), ["7", "a", "b"])
+
+    def test_solo_ids_invalidos(self):
+        """ Sin IDs válidos no hay consulta a DynamoDB. """
+        db = FakeServerDB()
+        response = make_server(db).handle_mget({"UUID": "u", "IDS": [None, ""]}, "s")
+        self.assertEqual(response, {"status": "OK", "data": [], "missing": [], "invalid": [None, ""]})
+        self.assertEqual(db.batches, [])
+
+    def test_validation_exception_no_es_unprocessed(self):
+        """ Un error del pedido deja los IDs como inexistentes; el throttling los deja sin procesar. """
+        db = make_db_manager(FakeDynamoDB(ServiceError('ValidationException')))
+        self.assertEqual(db._batch_get_chunk(["a", "b"]), ({}, []))
+        db = make_db_manager(FakeDynamoDB(ServiceError('ProvisionedThroughputExceededException')))
+        self.assertEqual(db._batch_get_chunk(["a", "b"]), ({}, ["a", "b"]))
+
+
+class TestBatchWrite(unittest.TestCase):
+
+    @staticmethod
+    def unprocessed(*item_ids):
+        return {'UnprocessedItems': {'CorporateData': [{'PutRequest': {'Item': {'id': i}}} for i in item_ids]}}
+
+    def test_bloques_de_25_sin_repetidos(self):
+        """ mset se parte en bloques de 25 items únicos; con IDs repetidos gana el último. """
+        dynamodb = FakeDynamoDB()
+        db = make_db_manager(dynamodb)
+        items = [{'id': str(i)} for i in range(60)] + [{'id': '0', 'v': 2}]
+        written, failed = db.batch_set_corporate_data(items)
+        self.assertEqual(sorted(written, key=int), [str(i) for i in range(60)])
+        self.assertEqual(failed, {})
+        sizes = sorted(len(call['RequestItems']['CorporateData']) for call in dynamodb.calls)
+        self.assertEqual(sizes, [10, 25, 25])
+        sent = [req['PutRequest']['Item'] for call in dynamodb.calls for req in call['RequestItems']['CorporateData']]
+        self.assertIn({'id': '0', 'v': 2}, sent)
+        self.assertNotIn({'id': '0'}, sent)
+
+    def test_reintenta_solo_los_no_procesados(self):
+        """ Los UnprocessedItems se reenvían solos hasta que DynamoDB los procesa. """
+        dynamodb = FakeDynamoDB(self.unprocessed('b'), {})
+        written, failed = make_db_manager(dynamodb).batch_set_corporate_data([{'id': 'a'}, {'id': 'b'}])
+        self.assertEqual((sorted(written), failed), (['a', 'b'], {}))
+        self.assertEqual(len(dynamodb.calls), 2)
+        self.assertEqual(dynamodb.calls[1]['RequestItems'], self.unprocessed('b')['UnprocessedItems'])
+
+    def test_agotados_los_reintentos(self):
+        """ Lo que sigue sin procesar tras los reintentos se informa como fallido. """
+        dynamodb = FakeDynamoDB(self.unprocessed('a', 'b'), self.unprocessed('b'))
+        db = make_db_manager(dynamodb)
+        db.BATCH_MAX_RETRIES = 1
+        written, failed = db.batch_set_corporate_data([{'id': 'a'}, {'id': 'b'}])
+        self.assertEqual((written, failed), (['a'], {'b': "Unprocessed after retries"}))
+
+    def test_error_de_servicio(self):
+        """ Si la llamada falla, los items pendientes quedan fallidos con el motivo. """
+        dynamodb = FakeDynamoDB(self.unprocessed('b'), ServiceError('ThrottlingException'))
+        written, failed = make_db_manager(dynamodb).batch_set_corporate_data([{'id': 'a'}, {'id': 'b'}])
+        self.assertEqual((written, failed), (['a'], {'b': 'ThrottlingException'}))
+
+
+class TestPatch(unittest.TestCase):
+
+    def patch(self, **fields):
+        self.db = FakeServerDB()
+        return make_server(self.db).handle_patch(dict(fields, UUID="u", ACTION="patch"), "s")
+
+    def test_expresion_set_y_remove(self):
+        """ La UpdateExpression usa placeholders para nombres y valores, y la condición attribute_exists. """
+        table = FakeTable()
+        db = make_db_manager(table=table)
+        self.assertEqual(db.update_corporate_data("a", {"nombre": "x", "edad": 3}, ["viejo"]), {"id": "a"})
+        params = table.calls[0]
+        self.assertEqual(params['UpdateExpression'], "SET #s0 = :v0, #s1 = :v1 REMOVE #r0")
+        self.assertEqual(params['ExpressionAttributeNames'], {"#s0": "nombre", "#s1": "edad", "#r0": "viejo", "#id": "id"})
+        self.assertEqual(params['ExpressionAttributeValues'], {":v0": "x", ":v1": 3})
+        self.assertEqual(params['ConditionExpression'], "attribute_exists(#id)")
+        self.assertEqual(params['Key'], {"id": "a"})
+
+    def test_solo_remove(self):
+        """ Sin atributos a modificar no se envían ExpressionAttributeValues. """
+        table = FakeTable()
+        make_db_manager(table=table).update_corporate_data("a", {}, ["viejo"])
+        self.assertEqual(table.calls[0]['UpdateExpression'], "REMOVE #r0")
+        self.assertNotIn('ExpressionAttributeValues', table.calls[0])
+
+    def test_item_inexistente(self):
+        """ ConditionalCheckFailedException se informa como ItemNotFoundError. """
+        db = make_db_manager(table=FakeTable(error=ServiceError('ConditionalCheckFailedException')))
+        with self.assertRaises(ItemNotFoundError):
+            db.update_corporate_data("a", {"x": 1})
+
+    def test_remove_invalido(self):
+        """ REMOVE que no es una lista de nombres no vacíos responde error sin tocar DynamoDB. """
+        for remove in (3, {"a": 1}, [""], ["a", 2], [["a"]], ["id"], None):
+            response = self.patch(ID="a", nombre="x", REMOVE=remove)
+            self.assertEqual(response, {"status": "Error", "message": "Invalid REMOVE for patch operation"}, remove)
+            self.assertEqual(self.db.updates, [])
+
+    def test_remove_no_es_atributo(self):
+        """ REMOVE no se guarda como atributo; los nombres repetidos o enviados con valor se descartan. """
+        response = self.patch(ID="a", nombre="x", REMOVE=["viejo", "viejo", "nombre"])
+        self.assertEqual(response["status"], "OK")
+        self.assertEqual(self.db.updates, [("a", {"nombre": "x"}, ["viejo"])])
+        self.assertNotIn("REMOVE", Server._clean_item({"ID": "a", "REMOVE": ["x"], "nombre": "y"}))
+
+
+class TestLaneRouter(unittest.TestCase):
+
+    def test_carril_por_accion(self):
+        """ get/set/patch/subscribe/stats van por fast; list/mget/mset por bulk; lo desconocido por fast. """
+        for action in ("get", "set", "patch", "update", "subscribe", "stats", "otra"):
+            self.assertEqual(LaneRouter.lane_for(action), FAST_LANE, action)
+        for action in ("list", "mget", "mset"):
+            self.assertEqual(LaneRouter.lane_for(action), BULK_LANE, action)
+
+    def test_sin_limite_por_defecto(self):
+        """ Por defecto ningún carril limita: los list concurrentes no esperan. """
+        router = LaneRouter()
+        with router.slot("list", "a", timeout=0) as first, router.slot("list", "b", timeout=0) as second:
+            self.assertTrue(first and second)
+        self.assertEqual(router.stats()[BULK_LANE]["max_concurrent"], 0)
+
+    def test_bulk_lleno_no_frena_fast(self):
+        """ Con el carril bulk ocupado, otro list espera (y vence), pero un get entra enseguida. """
+        router = LaneRouter(bulk_concurrency=1)
+        with router.slot("list", "a") as admitted:
+            self.assertTrue(admitted)
+            with router.slot("mget", "b", timeout=0.01) as waited:
+                self.assertFalse(waited)
+            with router.slot("get", "b", timeout=0) as fast:
+                self.assertTrue(fast)
+        stats = router.stats()
+        self.assertEqual((stats[BULK_LANE]["rejected"], stats[FAST_LANE]["rejected"]), (1, 0))
+        self.assertEqual(stats[BULK_LANE]["active"], 0)
+
+
+class FakeWireServer:
+    # Servidor mínimo del protocolo con frames: responde cada solicitud con handler(request).
+    # Con 'keepalive' False imita a un servidor que cierra la conexión después de responder;
+    # con 'unix_path' escucha en un socket Unix (address queda como (ruta, None))
+    def __init__(self, handler=None, keepalive=True, unix_path=None):
+        self.handler = handler or (lambda request: {"status": "OK", "data": request})
+        self.keepalive = keepalive
+        self.requests = []
+        self.connections = []
+        if unix_path:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.bind(unix_path)
+            self.address = (unix_path, None)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.bind(("127.0.0.1", 0))
+            self.address = self.sock.getsockname()
+        self.sock.listen()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        pending = b""
+        with conn:
+            while True:
+                try:
+                    request, flags, pending = wire.recv_frame(conn, pending)
+                except (OSError, wire.FrameError):
+                    return
+                if request is None:
+                    return
+                self.requests.append(request)
+                keepalive = wire.FLAG_KEEPALIVE if self.keepalive else 0
+                conn.sendall(wire.encode_frame(self.handler(request), wire.encoding_of(flags), flags=keepalive))
+                if not keepalive:
+                    return
+
+    def drop_connections(self):
+        # Cierra del lado del servidor las conexiones abiertas (p. ej. libres en el pool del cliente)
+        for conn in self.connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close(self):
+        self.drop_connections()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+class TestCorporateClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeWireServer()
+        self.addCleanup(self.server.close)
+        self.client = CorporateClient(*self.server.address, client_uuid="u", timeout=2.0)
+        self.addCleanup(self.client.close)
+
+    def test_solicitudes(self):
+        """ Cada método arma su ACTION; solo las escrituras llevan REQUEST_ID. """
+        self.assertEqual(self.client.get("a")["data"]["ID"], "a")
+        self.client.set("a", {"x": 1})
+        self.client.patch("a", {"x": 2}, remove=("y",))
+        self.client.mget(["a", "b"])
+        get, set_, patch, mget = self.server.requests
+        self.assertEqual((get["ACTION"], get["UUID"]), ("get", "u"))
+        self.assertNotIn("REQUEST_ID", get)
+        self.assertEqual((set_["ACTION"], set_["ID"], set_["x"]), ("set", "a", 1))
+        self.assertIn("REQUEST_ID", set_)
+        self.assertEqual((patch["REMOVE"], patch["x"]), (["y"], 2))
+        self.assertEqual(mget["IDS"], ["a", "b"])
+        self.assertNotIn("REQUEST_ID", mget)
+
+    def test_reutiliza_la_conexion(self):
+        """ Con FLAG_KEEPALIVE en la respuesta, las solicitudes siguientes usan la misma conexión. """
+        for _ in range(3):
+            self.assertEqual(self.client.stats()["status"], "OK")
+        self.assertEqual(len(self.server.connections), 1)
+        self.assertEqual(self.client.client_stats()["pools"][0]["reused"], 2)
+
+    def test_servidor_sin_keepalive(self):
+        """ Si el servidor no devuelve FLAG_KEEPALIVE, cada solicitud abre una conexión nueva. """
+        self.server.keepalive = False
+        for _ in range(3):
+            self.client.get("a")
+        self.assertEqual(len(self.server.connections), 3)
+
+    def test_conexion_libre_cerrada_por_el_servidor(self):
+        """ Una conexión del pool que el servidor cerró se reemplaza sin que el llamador lo note. """
+        self.client.get("a")
+        self.server.drop_connections()
+        self.assertEqual(self.client.get("b")["data"]["ID"], "b")
+        self.assertEqual(len(self.server.connections), 2)
+
+    def test_round_robin_entre_instancias(self):
+        """ Con varios endpoints, las solicitudes se reparten por turnos. """
+        other = FakeWireServer()
+        self.addCleanup(other.close)
+        client = CorporateClient(endpoints=[self.server.address, other.address], timeout=2.0)
+        self.addCleanup(client.close)
+        for i in range(4):
+            client.get(str(i))
+        self.assertEqual(([r["ID"] for r in self.server.requests], [r["ID"] for r in other.requests]),
+                         (["0", "2"], ["1", "3"]))
+
+    def test_cliente_asincronico(self):
+        """ AsyncCorporateClient tiene la misma API y también reutiliza la conexión. """
+        async def run():
+            async with AsyncCorporateClient(*self.server.address, client_uuid="u", timeout=2.0) as client:
+                first = await client.get("a")
+                second = await client.set("a", {"x": 1})
+                return first, second
+        first, second = asyncio.run(run())
+        self.assertEqual((first["data"]["ACTION"], second["data"]["ACTION"]), ("get", "set"))
+        self.assertIn("REQUEST_ID", second["data"])
+        self.assertEqual(len(self.server.connections), 1)
+
+
+class TestBatchMode(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeWireServer()
+        self.addCleanup(self.server.close)
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def run_batch(self, lines, address=None, retries=0, **kwargs):
+        host, port = address or self.server.address
+        batch_file = os.path.join(self.dir.name, "batch.jsonl")
+        output_file = os.path.join(self.dir.name, "out.jsonl")
+        with open(batch_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        client = SingletonClient(host, port, None, output_file, False, retries=retries)
+        with contextlib.redirect_stderr(io.StringIO()) as summary:
+            client.run_batch(batch_file, concurrency=2, timeout=2.0, **kwargs)
+        with open(output_file, encoding="utf-8") as f:
+            return [json.loads(line) for line in f], summary.getvalue()
+
+    def test_resultado_por_linea(self):
+        """ Cada línea no vacía produce un registro, en orden con 'ordered'; las inválidas con su error. """
+        lines = ['{"ACTION": "get", "ID": "a"}', '', 'no es json', '{"ID": "b"}', '{"ACTION": "set", "ID": "c"}']
+        records, summary = self.run_batch(lines, ordered=True)
+        self.assertEqual([r["line"] for r in records], [1, 3, 4, 5])
+        self.assertEqual(records[0]["response"]["data"]["ID"], "a")
+        self.assertEqual((records[1]["error"], records[2]["error"]), ("Invalid JSON", "Missing ACTION"))
+        self.assertEqual(records[3]["response"]["data"]["ACTION"], "set")
+        self.assertIn("Batch: 4 requests", summary)
+
+    def test_error_inesperado_no_corta_el_batch(self):
+        """ Una línea que falla con un error que no es de red queda registrada y el batch sigue. """
+        lines = ['{"ACTION": "get", "ID": "a", "timeout": "x"}', '{"ACTION": "get", "ID": "b"}']
+        records, _ = self.run_batch(lines, ordered=True, retries=2)
+        self.assertTrue(records[0]["error"].startswith("TypeError"))
+        self.assertEqual(records[1]["response"]["data"]["ID"], "b")
+        self.assertEqual(len(self.server.requests), 1)  # El error no se reintenta
+
+    def test_error_de_red_tras_los_reintentos(self):
+        """ Sin servidor, cada línea termina con el error de conexión después de los reintentos. """
+        with socket.socket() as unused:
+            unused.bind(("127.0.0.1", 0))
+            address = unused.getsockname()
+        records, summary = self.run_batch(['{"ACTION": "get", "ID": "a"}'], address=address, retries=1)
+        self.assertEqual(records[0]["line"], 1)
+        self.assertIn("error", records[0])
+        self.assertIn("Failed: 1", summary)
+
+
+class TestSinks(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.dir.name, name)
+
+    @staticmethod
+    def read_lines(path):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_jsonl_buffer_y_flush_periodico(self):
+        """ Las líneas quedan en el buffer hasta flush_bytes o hasta el próximo flush periódico. """
+        sink = JSONLSink(self.path("o.jsonl"), flush_interval=0.02, flush_bytes=1024 * 1024)
+        self.addCleanup(sink.close)
+        sink.write({"id": "a", "v": Decimal("1.5")})
+        self.assertEqual(os.path.getsize(self.path("o.jsonl")), 0)
+        wait_until(lambda: sink.flushes >= 1)
+        self.assertEqual(self.read_lines(self.path("o.jsonl")), [{"id": "a", "v": 1.5}])
+
+    def test_jsonl_rotacion_comprimida(self):
+        """ Al superar max_bytes el archivo rota a path.1.gz y se conservan 'backups' archivos. """
+        sink = JSONLSink(self.path("o.jsonl"), flush_interval=60, flush_bytes=1, max_bytes=30, backups=2)
+        for i in range(4):
+            sink.write({"id": str(i), "relleno": "x" * 10})
+        sink.close()
+        self.assertEqual(sink.rotations, 3)
+        self.assertEqual(sorted(os.listdir(self.dir.name)), ["o.jsonl", "o.jsonl.1.gz", "o.jsonl.2.gz"])
+        self.assertEqual([r["id"] for r in self.read_lines(self.path("o.jsonl.2.gz"))], ["1"])
+        self.assertEqual([r["id"] for r in self.read_lines(self.path("o.jsonl"))], ["3"])
+
+    def test_sqlite_upsert(self):
+        """ El espejo SQLite guarda la última versión de cada id, también de las listas de mset. """
+        sink = SQLiteSink(self.path("m.db"), flush_interval=60)
+        sink.write({"id": "a", "v": 1})
+        sink.write([{"id": "a", "v": 2}, {"id": "b", "v": 3}, {"sin": "id"}])
+        sink.flush()
+        sink.write({"id": "b", "v": 4})
+        sink.close()
+        with contextlib.closing(sqlite3.connect(self.path("m.db"))) as db:
+            rows = dict(db.execute("SELECT id, data FROM CorporateData"))
+        self.assertEqual({k: json.loads(v)["v"] for k, v in rows.items()}, {"a": 2, "b": 4})
+        self.assertEqual(sink.upserts, 3)
+
+    def test_error_de_flush_no_detiene_el_hilo(self):
+        """ Un OSError en el flush periódico se cuenta y el hilo sigue vaciando el buffer. """
+        sink = JSONLSink(self.path("o.jsonl"), flush_interval=0.01, flush_bytes=1024 * 1024)
+        self.addCleanup(sink.close)
+        flush_locked = sink._flush_locked
+        failures = [OSError("No space left on device")]
+
+        def failing_flush():
+            if failures:
+                raise failures.pop()
+            flush_locked()
+        sink._flush_locked = failing_flush
+        with self.assertLogs(level="ERROR"):
+            wait_until(lambda: sink.flush_errors == 1)
+        sink.write({"id": "a"})
+        wait_until(lambda: sink.flushes >= 1)
+        self.assertTrue(sink._flusher.is_alive())
+
+
+class ListSink:
+    # Sink en memoria para el cliente Observer
+    def __init__(self):
+        self.updates = []
+
+    def write(self, update):
+        self.updates.append(update)
+
+    def close(self):
+        pass
+
+class TestHeartbeats(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = SubscriptionManager()
+        self.addCleanup(self.manager.close_all)
+
+    def socketpair(self):
+        server_side, client_side = socket.socketpair()
+        self.addCleanup(server_side.close)
+        self.addCleanup(client_side.close)
+        return server_side, client_side
+
+    def test_latidos_solo_con_ack(self):
+        """ Los observadores con ACK reciben la confirmación y los latidos; los legacy, nada. """
+        acked, acked_client = self.socketpair()
+        legacy, legacy_client = self.socketpair()
+        self.manager.attach(acked, wire.ENCODING_JSON, dict(wire.SUBSCRIBED, heartbeat=15))
+        self.manager.attach(legacy, None)
+        self.assertEqual(self.manager.heartbeat(), 1)
+        reader = wire.FrameReader()
+        acked_client.settimeout(1)
+        messages = []
+        while len(messages) < 2:
+            messages.extend(reader.feed(acked_client.recv(65536)))
+        self.assertTrue(wire.is_subscription_confirmation(messages[0]))
+        self.assertTrue(wire.is_heartbeat(messages[1]))
+        legacy_client.setblocking(False)
+        with self.assertRaises(BlockingIOError):
+            legacy_client.recv(1)
+
+    def test_observador_que_no_lee_se_descarta(self):
+        """ Si el latido no se puede enviar a tiempo (cliente que no lee), el observador se descarta. """
+        slow, _ = self.socketpair()
+        slow.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        slow.settimeout(0.01)
+        self.manager.attach(slow, wire.ENCODING_JSON, dict(wire.SUBSCRIBED))
+        for _ in range(100000):
+            if not self.manager.heartbeat():
+                break
+        self.assertEqual(self.manager.stats()["observers"], 0)
+        self.assertEqual(self.manager.dropped, 1)
+
+    def test_conexion_inactiva_vence(self):
+        """ Una conexión persistente sin solicitudes vence a los --idle-timeout segundos. """
+        conn, _ = self.socketpair()
+        with self.assertRaises(socket.timeout):
+            Server._read_request(conn, read_timeout=5, idle_timeout=0.02)
+
+    def listen(self, *messages):
+        # El cliente Observer procesa 'messages' (JSON legacy) hasta que el servidor cierra
+        observer = ObserverClient("localhost", 0, None, False, sink=ListSink())
+        observer.sock, server_side = socket.socketpair()
+        self.addCleanup(observer.sock.close)
+        with server_side:
+            server_side.sendall(b"".join(json.dumps(m).encode('utf-8') for m in messages))
+        with self.assertRaises(OSError):
+            observer.listen_for_updates()
+        return observer
+
+    def test_observer_con_confirmacion(self):
+        """ La confirmación no se escribe como notificación y fija el plazo en 3 latidos. """
+        observer = self.listen(dict(wire.SUBSCRIBED, heartbeat=15), wire.HEARTBEAT, {"id": "a"})
+        self.assertEqual(observer.sink.updates, [{"id": "a"}])
+        self.assertEqual(observer.sock.gettimeout(), 45)
+
+    def test_observer_sin_confirmacion(self):
+        """ Con un servidor que no confirma, el primer mensaje es una notificación y no se pierde. """
+        observer = self.listen({"id": "a"}, {"id": "b"})
+        self.assertEqual(observer.sink.updates, [{"id": "a"}, {"id": "b"}])
+        self.assertIsNone(observer.sock.gettimeout())
+
+
+class TestUnixSocket(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, "server.sock")
+
+    def bind(self, mode=0o660):
+        # Solo el estado que usa _bind_unix
+        server = object.__new__(Server)
+        server.unix_socket = self.path
+        server.unix_mode = mode
+        sock = server._bind_unix()
+        self.addCleanup(sock.close)
+        return sock
+
+    def test_permisos(self):
+        """ El socket se crea con los permisos de --unix-mode. """
+        self.bind(mode=0o600)
+        self.assertTrue(stat.S_ISSOCK(os.stat(self.path).st_mode))
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_socket_abandonado_se_reemplaza(self):
+        """ Un archivo de socket que quedó de otra ejecución (nadie escucha) se reemplaza. """
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.path)
+        stale.close()
+        self.bind()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            probe.connect(self.path)
+
+    def test_socket_en_uso_o_archivo_comun(self):
+        """ No se pisa un socket en uso ni un archivo que no es un socket. """
+        self.bind()
+        with self.assertRaises(OSError) as in_use:
+            self.bind()
+        self.assertEqual(in_use.exception.errno, errno.EADDRINUSE)
+        other = os.path.join(self.dir.name, "archivo")
+        open(other, "w").close()
+        self.path = other
+        with self.assertRaises(OSError) as not_socket:
+            self.bind()
+        self.assertEqual(not_socket.exception.errno, errno.EEXIST)
+
+    def test_cliente_por_socket_unix(self):
+        """ CorporateClient con unix_socket usa el pool sobre AF_UNIX y reutiliza la conexión. """
+        server = FakeWireServer(unix_path=self.path)
+        self.addCleanup(server.close)
+        with CorporateClient(unix_socket=self.path, timeout=2.0) as client:
+            self.assertEqual(client.get("a")["data"]["ID"], "a")
+            self.assertEqual(client.get("b")["data"]["ID"], "b")
+            self.assertEqual(client.client_stats()["pools"][0]["endpoint"], "unix:" + self.path)
+        self.assertEqual(len(server.connections), 1)
+
+
+class TestLogPipeline(unittest.TestCase):
+
+    @staticmethod
+    def record(msg, level=logging.INFO, args=(), **extra):
+        record = logging.LogRecord("root", level, __file__, 0, msg, args, None)
+        record.__dict__.update(extra)
+        return record
+
+    def start(self, **kwargs):
+        # start() reemplaza los handlers del logger raíz: se restauran al terminar
+        root = logging.getLogger()
+        self.addCleanup(setattr, root, "handlers", root.handlers[:])
+        self.addCleanup(root.setLevel, root.level)
+        stream = io.StringIO()
+        pipeline = LogPipeline(stream=stream, **kwargs).start()
+        self.addCleanup(pipeline.stop)
+        return pipeline, stream
+
+    def test_muestreo_por_tipo(self):
+        """ Se muestrea por 'event' o por plantilla; WARNING y superiores pasan siempre. """
+        sampler = LogSampler(sample_rates={"db.write": 0.0, "Accepted %s": 1.0})
+        self.assertFalse(sampler.filter(self.record("Item %s", event="db.write")))
+        self.assertTrue(sampler.filter(self.record("Accepted %s", args=("x",))))
+        self.assertTrue(sampler.filter(self.record("Item %s", level=logging.WARNING, event="db.write")))
+        self.assertEqual(sampler.stats(), {"passed": 1, "sampled_out": 1, "rate_limited": 0})
+
+    def test_limite_por_segundo(self):
+        """ Con rate_limit se escriben como máximo N registros de cada tipo por segundo. """
+        sampler = LogSampler(rate_limit=3)
+        passed = sum(sampler.filter(self.record("Accepted %s", args=(i,))) for i in range(20))
+        other = sampler.filter(self.record("Otro mensaje"))
+        self.assertIn(passed, (3, 6))  # 6 solo si la ráfaga cruzó el cambio de segundo
+        self.assertTrue(other)
+        self.assertEqual(sampler.stats()["rate_limited"], 20 - passed)
+
+    def test_formateo_en_el_hilo_de_escritura(self):
+        """ Los argumentos se formatean en el hilo log-writer, no en el que loguea. """
+        class ThreadName:
+            def __str__(self):
+                return threading.current_thread().name
+        pipeline, stream = self.start()
+        logging.info("formateado en %s", ThreadName())
+        pipeline.stop()
+        self.assertIn("formateado en log-writer", stream.getvalue())
+
+    def test_formato_json(self):
+        """ En modo json cada registro es una línea con los campos de 'extra'. """
+        pipeline, stream = self.start(log_format="json")
+        logging.warning("Item %s", "a", extra={"event": "db.write"})
+        pipeline.stop()
+        entry = json.loads(stream.getvalue())
+        self.assertEqual((entry["msg"], entry["level"], entry["event"]), ("Item a", "WARNING", "db.write"))
+
+    def test_cola_acotada(self):
+        """ Con la cola llena se descartan INFO/DEBUG, nunca WARNING. """
+        log_queue = queue.SimpleQueue()  # Sin hilo de escritura: la cola no se vacía
+        handler = _DeferredQueueHandler(log_queue, max_size=1)
+        for level in (logging.INFO, logging.INFO, logging.WARNING):
+            handler.enqueue(self.record("m", level=level))
+        self.assertEqual((handler.dropped, log_queue.qsize()), (1, 2))
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def test_histograma_acumulado(self):
+        """ Cada bucket cuenta los valores <= su límite, acumulados; lo que excede va a +Inf. """
+        registry = MetricsRegistry()
+        latency = registry.histogram("req_seconds", "Latencia.", labelnames=("action",), buckets=(0.01, 0.1))
+        for seconds in (0.005, 0.01, 0.05, 3.0):
+            latency.observe(seconds, "get")
+        lines = registry.render().splitlines()
+        self.assertEqual(lines[:2], ["# HELP req_seconds Latencia.", "# TYPE req_seconds histogram"])
+        self.assertEqual(lines[2:], [
+            'req_seconds_bucket{action="get",le="0.01"} 2',
+            'req_seconds_bucket{action="get",le="0.1"} 3',
+            'req_seconds_bucket{action="get",le="+Inf"} 4',
+            'req_seconds_sum{action="get"} 3.065',
+            'req_seconds_count{action="get"} 4',
+        ])
+        snapshot = registry.snapshot()["req_seconds"]["get"]
+        self.assertEqual((snapshot["count"], snapshot["p50_ms"], snapshot["p95_ms"]), (4, 10.0, None))
+
+    def test_contadores_y_callbacks(self):
+        """ Contadores con etiquetas escapadas; un callback que falla se omite sin cortar el resto. """
+        registry = MetricsRegistry()
+        errors = registry.counter("errors_total", "Errores.", labelnames=("op",))
+        errors.inc('put "item"\n')
+        errors.inc('put "item"\n', amount=2)
+        registry.callback("broken", "Falla.", lambda: 1 / 0)
+        registry.callback("cache_items", "Items.", lambda: {("item",): 3, ("response",): 1.5}, labelnames=("cache",))
+        with self.assertLogs(level="WARNING"):
+            text = registry.render()
+        self.assertIn('errors_total{op="put \\"item\\"\\n"} 3\n', text)
+        self.assertNotIn("broken", text)
+        self.assertIn('cache_items{cache="item"} 3\ncache_items{cache="response"} 1.5\n', text)
+        self.assertIn("# TYPE cache_items gauge", text)
+        with self.assertLogs(level="WARNING"):
+            snapshot = registry.snapshot()
+        self.assertNotIn("broken", snapshot)
+        self.assertEqual(snapshot["cache_items"], {"item": 3, "response": 1.5})
+
+    def test_endpoint_http(self):
+        """ /metrics responde el formato de texto de Prometheus; otras rutas, 404. """
+        registry = MetricsRegistry()
+        registry.counter("requests_total", "Solicitudes.").inc()
+        httpd = serve_metrics(registry, "127.0.0.1", 0)
+        self.addCleanup(httpd.server_close)
+        self.addCleanup(httpd.shutdown)
+        base = "http://127.0.0.1:%d" % httpd.server_address[1]
+        with urllib.request.urlopen(base + "/metrics", timeout=2) as response:
+            self.assertTrue(response.headers["Content-Type"].startswith("text/plain; version=0.0.4"))
+            self.assertIn("requests_total 1\n", response.read().decode("utf-8"))
+        with self.assertRaises(urllib.error.HTTPError) as missing:
+            urllib.request.urlopen(base + "/otra", timeout=2)
+        missing.exception.close()
+        self.assertEqual(missing.exception.code, 404)
+
+
+class TestTracing(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(tracing.activate, None)
+
+    def test_fases_acumuladas(self):
+        """ mark() cierra la fase desde la marca anterior; una fase repetida se acumula. """
+        trace = RequestTrace()
+        time.sleep(0.01)
+        trace.begin()  # La espera anterior (conexión inactiva) no cuenta
+        trace.mark("recv")
+        trace.add("db.get_item", 0.002)
+        trace.add("db.get_item", 0.003)
+        time.sleep(0.005)
+        trace.mark("handle")
+        entry = trace.to_dict()
+        self.assertEqual(list(entry["phases_ms"]), ["recv", "db.get_item", "handle"])
+        self.assertEqual(entry["phases_ms"]["db.get_item"], 5.0)
+        self.assertLess(entry["phases_ms"]["recv"], 5)
+        self.assertGreaterEqual(entry["total_ms"], 5)
+
+    def test_desactivado_no_cuesta_nada(self):
+        """ Sin umbral ni exportación no se crea traza y las funciones del módulo no hacen nada. """
+        recorder = TraceRecorder()
+        self.assertIsNone(recorder.begin())
+        tracing.mark("recv")
+        tracing.add("notify", 1.0)
+        self.assertIsNone(tracing.current())
+
+    def test_bind_en_otro_hilo(self):
+        """ Las tareas creadas con bind() suman a la traza de quien las creó. """
+        recorder = TraceRecorder(slow_threshold=10)
+        trace = recorder.begin()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(tracing.bind(lambda _: tracing.add("db.batch", 0.001)), range(4)))
+        self.assertAlmostEqual(trace.phases["db.batch"], 0.004)
+        recorder.finish(trace)
+        self.assertIsNone(tracing.current())
+
+    def test_lentas_y_exportacion(self):
+        """ Las solicitudes lentas se loguean con su desglose; todas se exportan como JSONL. """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "traces.jsonl")
+            recorder = TraceRecorder(slow_threshold=0.001, export_path=path).start()
+            fast = recorder.begin()
+            fast.trace_id, fast.action, fast.status = "t1", "get", "OK"
+            recorder.finish(fast)
+            slow = recorder.begin()
+            slow.trace_id, slow.action = "t2", "list"
+            slow.add("db.scan", 0.002)
+            time.sleep(0.002)
+            slow.mark("handle")
+            with self.assertLogs(level="WARNING") as logs:
+                recorder.finish(slow)
+            recorder.stop()
+            self.assertIn("Slow request list (trace t2)", logs.output[0])
+            self.assertEqual(logs.records[0].event, "request.slow")
+            with open(path, encoding="utf-8") as f:
+                exported = [json.loads(line) for line in f]
+        self.assertEqual([(e["trace_id"], e["action"]) for e in exported], [("t1", "get"), ("t2", "list")])
+        self.assertEqual(recorder.stats()["exported"], 2)
+        self.assertEqual((recorder.stats()["traced"], recorder.stats()["slow"]), (2, 1))
+
+    def test_muestreo_de_exportacion(self):
+        """ Con sample=0 no se exporta nada, aunque las trazas se siguen contando. """
+        with tempfile.TemporaryDirectory() as tmp:
+            recorder = TraceRecorder(export_path=os.path.join(tmp, "t.jsonl"), sample=0).start()
+            recorder.finish(recorder.begin())
+            recorder.stop()
+        self.assertEqual((recorder.stats()["traced"], recorder.stats()["exported"]), (1, 0))
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.profiler = Profiler(self.dir.name, sample_interval=0.002)
+        self.addCleanup(self.profiler.stop)
+
+    def wait_window(self, windows=1):
+        wait_until(lambda: self.profiler.status()["windows"] == windows, timeout=5.0)
+        return self.profiler.status()
+
+    def test_parametros_invalidos(self):
+        """ Modo desconocido, duración no positiva, intervalo menor a 1 s o una ventana ya en curso. """
+        for kwargs in ({"mode": "otro"}, {"duration": 0}, {"duration": 5, "interval": 0.5}):
+            with self.assertRaises(ValueError):
+                self.profiler.start(**kwargs)
+        self.profiler.start(duration=5)
+        with self.assertRaises(ValueError):
+            self.profiler.start(duration=5)
+        self.profiler.stop()
+        self.assertIsNone(self.wait_window()["running"])
+
+    def test_ventana_de_muestreo(self):
+        """ Una ventana 'sample' escribe las pilas colapsadas y el resumen, con la espera en los locks. """
+        lock = TimedLock()
+        self.profiler.watch_lock("lock", lock)
+        stop = threading.Event()
+
+        def busy():
+            while not stop.is_set():
+                with lock:
+                    time.sleep(0.001)
+        workers = [threading.Thread(target=busy, name=f"worker-{i}") for i in range(2)]
+        for worker in workers:
+            worker.start()
+        try:
+            self.profiler.start(mode="sample", duration=0.2)
+            status = self.wait_window()
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(sorted(os.path.splitext(f)[1] for f in status["files"]), [".collapsed", ".json"])
+        report = status["last_report"]
+        self.assertGreater(report["samples"], 0)
+        self.assertGreater(report["locks"]["lock"]["acquisitions"], 0)
+        with open(next(f for f in status["files"] if f.endswith(".collapsed")), encoding="utf-8") as f:
+            stacks = f.read().splitlines()
+        self.assertTrue(any(line.startswith("worker;") for line in stacks))  # worker-N agrupados
+        self.assertFalse(lock.timing)  # Fuera de la ventana el lock no mide
+
+    def test_ventana_cprofile_y_stop(self):
+        """ En modo 'cprofile' se juntan las solicitudes perfiladas; stop() cierra la ventana antes. """
+        self.assertIsNone(self.profiler.request_started())  # Sin ventana no se perfila
+        self.profiler.start(mode="cprofile", duration=30)
+        profile = self.profiler.request_started()
+        if profile is not None:  # None si otro perfilador está activo (Python 3.12+)
+            sum(range(1000))
+            self.profiler.request_finished(profile)
+        self.profiler.stop()
+        report = self.wait_window()["last_report"]
+        self.assertEqual(report["mode"], "cprofile")
+        self.assertEqual(report["requests"] + report["skipped"], 1)
+        self.assertLess(report["seconds"], 5)
+
+
+# --- Ejecutar las pruebas ---
+if __name__ == "__main__":
+    unittest.main(verbosity=2)